@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# Author: Forrest Chang (forrestchang7@gmail.com)
+
+"""
+Benchmark the arithmetic primitives of schemy.types, called directly on two
+small ints, on an int and a float, and on three ints.
+
+The binary forms on two ints take a fast path, so they should be the
+quickest row of each primitive by a clear margin.
+
+    python -m benchmarks.bench_arith [calls]
+"""
+
+from schemy.types import scheme_add, scheme_div, scheme_eq, scheme_gt, scheme_lt, scheme_mul, scheme_sub, scnum
+from schemy.utils import main
+
+from .timing import timed
+
+PRIMITIVES = (
+    ('+', scheme_add),
+    ('-', scheme_sub),
+    ('*', scheme_mul),
+    ('/', scheme_div),
+    ('<', scheme_lt),
+    ('>', scheme_gt),
+    ('=', scheme_eq),
+)
+
+OPERANDS = (
+    ('int int', (scnum(12), scnum(7))),
+    ('int float', (scnum(12), scnum(7.5))),
+    ('int int int', (scnum(12), scnum(7), scnum(3))),
+)
+
+
+def call_repeatedly(func, args, calls):
+    """Call func(*args) calls times."""
+    for _ in range(calls):
+        func(*args)
+
+
+@main
+def run(calls='200000'):
+    calls = int(calls)
+    print('{:<4} {:<12} {:>12}'.format('op', 'operands', 'ns/call'))
+    for name, func in PRIMITIVES:
+        for kind, args in OPERANDS:
+            if len(args) > 2 and name in '<>=':
+                continue
+            _, seconds = timed(call_repeatedly, func, args, calls)
+            print('{:<4} {:<12} {:>12.1f}'.format(name, kind, seconds / calls * 1e9))
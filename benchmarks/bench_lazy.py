@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# Author: Forrest Chang (forrestchang7@gmail.com)
+
+"""
+Benchmark a procedure that doubles an argument passed on to itself, written
+with nu, whose arguments are passed by name, and with lazy, whose arguments
+are passed by need.
+
+By name, the argument at depth n is evaluated 2^n times, so the time doubles
+with each step; by need, each is evaluated once and the time grows linearly.
+
+    python -m benchmarks.bench_lazy [deepest]
+"""
+
+import time
+
+from schemy.compiler import compile_eval
+from schemy.eval import scheme_eval
+from schemy.repl import create_global_frame, read_line
+from schemy.utils import main
+
+EVALUATORS = (('scheme_eval', scheme_eval), ('compile_eval', compile_eval))
+
+DEFINITION = '(define f ({} (n x) (if (= n 0) x (f (- n 1) (+ x x)))))'
+
+
+@main
+def run(deepest='16'):
+    print('{:<14} {:<6} {:>6} {:>10}'.format('evaluator', 'form', 'n', 'seconds'))
+    for name, evaluator in EVALUATORS:
+        for form in ('nu', 'lazy'):
+            env = create_global_frame(evaluator)
+            evaluator(read_line(DEFINITION.format(form)), env)
+            for n in range(4, int(deepest) + 1, 4):
+                start = time.perf_counter()
+                evaluator(read_line('(f {} 1)'.format(n)), env)
+                seconds = time.perf_counter() - start
+                print('{:<14} {:<6} {:>6} {:>10.4f}'.format(name, form, n, seconds))
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# Author: Forrest Chang (forrestchang7@gmail.com)
+
+"""
+Benchmark the core list operations of schemy.types on lists of 10^3 up to
+10^6 elements.
+
+Each operation is timed on each size, with the time per element, which
+stays flat when the operation is linear. None of them recurse, so all sizes
+run without raising RecursionError.
+
+    python -m benchmarks.bench_lists [largest power of ten]
+"""
+
+from schemy.types import nil, scheme_list, scnum
+from schemy.utils import main
+
+from .timing import timed
+
+
+def operations(items, copy):
+    """The name and a function of no arguments for each operation timed."""
+    return (
+        ('scheme_list', lambda: scheme_list(*map(scnum, range(len(copy))))),
+        ('len', lambda: len(items)),
+        ('listp', lambda: items.listp()),
+        ('map', lambda: items.map(lambda x: x)),
+        ('append', lambda: items.append(nil)),
+        ('equal', lambda: items == copy),
+        ('str', lambda: str(items)),
+    )
+
+
+@main
+def run(power='6'):
+    print('{:<12} {:>10} {:>12} {:>14}'.format('operation', 'elements', 'seconds', 'ns/element'))
+    for k in range(3, int(power) + 1):
+        n = 10 ** k
+        items = scheme_list(*map(scnum, range(n)))
+        copy = scheme_list(*map(scnum, range(n)))
+        for name, func in operations(items, copy):
+            _, seconds = timed(func)
+            print('{:<12} {:>10} {:>12.4f} {:>14.1f}'.format(name, n, seconds, seconds / n * 1e9))
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+# Author: Forrest Chang (forrestchang7@gmail.com)
+
+"""
+Benchmark reading the expressions of generated source files of growing size,
+through a memory map of the file and through the file object itself.
+
+For each size the time to read every expression is shown, with the time per
+megabyte, which stays flat when reading is linear in the size of the file,
+and the peak memory allocated while reading, beside the memory held by the
+expressions read.
+
+    python -m benchmarks.bench_load [megabytes]
+"""
+
+import os
+import tempfile
+import time
+import tracemalloc
+
+from schemy.buffer import MappedLines
+from schemy.repl import read_expressions
+from schemy.utils import main
+
+
+def generate(path, megabytes):
+    """Write a source file of about megabytes of definitions and quoted data to path."""
+    size, i = megabytes * 1e6, 0
+    with open(path, 'w') as outfile:
+        while outfile.tell() < size:
+            outfile.write('(define (f{0} x) (if (< x {0}) (+ x 1.5) "s{0}"))\n'.format(i))
+            outfile.write("(define d{0} '({1}))\n".format(i, ' '.join(map(str, range(i % 50)))))
+            i += 1
+
+
+def count(lines):
+    """Read every expression in lines, returning how many there were."""
+    return sum(1 for _ in read_expressions(lines))
+
+
+def mapped(path):
+    with open(path) as infile, MappedLines(infile) as source:
+        return count(source)
+
+
+def unmapped(path):
+    with open(path) as infile:
+        return count(line.rstrip('\n') for line in infile)
+
+
+def peak(func, *args):
+    """The result of func(*args) and the peak memory in megabytes allocated while running it."""
+    tracemalloc.start()
+    try:
+        result = func(*args)
+        return result, tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def held(path):
+    """The memory in megabytes held by all of the expressions of the file at path."""
+    tracemalloc.start()
+    try:
+        with open(path) as infile, MappedLines(infile) as source:
+            expressions = tuple(read_expressions(source))
+        return tracemalloc.get_traced_memory()[0] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+@main
+def run(megabytes='4'):
+    largest = int(megabytes)
+    print('{:>8} {:<10} {:>10} {:>10} {:>12} {:>12}'.format(
+        'MB', 'engine', 'seconds', 's/MB', 'peak MB', 'result MB'))
+    with tempfile.TemporaryDirectory() as directory:
+        size = 1
+        while size <= largest:
+            path = os.path.join(directory, 'generated.scm')
+            generate(path, size)
+            actual = os.path.getsize(path) / 1e6
+            result = held(path)
+            for engine, read in (('mapped', mapped), ('file', unmapped)):
+                start = time.perf_counter()
+                read(path)
+                seconds = time.perf_counter() - start
+                _, memory = peak(read, path)
+                print('{:>8.1f} {:<10} {:>10.3f} {:>10.3f} {:>12.2f} {:>12.2f}'.format(
+                    actual, engine, seconds, seconds / actual, memory, result))
+            size *= 2
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# Author: Forrest Chang (forrestchang7@gmail.com)
+
+"""
+Benchmark the overhead of the profilers of schemy.profiler on a recursive
+Fibonacci procedure and a loop calling primitives, run by scheme_eval.
+
+Each program is timed without instruments, with a Sampler taking samples
+every interval seconds, and with the deterministic Profiler, showing the
+overhead of each over the plain run.
+
+    python -m benchmarks.bench_sampler [interval]
+"""
+
+import contextlib
+
+from schemy import eval as evaluation
+from schemy.profiler import Profiler, Sampler
+from schemy.repl import create_global_frame, read_line
+from schemy.utils import main
+
+from .timing import timed
+
+PROGRAMS = (
+    ('fib', '(define (fib n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))', '(fib 20)'),
+    ('loop', '(define (loop i acc) (if (= i 0) acc (loop (- i 1) (+ acc (* i i)))))', '(loop 20000 0)'),
+)
+
+
+def timed_with(definition, call, instrument, repeat=5):
+    """The least time in seconds call takes over repeat runs, with instrument on."""
+    env = create_global_frame()
+    evaluation.scheme_eval(read_line(definition), env)
+    expr = read_line(call)
+    with instrument():
+        # scheme_eval is looked up inside, as instruments replace it
+        return timed(lambda: evaluation.scheme_eval(expr, env), repeat=repeat)[1]
+
+
+def sampled(interval):
+    @contextlib.contextmanager
+    def instrument():
+        sampler = Sampler(interval)
+        with evaluation.instruments(sampler.enter, sampler.leave), sampler:
+            yield
+    return instrument
+
+
+def profiled():
+    profiler = Profiler()
+    return evaluation.instruments(profiler.enter, profiler.leave)
+
+
+@main
+def run(interval='0.01'):
+    instruments = (('plain', contextlib.nullcontext), ('sampler', sampled(float(interval))),
+                   ('profiler', profiled))
+    print('{:<8} {:<10} {:>10} {:>10}'.format('program', 'profiler', 'seconds', 'overhead'))
+    for name, definition, call in PROGRAMS:
+        plain = None
+        for kind, instrument in instruments:
+            seconds = timed_with(definition, call, instrument)
+            plain = plain or seconds
+            print('{:<8} {:<10} {:>10.4f} {:>9.1f}%'.format(
+                name, kind, seconds, (seconds / plain - 1) * 100))
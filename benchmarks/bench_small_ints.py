@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# Author: Forrest Chang (forrestchang7@gmail.com)
+
+"""
+Benchmark counter-heavy programs with the cache of small SchemeInts on and
+off, counting the SchemeInts allocated while each one runs.
+
+With the cache on, loop counters and small results are shared, so nearly all
+of the allocations of nested loops and fib are gone. The sum runs its counter
+and total far past the cached range, to show the cost of the lookup alone.
+
+    python -m benchmarks.bench_small_ints [n]
+"""
+
+from schemy.repl import create_global_frame, read_expressions, read_line
+from schemy.types import SMALL_INT_RANGE, SchemeInt, cache_small_ints
+from schemy.utils import main
+from schemy.vm import vm_eval
+
+from .timing import timed
+
+PROGRAMS = (
+    ('nested', '(define (run n) (define (inner j) (if (= j 0) 0 (inner (- j 1)))) '
+               '(define (outer i) (if (= i 0) 0 (begin (inner 100) (outer (- i 1))))) (outer (quotient n 100)))'),
+    ('sum', '(define (run n) (define (loop i acc) (if (= i n) acc (loop (+ i 1) (+ acc i)))) (loop 0 0))'),
+    ('fib', '(define (fib n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2))))) (define (run n) (fib (quotient n 5000)))'),
+)
+
+
+class counted:
+    """A context in which every SchemeInt made is counted."""
+
+    def __enter__(self):
+        self.count = 0
+        def new(cls, *args):
+            self.count += 1
+            return int.__new__(cls, *args)
+        SchemeInt.__new__ = new
+        return self
+
+    def __exit__(self, *args):
+        del SchemeInt.__new__
+
+
+def prepare(definition):
+    env = create_global_frame(vm_eval)
+    for expr in read_expressions([definition]):
+        vm_eval(expr, env)
+    return env
+
+
+@main
+def run(n='100000'):
+    call = read_line('(run {})'.format(n))
+    print('{:<8} {:<8} {:>12} {:>10}'.format('program', 'cache', 'allocations', 'seconds'))
+    for name, definition in PROGRAMS:
+        for cache, limits in (('on', SMALL_INT_RANGE), ('off', (0, -1))):
+            cache_small_ints(*limits)
+            env = prepare(definition)
+            with counted() as allocations:
+                vm_eval(call, env)
+            _, seconds = timed(vm_eval, call, env)
+            print('{:<8} {:<8} {:>12} {:>10.3f}'.format(name, cache, allocations.count, seconds))
+    cache_small_ints(*SMALL_INT_RANGE)
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# Author: Forrest Chang (forrestchang7@gmail.com)
+
+"""
+Benchmark tail-recursive loops under each evaluator, reporting the Python stack
+depth reached at the bottom of the loop and the number of iterations per second.
+
+    python -m benchmarks.bench_tail_calls [iterations]
+"""
+
+import sys
+import time
+
+from schemy.compiler import compile_eval
+from schemy.eval import scheme_eval
+from schemy.procedure import PrimitiveProcedure
+from schemy.repl import create_global_frame, read_line
+from schemy.types import scnum
+from schemy.utils import main
+
+EVALUATORS = (('scheme_eval', scheme_eval), ('compile_eval', compile_eval))
+
+LOOPS = (
+    ('if', '(define (loop n) (if (= n 0) (stack-depth) (loop (- n 1))))'),
+    ('cond/let/begin', '(define (loop n) (cond ((= n 0) (stack-depth)) '
+                       '(else (let ((m (- n 1))) (begin (and #t (or #f (loop m))))))))'),
+)
+
+
+def stack_depth():
+    """The number of Python frames on the stack of the caller."""
+    frame, depth = sys._getframe(1), 0
+    while frame is not None:
+        frame, depth = frame.f_back, depth + 1
+    return scnum(depth)
+
+
+def run_loop(evaluator, definition, iterations):
+    """Return the stack depth at the bottom of a loop of iterations and the seconds it took."""
+    env = create_global_frame(evaluator)
+    env.define('stack-depth', PrimitiveProcedure(stack_depth))
+    evaluator(read_line(definition), env)
+    start = time.perf_counter()
+    depth = evaluator(read_line('(loop {})'.format(iterations)), env)
+    return depth, time.perf_counter() - start
+
+
+@main
+def run(iterations='1000000'):
+    iterations = int(iterations)
+    print('{:<14} {:<16} {:>8} {:>8} {:>10} {:>12}'.format(
+        'evaluator', 'loop', 'depth@1', 'depth@n', 'seconds', 'iter/s'))
+    for name, evaluator in EVALUATORS:
+        for loop, definition in LOOPS:
+            shallow, _ = run_loop(evaluator, definition, 1)
+            deep, seconds = run_loop(evaluator, definition, iterations)
+            print('{:<14} {:<16} {:>8} {:>8} {:>10.2f} {:>12.0f}'.format(
+                name, loop, shallow, deep, seconds, iterations / seconds))
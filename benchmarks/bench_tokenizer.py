@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# Author: Forrest Chang (forrestchang7@gmail.com)
+
+"""
+Benchmark tokenizer throughput on generated corpora, in megabytes and tokens
+per second.
+
+Whole lines are tokenized both by tokenize_line, which matches one master
+pattern, and by tokenize_line_by_char, which walks each line a character at
+a time and tries int and float on every word that could be a number.
+
+String literals are also scanned the way the tokenizer used to: by running
+the standard library tokenize module over the rest of the line and decoding
+the literal with eval. Long lines full of strings show how that grows with
+the length of the line.
+
+    python -m benchmarks.bench_tokenizer [lines]
+"""
+
+import tokenize
+
+from schemy.tokenizer import scan_string, tokenize_line, tokenize_line_by_char
+from schemy.utils import main
+
+from .timing import timed
+
+
+def string_heavy(n):
+    """Lines of calls with many string literals, some with escapes."""
+    literals = ' '.join('"item {0} of the list" "quoted \\"{0}\\"\\n"'.format(i) for i in range(20))
+    return ['(display (list {}))'.format(literals) for _ in range(n)]
+
+
+def code(n):
+    """Lines of ordinary procedure definitions."""
+    return ['(define (f{0} x y) (if (< x {0}) (+ x (* y 2.5)) (cons "s{0}" (quote (a b c)))))'.format(i)
+            for i in range(n)]
+
+
+def arithmetic(n):
+    """Lines of numbers and of symbols that start like numbers, such as - and ->list."""
+    return ['(- (+ {0} -{0}.5 .25 1e-3) (vector->list v) (-> x) (+ -1 +2) ...)'.format(i) for i in range(n)]
+
+
+CORPORA = (('string-heavy', string_heavy), ('code', code), ('arithmetic', arithmetic))
+ENGINES = (('tokenize_line', tokenize_line), ('tokenize_line_by_char', tokenize_line_by_char))
+
+
+def stdlib_string(line, k):
+    """The value of the string literal at position k of line, read by tokenize and eval."""
+    gen = tokenize.tokenize(iter((bytes(line[k:], encoding='utf-8'),)).__next__)
+    next(gen) # Throw away encoding token
+    token = next(gen)
+    return eval(token.string), token.end[1] + k
+
+
+def scan_strings(lines, scan):
+    """Scan every string literal in lines with scan, returning how many there were."""
+    count = 0
+    for line in lines:
+        k = line.find('"')
+        while k >= 0:
+            _, k = scan(line, k)
+            count += 1
+            k = line.find('"', k)
+    return count
+
+
+def tokenize_all(lines, tokenize):
+    """Tokenize every line with tokenize, returning how many tokens there were."""
+    return sum(len(tokenize(line)) for line in lines)
+
+
+@main
+def run(n='2000'):
+    n = int(n)
+    print('{:<14} {:<26} {:>10} {:>10} {:>14}'.format('corpus', 'engine', 'seconds', 'MB/s', 'tokens/s'))
+    for name, corpus in CORPORA:
+        lines = corpus(n)
+        megabytes = sum(map(len, lines)) / 1e6
+        for engine, tokenize in ENGINES:
+            count, seconds = timed(tokenize_all, lines, tokenize)
+            print('{:<14} {:<26} {:>10.3f} {:>10.2f} {:>14.0f}'.format(
+                name, engine, seconds, megabytes / seconds, count / seconds))
+        for engine, scan in (('scan_string', scan_string), ('tokenize + eval', stdlib_string)):
+            count, seconds = timed(scan_strings, lines, scan)
+            print('{:<14} {:<26} {:>10.3f} {:>10.2f} {:>14.0f}'.format(
+                name, 'strings: ' + engine, seconds, megabytes / seconds, count / seconds))
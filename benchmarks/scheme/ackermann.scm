@@ -0,0 +1,5 @@
+; The Ackermann function: nested calls that recurse on their own results.
+(define (ack m n)
+  (cond ((= m 0) (+ n 1))
+        ((= n 0) (ack (- m 1) 1))
+        (else (ack (- m 1) (ack m (- n 1))))))
@@ -0,0 +1,5 @@
+; Non-tail recursion as deep as n: the depth of the stack an evaluator can reach.
+(define (depth n)
+  (if (= n 0)
+      0
+      (+ 1 (depth (- n 1)))))
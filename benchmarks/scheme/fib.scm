@@ -0,0 +1,5 @@
+; Doubly recursive Fibonacci: procedure calls and fixnum arithmetic.
+(define (fib n)
+  (if (< n 2)
+      n
+      (+ (fib (- n 1)) (fib (- n 2)))))
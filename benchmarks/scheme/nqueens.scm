@@ -0,0 +1,20 @@
+; Count the ways of placing n queens on an n by n board: list building and backtracking.
+(define (ok? row dist placed)
+  (cond ((null? placed) #t)
+        ((= (car placed) (+ row dist)) #f)
+        ((= (car placed) (- row dist)) #f)
+        ((= (car placed) row) #f)
+        (else (ok? row (+ dist 1) (cdr placed)))))
+
+(define (try-rows row n placed)
+  (if (> row n)
+      0
+      (+ (if (ok? row 1 placed) (place n (cons row placed)) 0)
+         (try-rows (+ row 1) n placed))))
+
+(define (place n placed)
+  (if (= (length placed) n)
+      1
+      (try-rows 1 n placed)))
+
+(define (queens n) (place n '()))
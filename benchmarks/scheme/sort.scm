@@ -0,0 +1,37 @@
+; Merge sort of a list of pseudo-random numbers, with every loop in tail position.
+(define (random-list n seed acc)
+  (if (= n 0)
+      acc
+      (random-list (- n 1) (modulo (+ (* seed 1103515245) 12345) 2147483648) (cons seed acc))))
+
+(define (reverse-onto items acc)
+  (if (null? items)
+      acc
+      (reverse-onto (cdr items) (cons (car items) acc))))
+
+(define (split items left right)
+  (if (null? items)
+      (cons left right)
+      (split (cdr items) right (cons (car items) left))))
+
+(define (merge a b acc)
+  (cond ((null? a) (reverse-onto acc b))
+        ((null? b) (reverse-onto acc a))
+        ((< (car b) (car a)) (merge a (cdr b) (cons (car b) acc)))
+        (else (merge (cdr a) b (cons (car a) acc)))))
+
+(define (merge-sort items)
+  (if (or (null? items) (null? (cdr items)))
+      items
+      (let ((halves (split items '() '())))
+        (merge (merge-sort (car halves)) (merge-sort (cdr halves)) '()))))
+
+(define (sorted? items)
+  (or (null? items)
+      (null? (cdr items))
+      (and (<= (car items) (car (cdr items)))
+           (sorted? (cdr items)))))
+
+(define (sort-random n)
+  (let ((items (merge-sort (random-list n 42 '()))))
+    (if (sorted? items) (length items) -1)))
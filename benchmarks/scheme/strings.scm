@@ -0,0 +1,7 @@
+; Build a string by appending the numbers up to n, one at a time.
+(define (build-string i n acc)
+  (if (> i n)
+      acc
+      (build-string (+ i 1) n (string-append acc (number->string i) " "))))
+
+(define (string-building n) (string-length (build-string 1 n "")))
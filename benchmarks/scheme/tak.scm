@@ -0,0 +1,7 @@
+; The Takeuchi function: deep chains of calls with three arguments.
+(define (tak x y z)
+  (if (< y x)
+      (tak (tak (- x 1) y z)
+           (tak (- y 1) z x)
+           (tak (- z 1) x y))
+      z))
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+# Author: Forrest Chang (forrestchang7@gmail.com)
+
+"""
+Run the standard benchmark suite under one evaluator, writing the results as
+JSON, or compare the results of two runs, flagging regressions.
+
+The programs are classic interpreter workloads, in benchmarks/scheme: fib,
+tak, ackermann, nqueens, merge sort of a list, recursion 10000 deep and
+building a string. Each is loaded, then its call is timed. Two more time the
+reader on a generated source of a quarter of a megabyte, and scheme_load of that
+source as a file, without and with its cache entry.
+
+For every benchmark the least wall time over the repeats is kept, with the
+number of operations it does and their rate, and the peak memory allocated in
+one more run under tracemalloc. The operations of a program are the procedure
+applications it makes, taken from the applications counters of the stats
+module over one run under the evaluator being measured; those of the reader
+and of loading are the expressions read. A benchmark an evaluator cannot run,
+such as recursion deeper than the Python stack, records its error instead.
+
+    python -m benchmarks.suite [-compile|-machine|-vm] [results.json]
+    python -m benchmarks.suite -compare old.json new.json [threshold]
+
+Compare flags a benchmark as a regression when it is slower, or allocates
+more at its peak, by more than threshold (0.1 by default), or when it fails in
+the new results only, and then exits with status 1.
+"""
+
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import tracemalloc
+
+from schemy.cache import CACHE_DIR
+from schemy.eval import scheme_eval
+from schemy.exception import SchemeError
+from schemy.repl import create_global_frame, read_expressions, read_line, scheme_load
+from schemy.stats import applications
+from schemy.types import scstr
+from schemy.utils import main
+
+from .bench_load import generate
+from .timing import timed
+
+PROGRAMS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scheme')
+
+REPEAT = 3
+
+# The name, source file, timed call and expected value of each program
+WORKLOADS = (
+    ('fib', 'fib.scm', '(fib 18)', 2584),
+    ('tak', 'tak.scm', '(tak 13 9 4)', 5),
+    ('ackermann', 'ackermann.scm', '(ack 2 40)', 83),
+    ('nqueens', 'nqueens.scm', '(queens 6)', 4),
+    ('sort', 'sort.scm', '(sort-random 250)', 250),
+    ('deep', 'deep.scm', '(depth 10000)', 10000),
+    ('strings', 'strings.scm', '(string-building 4000)', 18893),
+)
+
+# The size of the generated source read and loaded
+READER_MEGABYTES = 0.25
+
+# Growth in peak megabytes too small to be a regression, whatever its ratio
+MEMORY_NOISE = 0.1
+
+
+def evaluator_named(flag):
+    """The evaluator chosen by a flag of python -m schemy.eval."""
+    if flag == '-compile':
+        from schemy.compiler import compile_eval
+        return compile_eval
+    elif flag == '-machine':
+        from schemy.machine import machine_eval
+        return machine_eval
+    elif flag == '-vm':
+        from schemy.vm import vm_eval
+        return vm_eval
+    raise ValueError('unknown evaluator: {}'.format(flag))
+
+
+def program(filename, call, expected, evaluator):
+    """A function running call after loading filename, and the procedure applications it makes."""
+    with open(os.path.join(PROGRAMS, filename)) as infile:
+        definitions = tuple(read_expressions(line.rstrip('\n') for line in infile))
+    expr = read_line(call)
+
+    def prepare(evaluator):
+        env = create_global_frame(evaluator)
+        for definition in definitions:
+            evaluator(definition, env)
+        return env
+
+    def step():
+        value = evaluator(expr, env)
+        if value != expected:
+            raise SchemeError('{} returned {}, not {}'.format(call, value, expected))
+
+    env = prepare(evaluator)
+    before = sum(applications.values())
+    step()
+    return step, sum(applications.values()) - before, 'calls'
+
+
+def reader(directory, evaluator):
+    """A function reading every expression of a generated source, and how many there are."""
+    path = os.path.join(directory, 'reader.scm')
+    generate(path, READER_MEGABYTES)
+    with open(path) as infile:
+        lines = infile.read().splitlines()
+
+    def step():
+        return sum(1 for _ in read_expressions(lines))
+    return step, step(), 'expressions'
+
+
+def loader(directory, evaluator, cached):
+    """A function loading a generated source file, with or without its cache entry."""
+    path = os.path.join(directory, 'load.scm')
+    generate(path, READER_MEGABYTES)
+    with open(path) as infile:
+        expressions = sum(1 for _ in read_expressions(line.rstrip('\n') for line in infile))
+    cache = os.path.join(directory, CACHE_DIR)
+
+    def step():
+        if not cached:
+            shutil.rmtree(cache, ignore_errors=True)
+        scheme_load(scstr(path), create_global_frame(evaluator))
+    step()
+    return step, expressions, 'expressions'
+
+
+def benchmarks(directory, evaluator):
+    """The name and a function of no arguments making the step of each benchmark."""
+    for name, filename, call, expected in WORKLOADS:
+        yield name, lambda workload=(filename, call, expected): program(*workload, evaluator)
+    yield 'reader', lambda: reader(directory, evaluator)
+    yield 'load', lambda: loader(directory, evaluator, cached=False)
+    yield 'load-cached', lambda: loader(directory, evaluator, cached=True)
+
+
+def measure(make):
+    """The results of the benchmark whose step and operations make returns."""
+    try:
+        step, ops, unit = make()
+        _, seconds = timed(step, repeat=REPEAT)
+        tracemalloc.start()
+        try:
+            step()
+            peak = tracemalloc.get_traced_memory()[1] / 1e6
+        finally:
+            tracemalloc.stop()
+    except (SchemeError, RecursionError) as e:
+        return {'error': '{}: {}'.format(type(e).__name__, e)}
+    return {'seconds': seconds, 'ops': ops, 'unit': unit,
+            'ops_per_second': ops / seconds, 'peak_mb': peak}
+
+
+def run_suite(evaluator):
+    """The results of every benchmark under evaluator, printing each as it finishes."""
+    results = {}
+    print('{:<12} {:>10} {:>14} {:>10}'.format('benchmark', 'seconds', 'ops/s', 'peak MB'),
+          file=sys.stderr)
+    with tempfile.TemporaryDirectory() as directory:
+        for name, make in benchmarks(directory, evaluator):
+            result = results[name] = measure(make)
+            if 'error' in result:
+                print('{:<12} {}'.format(name, result['error']), file=sys.stderr)
+            else:
+                print('{:<12} {:>10.4f} {:>14.0f} {:>10.2f}'.format(
+                    name, result['seconds'], result['ops_per_second'], result['peak_mb']),
+                    file=sys.stderr)
+    return {
+        'evaluator': evaluator.__name__,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'repeat': REPEAT,
+        'benchmarks': results,
+    }
+
+
+def compare(old, new, threshold=0.1):
+    """
+    The rows of a comparison of the results old and new, each with the status of
+    a benchmark: ok, faster, slower, more memory, fails or fixed. Those that are
+    slower, use more memory or fail are regressions. Speed is compared by
+    operations per second where both results count operations, and by seconds
+    otherwise.
+    """
+    rows = []
+    for name, after in new['benchmarks'].items():
+        before = old['benchmarks'].get(name)
+        if before is None:
+            continue
+        if 'error' in after or 'error' in before:
+            status = 'ok' if 'error' in before and 'error' in after else (
+                'fails' if 'error' in after else 'fixed')
+            rows.append((name, before.get('seconds'), after.get('seconds'), None, status))
+            continue
+        if before.get('ops') and after.get('ops'):
+            # Compared by rate, so that a run doing more or less work is not
+            # mistaken for a slower or faster one
+            change = before['ops_per_second'] / after['ops_per_second'] - 1
+        else:
+            change = after['seconds'] / before['seconds'] - 1
+        if change > threshold:
+            status = 'slower'
+        elif change < -threshold / (1 + threshold):
+            status = 'faster'
+        elif after['peak_mb'] > max(before['peak_mb'] * (1 + threshold), before['peak_mb'] + MEMORY_NOISE):
+            status = 'more memory'
+        else:
+            status = 'ok'
+        rows.append((name, before['seconds'], after['seconds'], change, status))
+    return rows
+
+
+REGRESSIONS = ('slower', 'more memory', 'fails')
+
+
+def print_comparison(rows):
+    print('{:<12} {:>10} {:>10} {:>9}  {}'.format('benchmark', 'old s', 'new s', 'change', 'status'))
+    for name, before, after, change, status in rows:
+        print('{:<12} {:>10} {:>10} {:>9}  {}'.format(
+            name,
+            '-' if before is None else '{:.4f}'.format(before),
+            '-' if after is None else '{:.4f}'.format(after),
+            '-' if change is None else '{:+.1%}'.format(change),
+            status.upper() if status in REGRESSIONS else status))
+
+
+@main
+def run(*argv):
+    if argv and argv[0] == '-compare':
+        with open(argv[1]) as infile:
+            old = json.load(infile)
+        with open(argv[2]) as infile:
+            new = json.load(infile)
+        rows = compare(old, new, *map(float, argv[3:4]))
+        print_comparison(rows)
+        if any(status in REGRESSIONS for *_, status in rows):
+            sys.exit(1)
+        return
+    evaluator = scheme_eval
+    if argv and argv[0].startswith('-'):
+        evaluator, argv = evaluator_named(argv[0]), argv[1:]
+    results = json.dumps(run_suite(evaluator), indent=2)
+    if argv:
+        with open(argv[0], 'w') as outfile:
+            print(results, file=outfile)
+    else:
+        print(results)
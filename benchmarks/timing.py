@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Author: Forrest Chang (forrestchang7@gmail.com)
+
+"""
+The timing helper shared by the benchmarks. The least time over a few runs is
+kept, as the others are slowed down by whatever else the machine was doing.
+"""
+
+import time
+
+
+def timed(func, *args, repeat=3):
+    """The result of func(*args) and the least time in seconds it took over repeat runs."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return result, best
@@ -6,10 +6,15 @@ The buffer module assists in iterating through lines and tokens.
 """
 
 import math
+import mmap
+import os
+from collections import deque
 
 class Buffer:
     """
     A buffer provides a way of accessing a sequence of tokens across lines.
+    Lines are pulled from source only as their tokens are needed, and only the
+    last window of them are kept, to show where an error is.
 
     >>> buf = Buffer(iter([['(', '+'], [15], [12, ')']]))
     >>> buf.pop()
@@ -23,11 +28,12 @@ class Buffer:
     2: >> 15
     """
 
-    def __init__(self, source):
+    def __init__(self, source, window=4):
         self.index = 0
-        self.lines = []
+        self.lines = deque(maxlen=window)
+        self.line_number = 0
         self.source = source
-        self.current_lines = ()
+        self.current_line = ()
         self.current()
 
     def pop(self):
@@ -40,7 +46,7 @@ class Buffer:
 
     @property
     def more_on_line(self):
-        return self.index < len(self.current_lines)
+        return self.index < len(self.current_line)
 
     def current(self):
         """
@@ -51,6 +57,7 @@ class Buffer:
             try:
                 self.current_line = next(self.source)
                 self.lines.append(self.current_line)
+                self.line_number += 1
             except StopIteration:
                 self.current_line = ()
                 return None
@@ -62,13 +69,14 @@ class Buffer:
         """
 
         # Fromat string for right-justified line numbers
-        n = len(self.lines)
+        n = self.line_number
         msg = '{0:>' + str(math.floor(math.log10(n)) + 1) + '}: '
 
-        # Up to three previous lines and current line are included in output
+        # The previous lines in the window and current line are included in output
         s = ''
-        for i in range(max(0, n-4), n-1):
-            s += msg.format(i+1) + ' '.join(map(str, self.lines[i])) + '\n'
+        previous = list(self.lines)[:-1]
+        for i, line in enumerate(previous, n - len(previous)):
+            s += msg.format(i) + ' '.join(map(str, line)) + '\n'
         s += msg.format(n)
         s += ' '.join(map(str, self.current_line[:self.index]))
         s += ' >> '
@@ -96,18 +104,99 @@ class InputReader:
 
 class LineReader:
     """
-    A LineReader is an iterable that prints lines after a prompt.
+    A LineReader is an iterable that prints lines after a prompt. Lines are
+    taken from an iterator, such as an open file, so readers made one after
+    another over the same iterator continue where the last one stopped.
     """
     def __init__(self, lines, prompt, comment=';'):
-        self.lines = lines
+        self.lines = iter(lines)
         self.prompt = prompt
         self.comment = comment
 
     def __iter__(self):
-        while self.lines:
-            line = self.lines.pop(0).strip('\n')
+        for line in self.lines:
+            line = line.strip('\n')
             if (self.prompt is not None and line != '' and not line.lstrip().startswith(self.comment)):
                 print(self.prompt + line)
                 self.prompt = ' ' * len(self.prompt)
             yield line
-        raise EOFError
\ No newline at end of file
+        raise EOFError
+
+
+class MappedLines:
+    """
+    A MappedLines is an iterable of the lines of an open file, read through a
+    memory map of the file instead of the file's own buffers. Each line is
+    decoded straight from the map only when it is reached, without its line
+    ending. Every iteration starts again from the beginning of the file.
+
+    The number of the line last read is only worked out when it is asked for,
+    by counting the newlines before it, so that reading pays nothing for it.
+    Files that cannot be mapped, such as pipes, are read as usual.
+    """
+    def __init__(self, infile, encoding='utf-8'):
+        self.file = infile
+        self.name = infile.name
+        self.encoding = encoding
+        self.size = os.fstat(infile.fileno()).st_size
+        self.map = None
+        if self.size:
+            try:
+                self.map = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                pass
+        self.view = memoryview(self.map if self.map is not None else b'')
+        self.start = 0
+        self.counted = (0, 1) # An offset and the number of the line there
+
+    def __iter__(self):
+        if self.map is None:
+            yield from self.read_file()
+            return
+        view, find, encoding = self.view, self.map.find, self.encoding
+        start, size = 0, self.size
+        while start < size:
+            end = find(b'\n', start)
+            following = end + 1
+            if end < 0:
+                end = following = size
+            self.start = start
+            if end > start and view[end - 1] == 13: # \r
+                end -= 1
+            yield str(view[start:end], encoding)
+            start = following
+
+    def read_file(self):
+        """The lines of a file that is not mapped, counted as they are read."""
+        if self.file.seekable():
+            self.file.seek(0)
+        self.start = 0
+        for line in self.file:
+            self.start += 1
+            yield line.rstrip('\r\n')
+
+    def line_number(self):
+        """The number of the line read last, counting from 1."""
+        if self.map is None:
+            return self.start
+        offset, number = self.counted
+        if self.start < offset:
+            offset, number = 0, 1
+        find = self.map.find
+        newline = find(b'\n', offset, self.start)
+        while newline >= 0:
+            number += 1
+            newline = find(b'\n', newline + 1, self.start)
+        self.counted = (self.start, number)
+        return number
+
+    def close(self):
+        self.view.release()
+        if self.map is not None:
+            self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
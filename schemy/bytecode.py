@@ -0,0 +1,502 @@
+# -*- coding: utf-8 -*-
+# Author: Forrest Chang (forrestchang7@gmail.com)
+
+"""
+The bytecode module compiles Scheme expressions to instructions for the vm.
+
+A Code object holds a flat list of instructions, each an opcode followed by
+one integer argument, together with the constants and global variables the
+arguments refer to. Variables are resolved to lexical addresses as in the
+compiler; an address with a depth is packed into one argument as
+(depth << 16) | slot.
+"""
+
+from .compiler import resolve, scan_defines
+from .environments import GlobalFrame, Layout
+from .eval import check_form, check_formals
+from .exception import SchemeError, check_type
+from .procedure import LambdaProcedure, LazyProcedure, NuProcedure
+from .types import *
+
+# Opcodes
+LOAD_CONST = 0              # push constants[arg]
+LOAD_LOCAL = 1              # push slot arg of the current frame
+LOAD_OUTER = 2              # push the value at packed address arg
+LOAD_CHECKED = 3            # the same, forcing thunks and falling back to lookup of unbound slots
+LOAD_NAME = 4               # look up symbol constants[arg & 0xffff] by name, arg >> 16 frames up
+LOAD_GLOBAL = 5             # push the value of cells[arg]
+STORE_LOCAL = 6             # pop a value into packed address arg
+SET_LOCAL = 7               # the same for set!, which requires the slot to be bound
+STORE_NAME = 8              # pop a value and define symbol constants[arg] in the current frame
+SET_NAME = 9                # pop a value and set! symbol constants[arg & 0xffff], arg >> 16 frames up
+STORE_GLOBAL = 10           # pop a value into cells[arg]
+SET_GLOBAL = 11             # the same for set!, which requires the cell to be bound
+POP = 12                    # discard the top of the stack
+JUMP = 13                   # continue at arg
+JUMP_IF_FALSE = 14          # pop a value and continue at arg if it is false
+JUMP_IF_FALSE_OR_POP = 15   # continue at arg if the top is false, otherwise pop it
+JUMP_IF_TRUE_OR_POP = 16    # continue at arg if the top is true, otherwise pop it
+MAKE_CLOSURE = 17           # push a procedure of the Code constants[arg] in the current frame
+BY_NAME = 18                # if the procedure on top takes arguments by name, push thunks for them
+CALL = 19                   # call the procedure below the top arg values with them
+TAIL_CALL = 20              # the same, replacing the current call
+ENTER_FRAME = 21            # pop values into a new frame laid out by constants[arg]
+LEAVE_FRAME = 22            # return to the parent of the current frame
+RETURN = 23                 # return the top of the stack to the caller
+LOAD_OPERATOR = 24          # LOAD_GLOBAL arg & 0xffff, then BY_NAME arg >> 16
+PROFILE = 25                # push the value of the profile form with operands constants[arg]
+
+OPNAMES = [
+    'LOAD_CONST', 'LOAD_LOCAL', 'LOAD_OUTER', 'LOAD_CHECKED', 'LOAD_NAME', 'LOAD_GLOBAL',
+    'STORE_LOCAL', 'SET_LOCAL', 'STORE_NAME', 'SET_NAME', 'STORE_GLOBAL', 'SET_GLOBAL',
+    'POP', 'JUMP', 'JUMP_IF_FALSE', 'JUMP_IF_FALSE_OR_POP', 'JUMP_IF_TRUE_OR_POP',
+    'MAKE_CLOSURE', 'BY_NAME', 'CALL', 'TAIL_CALL', 'ENTER_FRAME', 'LEAVE_FRAME', 'RETURN',
+    'LOAD_OPERATOR', 'PROFILE',
+]
+
+
+class Code:
+    """
+    The bytecode of a lambda body, or of an expression evaluated in an existing
+    frame when layout is None.
+    """
+
+    def __init__(self, name=None, formals=nil, body=None, layout=None):
+        self.name = name
+        self.formals = formals
+        self.body = body
+        self.layout = layout
+        self.instructions = []
+        self.constants = []
+        self.names = []
+        self.cells = []
+        self._constant_index = {}
+        self._name_index = {}
+
+    def __repr__(self):
+        return '<code {}>'.format(self.name or 'lambda')
+
+    @property
+    def by_name(self):
+        return self.layout is not None and self.layout.by_name
+
+    @property
+    def by_need(self):
+        return self.layout is not None and self.layout.by_need
+
+    def emit(self, op, arg=0):
+        """Append an instruction and return its position."""
+        self.instructions.append(op)
+        self.instructions.append(arg)
+        return len(self.instructions) - 2
+
+    def patch(self, position, arg):
+        """Set the argument of the instruction at position."""
+        self.instructions[position + 1] = arg
+
+    @property
+    def here(self):
+        """The position of the next instruction."""
+        return len(self.instructions)
+
+    def constant(self, value):
+        """The index of value among the constants."""
+        index = self._constant_index.get(id(value))
+        if index is None:
+            index = self._constant_index[id(value)] = len(self.constants)
+            self.constants.append(value)
+        return index
+
+    def global_cell(self, sym, frame):
+        """The index of the cell of global variable sym of frame."""
+        index = self._name_index.get(sym)
+        if index is None:
+            index = self._name_index[sym] = len(self.names)
+            self.names.append(sym)
+            self.cells.append(frame.cell(sym))
+        return index
+
+    def link(self, frame):
+        """Bind the global names of this code to the cells of frame."""
+        self.cells = [frame.cell(sym) for sym in self.names]
+        self._name_index = {sym: index for index, sym in enumerate(self.names)}
+
+    def make_frame(self, env, args):
+        """A new frame of env binding the formals to the list args."""
+        return env.make_call_frame(self.layout, args)
+
+    def call(self, env, args):
+        """Run this code in a new frame of env binding the formals to the list args."""
+        from .vm import execute
+        return execute(self, self.make_frame(env, args))
+
+
+def compile_expression(expr, scope):
+    """
+    Compile expr into Code that evaluates it in an environment laid out as
+    described by scope.
+    """
+    code = Code()
+    compile_expr(expr, code, scope, False)
+    code.emit(RETURN)
+    return code
+
+
+def compile_lambda(formals, body, scope, by_name=False, name=None, by_need=False):
+    """Compile the body of a lambda expression into Code that runs in a new frame."""
+    names = list(formals)
+    nparams = len(names)
+    scan_defines(body, names)
+    code = Code(name, formals, body, Layout(names, scope, nparams, by_name, by_need))
+    compile_expr(body, code, code.layout, True)
+    code.emit(RETURN)
+    return code
+
+
+def compile_expr(expr, code, scope, tail):
+    """Emit instructions into code that push the value of expr."""
+    if expr is None:
+        raise SchemeError('Cannot evaluate an undefined expression.')
+    if scheme_symbolp(expr):
+        compile_variable(expr, code, scope)
+    elif scheme_atomp(expr):
+        code.emit(LOAD_CONST, code.constant(expr))
+    elif not scheme_listp(expr):
+        raise SchemeError('malformed list: {}'.format(str(expr)))
+    else:
+        first, rest = expr.first, expr.second
+        if scheme_symbolp(first) and first in SPECIAL_FORMS:
+            SPECIAL_FORMS[first](rest, code, scope, tail)
+        else:
+            compile_application(first, rest, code, scope, tail)
+
+
+def compile_sequence(exprs, code, scope, tail):
+    if exprs is nil:
+        code.emit(LOAD_CONST, code.constant(okay))
+        return
+    while exprs.second is not nil:
+        compile_expr(exprs.first, code, scope, False)
+        code.emit(POP)
+        exprs = exprs.second
+    compile_expr(exprs.first, code, scope, tail)
+
+
+# Variables
+
+
+def pack(high, low):
+    """
+    One argument holding the numbers high and low, as (high << 16) | low. The
+    instructions are stored as signed 32-bit integers, so high must be less
+    than 1 << 15, and low less than 1 << 16.
+    """
+    if not (0 <= high < 1 << 15 and 0 <= low < 1 << 16):
+        raise SchemeError('too many variables, constants or nested frames to compile')
+    return high << 16 | low
+
+
+def compile_variable(sym, code, scope):
+    depth, layout = resolve(sym, scope)
+    if isinstance(layout, Layout):
+        slot = layout.index[sym]
+        if slot >= layout.nparams or layout.by_name:
+            code.emit(LOAD_CHECKED, pack(depth, slot))
+        elif depth == 0:
+            code.emit(LOAD_LOCAL, slot)
+        else:
+            code.emit(LOAD_OUTER, pack(depth, slot))
+    elif layout is None:
+        code.emit(LOAD_NAME, pack(depth, code.constant(sym)))
+    else:
+        code.emit(LOAD_GLOBAL, code.global_cell(sym, layout))
+
+
+def compile_store(sym, code, scope, define):
+    """Emit an instruction that pops a value into variable sym, by define or by set!."""
+    depth, layout = resolve(sym, scope)
+    if define and not (depth == 0 and isinstance(layout, Layout)):
+        # A name defined outside the layout of the current frame
+        if isinstance(scope, GlobalFrame):
+            code.emit(STORE_GLOBAL, code.global_cell(sym, scope))
+        else:
+            code.emit(STORE_NAME, code.constant(sym))
+    elif isinstance(layout, Layout):
+        code.emit(STORE_LOCAL if define else SET_LOCAL, pack(depth, layout.index[sym]))
+    elif layout is None:
+        code.emit(SET_NAME, pack(depth, code.constant(sym)))
+    else:
+        code.emit(SET_GLOBAL, code.global_cell(sym, layout))
+
+
+# Special forms
+
+
+def compile_lambda_form(vals, code, scope, tail, function_type=LambdaProcedure, name=None):
+    check_form(vals, 2)
+    formals = vals[0]
+    check_formals(formals)
+    body = vals[1]
+    if len(vals) > 2:
+        body = make_pair(begin_sym, scheme_cdr(vals))
+    child = compile_lambda(formals, body, scope, issubclass(function_type, NuProcedure), name,
+                           function_type is LazyProcedure)
+    code.emit(MAKE_CLOSURE, code.constant(child))
+
+
+def compile_nu_form(vals, code, scope, tail):
+    compile_lambda_form(vals, code, scope, tail, NuProcedure)
+
+
+def compile_lazy_form(vals, code, scope, tail):
+    compile_lambda_form(vals, code, scope, tail, LazyProcedure)
+
+
+def compile_define_form(vals, code, scope, tail):
+    check_form(vals, 2)
+    target = vals[0]
+    if scheme_symbolp(target): # for assigning values
+        check_form(vals, 2, 2)
+        value = vals[1]
+        if scheme_pairp(value) and value.first is lambda_sym:
+            compile_lambda_form(value.second, code, scope, False, name=target)
+        else:
+            compile_expr(value, code, scope, False)
+    elif scheme_pairp(target): # for defining functions
+        formals = scheme_cdr(target)
+        func_name = scheme_car(target)
+        if not scheme_symbolp(func_name):
+            raise SchemeError('bad variable')
+        compile_lambda_form(scheme_cons(formals, scheme_cdr(vals)), code, scope, False, name=func_name)
+        target = func_name
+    else:
+        raise SchemeError('bad argument to define')
+    compile_store(target, code, scope, True)
+    code.emit(LOAD_CONST, code.constant(target))
+
+
+def compile_set_form(vals, code, scope, tail):
+    check_form(vals, 2, 2)
+    target = vals[0]
+    if not scheme_symbolp(target):
+        raise SchemeError('bad argument to set!')
+    compile_expr(vals[1], code, scope, False)
+    compile_store(target, code, scope, False)
+    code.emit(LOAD_CONST, code.constant(okay))
+
+
+def compile_quote_form(vals, code, scope, tail):
+    check_form(vals, 1, 1)
+    code.emit(LOAD_CONST, code.constant(vals[0]))
+
+
+def compile_profile_form(vals, code, scope, tail):
+    check_form(vals, 1, 1)
+    code.emit(PROFILE, code.constant(vals))
+
+
+def compile_let_form(vals, code, scope, tail):
+    check_form(vals, 2)
+    bindings = vals[0]
+    if not scheme_listp(bindings):
+        raise SchemeError('bad bindings list in let form')
+    names = []
+    for binding in bindings:
+        check_form(binding, 2, 2)
+        names.append(binding[0])
+        compile_expr(binding[1], code, scope, False)
+
+    # Check if duplicate bindings
+    check_formals(names)
+    nparams = len(names)
+    scan_defines(vals.second, names)
+    layout = Layout(names, scope, nparams)
+    code.emit(ENTER_FRAME, code.constant(layout))
+    compile_sequence(vals.second, code, layout, tail)
+    code.emit(LEAVE_FRAME)
+
+
+def compile_if_form(vals, code, scope, tail):
+    check_form(vals, 2, 3)
+    compile_expr(vals[0], code, scope, False)
+    jump_if_false = code.emit(JUMP_IF_FALSE)
+    compile_expr(vals[1], code, scope, tail)
+    jump = code.emit(JUMP)
+    code.patch(jump_if_false, code.here)
+    if len(vals) == 3:
+        compile_expr(vals[2], code, scope, tail)
+    else:
+        code.emit(LOAD_CONST, code.constant(okay))
+    code.patch(jump, code.here)
+
+
+def compile_and_form(vals, code, scope, tail):
+    compile_junction(vals, code, scope, tail, scheme_true, JUMP_IF_FALSE_OR_POP)
+
+
+def compile_or_form(vals, code, scope, tail):
+    compile_junction(vals, code, scope, tail, scheme_false, JUMP_IF_TRUE_OR_POP)
+
+
+def compile_junction(vals, code, scope, tail, empty, jump_op):
+    """Compile the operands of and or or, leaving early with jump_op."""
+    if vals is nil:
+        code.emit(LOAD_CONST, code.constant(empty))
+        return
+    jumps = []
+    while vals.second is not nil:
+        compile_expr(vals.first, code, scope, False)
+        jumps.append(code.emit(jump_op))
+        vals = vals.second
+    compile_expr(vals.first, code, scope, tail)
+    for jump in jumps:
+        code.patch(jump, code.here)
+
+
+def compile_cond_form(vals, code, scope, tail):
+    num_clauses = len(vals)
+    jumps = []
+    for i, clause in enumerate(vals):
+        check_form(clause, 1)
+        if clause.first is else_sym:
+            if i < num_clauses - 1:
+                raise SchemeError('else must be last')
+            if clause.second is nil:
+                raise SchemeError('badly formed else clause')
+            compile_sequence(clause.second, code, scope, tail)
+            break
+        compile_expr(clause.first, code, scope, False)
+        if clause.second is nil:
+            jumps.append(code.emit(JUMP_IF_TRUE_OR_POP))
+        else:
+            next_clause = code.emit(JUMP_IF_FALSE)
+            compile_sequence(clause.second, code, scope, tail)
+            jumps.append(code.emit(JUMP))
+            code.patch(next_clause, code.here)
+    else:
+        code.emit(LOAD_CONST, code.constant(okay))
+    for jump in jumps:
+        code.patch(jump, code.here)
+
+
+def compile_begin_form(vals, code, scope, tail):
+    check_form(vals, 0)
+    compile_sequence(vals, code, scope, tail)
+
+
+def compile_application(operator, operands, code, scope, tail):
+    global_frame = None
+    if scheme_symbolp(operator):
+        global_frame = resolve(operator, scope)[1]
+    if operands is nil:
+        compile_expr(operator, code, scope, False)
+        code.emit(TAIL_CALL if tail else CALL, 0)
+        return
+    if isinstance(global_frame, GlobalFrame):
+        # Loading a global operator and checking it for by-name arguments
+        # takes a single instruction
+        load = code.emit(LOAD_OPERATOR)
+        cell = code.global_cell(operator, global_frame)
+    else:
+        compile_expr(operator, code, scope, False)
+        load = code.emit(BY_NAME)
+    nargs = 0
+    for operand in operands:
+        compile_expr(operand, code, scope, False)
+        nargs += 1
+    call = code.emit(TAIL_CALL if tail else CALL, nargs)
+    index = code.constant((tuple(operands), call))
+    if code.instructions[load] == LOAD_OPERATOR:
+        index = pack(index, cell)
+    code.patch(load, index)
+
+
+# Collected special forms
+SPECIAL_FORMS = {
+    and_sym: compile_and_form,
+    begin_sym: compile_begin_form,
+    cond_sym: compile_cond_form,
+    define_sym: compile_define_form,
+    if_sym: compile_if_form,
+    lambda_sym: compile_lambda_form,
+    lazy_sym: compile_lazy_form,
+    let_sym: compile_let_form,
+    nu_sym: compile_nu_form,
+    or_sym: compile_or_form,
+    profile_sym: compile_profile_form,
+    quote_sym: compile_quote_form,
+    set_bang_sym: compile_set_form,
+}
+
+
+# Disassembly
+
+
+def disassemble(code):
+    """
+    Return a listing of the instructions of code, followed by those of the
+    codes of the lambda expressions it contains.
+    """
+    if code.layout is None:
+        lines = ['<expression>:']
+    else:
+        lines = ['{} {}:'.format(code.name or 'lambda', str(code.formals))]
+    instructions = code.instructions
+    children = []
+    # The layouts of the frames entered by let forms, innermost last
+    scopes = [code.layout]
+    for pc in range(0, len(instructions), 2):
+        op, arg = instructions[pc], instructions[pc + 1]
+        if op == LEAVE_FRAME:
+            scopes.pop()
+        description = describe(code, op, arg, scopes[-1])
+        lines.append('{:>6} {:<21}{:>6}  {}'.format(pc, OPNAMES[op], arg, description))
+        if op == MAKE_CLOSURE:
+            children.append(code.constants[arg])
+        elif op == ENTER_FRAME:
+            scopes.append(code.constants[arg])
+    for child in children:
+        lines.append('')
+        lines.append(disassemble(child))
+    return '\n'.join(lines)
+
+
+def describe(code, op, arg, scope):
+    """A description of the argument of an instruction of code run in a frame laid out by scope."""
+    if op in (LOAD_CONST, STORE_NAME):
+        value = code.constants[arg]
+        return '({})'.format(value.print_repr() if isinstance(value, SchemeValue) else value)
+    elif op in (LOAD_GLOBAL, STORE_GLOBAL, SET_GLOBAL):
+        return '({})'.format(code.names[arg])
+    elif op == LOAD_OPERATOR:
+        return '({}, call at {})'.format(code.names[arg & 0xffff], code.constants[arg >> 16][1])
+    elif op in (LOAD_NAME, SET_NAME):
+        return '({} up {})'.format(code.constants[arg & 0xffff], arg >> 16)
+    elif op in (LOAD_LOCAL, LOAD_OUTER, LOAD_CHECKED, STORE_LOCAL, SET_LOCAL):
+        depth, slot = (0, arg) if op == LOAD_LOCAL else (arg >> 16, arg & 0xffff)
+        for _ in range(depth):
+            scope = scope.parent if isinstance(scope, Layout) else None
+        name = scope.names[slot] if isinstance(scope, Layout) else 'slot {}'.format(slot)
+        return '({}{})'.format(name, ' up {}'.format(depth) if depth else '')
+    elif op == MAKE_CLOSURE:
+        return '({!r})'.format(code.constants[arg])
+    elif op == BY_NAME:
+        return '(call at {})'.format(code.constants[arg][1])
+    elif op == ENTER_FRAME:
+        return '({})'.format(', '.join(map(str, code.constants[arg].names)))
+    elif op in (JUMP, JUMP_IF_FALSE, JUMP_IF_FALSE_OR_POP, JUMP_IF_TRUE_OR_POP):
+        return '(to {})'.format(arg)
+    return ''
+
+
+def scheme_disassemble(procedure):
+    """Print the bytecode of a compound procedure, compiling it first if needed."""
+    check_type(procedure, lambda x: isinstance(x, LambdaProcedure), 0, 'disassemble')
+    code = procedure.code
+    if not isinstance(code, Code):
+        from .compiler import scope_of
+        code = compile_lambda(procedure.formals, procedure.body, scope_of(procedure.env),
+                              isinstance(procedure, NuProcedure), procedure.name,
+                              isinstance(procedure, LazyProcedure))
+    print(disassemble(code))
+    return okay
@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+# Author: Forrest Chang (forrestchang7@gmail.com)
+
+"""
+The cache module keeps the expressions of loaded source files on disk, the way
+Python keeps .pyc files, so that loading an unchanged file again skips reading.
+
+Each source file gets an entry in a __schemycache__ directory beside it. An
+entry holds either the parsed expressions of the file, or for the bytecode vm
+the Code compiled from them, and is only used if the path, modification time,
+size and content hash of the source all match the ones it was made from.
+
+Values are stored in a compact postfix form: a string of one-byte opcodes, an
+array of the counts and indexes they take, a list of their other arguments and
+a table of the names of the symbols they use, all written with marshal.
+Building the values back is a single loop over the opcodes.
+"""
+
+import gc
+import hashlib
+import marshal
+import os
+from array import array
+
+from .bytecode import Code
+from .environments import GlobalFrame, Layout
+from .exception import SchemeError
+from .stats import counters
+from .types import *
+from .types import _small_ints
+
+MAGIC = b'schemy-cache-3'
+CACHE_DIR = '__schemycache__'
+
+# Larger files are streamed through the interpreter instead, as caching them
+# would hold all of their expressions in memory at once
+MAX_SOURCE_SIZE = 1 << 24
+
+# Opcodes
+NIL = ord('n')
+TRUE = ord('t')
+FALSE = ord('f')
+OKAY = ord('o')
+NONE = ord('N')
+INT = ord('i')          # a SchemeInt from the next argument
+FLOAT = ord('d')        # a SchemeFloat from the next argument
+STRING = ord('s')       # a SchemeStr from the next argument
+SYMBOL = ord('y')       # the symbol numbered by the next count in the symbol table
+NUMBER = ord('I')       # the next argument itself
+LIST = ord('l')         # a list of the next count items, and the tail after them
+VECTOR = ord('v')       # a SchemeVector of the next count items
+TUPLE = ord('u')        # a tuple of the next count items
+GLOBAL = ord('g')       # the global frame the values are loaded into
+LAYOUT = ord('L')       # a Layout of a parent and names; the next counts are nparams, by_name and by_need
+MEMO = ord('m')         # the list, vector or Layout made earlier, numbered by the next count
+CODE = ord('c')         # a Code of a name, formals, body, layout, constants and names;
+                        # the next argument is the bytes of an array of the instructions
+
+
+def cache_path(filename, kind):
+    """The path of the cache entry of kind for source file filename."""
+    directory, name = os.path.split(os.path.abspath(filename))
+    return os.path.join(directory, CACHE_DIR, '{}.{}.scmc'.format(name, kind))
+
+
+def source_key(filename, data=None):
+    """
+    The key identifying the contents of source file filename: path, mtime, size
+    and hash. Data, if given, is the contents of the file, such as a memory map
+    of it, and is hashed in place of reading the file again.
+    """
+    if data is not None:
+        stat = os.stat(filename)
+        return os.path.abspath(filename), stat.st_mtime_ns, stat.st_size, hashlib.sha256(data).digest()
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as infile:
+        for chunk in iter(lambda: infile.read(1 << 16), b''):
+            digest.update(chunk)
+        stat = os.fstat(infile.fileno())
+    return os.path.abspath(filename), stat.st_mtime_ns, stat.st_size, digest.digest()
+
+
+def read_cache(filename, key, kind, frame):
+    """
+    Return the cached values of kind for source file filename, whose contents
+    have the source_key key, loaded for global frame frame, or None if there
+    is no valid entry.
+    """
+    try:
+        with open(cache_path(filename, kind), 'rb') as infile:
+            header = marshal.load(infile)
+            if header != (MAGIC, kind) + key:
+                return None
+            return load_values(marshal.load(infile), frame)
+    except (OSError, EOFError, ValueError, TypeError, IndexError, StopIteration, SchemeError):
+        return None
+
+
+def write_cache(filename, key, kind, values):
+    """
+    Store values as the cache entry of kind for source file filename, whose
+    contents have the source_key key. Failing to write the cache is not an error.
+    """
+    path = cache_path(filename, kind)
+    try:
+        data = dump_values(values)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temp, 'wb') as outfile:
+            marshal.dump((MAGIC, kind) + key, outfile)
+            marshal.dump(data, outfile)
+        os.replace(temp, path)
+    except (OSError, OverflowError, SchemeError):
+        pass
+
+
+# Encoding
+
+
+def dump_values(value):
+    """
+    Encode value, made of Scheme values, Code, Layouts, tuples, integers and
+    None, as a tuple that marshal can write.
+    """
+    encoder = Encoder()
+    encoder.encode(value)
+    counts = encoder.counts
+    typecode = 'H' if max(counts, default=0) < 1 << 16 else 'I'
+    counts = array(typecode, counts).tobytes()
+    return bytes(encoder.ops), typecode, counts, encoder.args, list(encoder.symbols)
+
+
+class Encoder:
+    """
+    The state of encoding values: the opcodes, counts and arguments so far,
+    the numbers of the symbols, and the lists, vectors and Layouts encoded
+    already. Those are shared, as the expressions in Code constants are parts
+    of the bodies of the Code.
+    """
+
+    def __init__(self):
+        self.ops = bytearray()
+        self.counts = []
+        self.args = []
+        self.symbols = {}
+        self.memo = {}
+        # Values are remembered by id, so they are kept alive while encoding
+        self.seen = []
+
+    def remember(self, value):
+        self.memo[id(value)] = len(self.seen)
+        self.seen.append(value)
+
+    def recall(self, value):
+        """Encode a reference to value if it was encoded already, and return whether it was."""
+        index = self.memo.get(id(value))
+        if index is None:
+            return False
+        self.ops.append(MEMO)
+        self.counts.append(index)
+        return True
+
+    def encode(self, value):
+        """
+        Encode value. The parts of lists, vectors, tuples, Layouts and Code are
+        encoded in turn from a stack of values still to encode, so that deeply
+        nested values do not exhaust the Python stack, and each is followed by
+        the _Finish that ends it.
+        """
+        ops, counts, args = self.ops, self.counts, self.args
+        stack = [value]
+        push = stack.append
+        while stack:
+            value = stack.pop()
+            if type(value) is _Finish:
+                ops.append(value.op)
+                counts.extend(value.counts)
+                if value.arg is not None:
+                    args.append(value.arg)
+                if value.value is not None:
+                    self.remember(value.value)
+            elif value is nil:
+                ops.append(NIL)
+            elif value is scheme_true:
+                ops.append(TRUE)
+            elif value is scheme_false:
+                ops.append(FALSE)
+            elif value is okay:
+                ops.append(OKAY)
+            elif value is None:
+                ops.append(NONE)
+            elif type(value) is SchemeInt:
+                ops.append(INT)
+                args.append(int(value))
+            elif type(value) is SchemeFloat:
+                ops.append(FLOAT)
+                args.append(float(value))
+            elif type(value) is SchemeStr:
+                ops.append(STRING)
+                args.append(str(value))
+            elif type(value) is SchemeSymbol:
+                ops.append(SYMBOL)
+                index = self.symbols.get(value.name)
+                if index is None:
+                    index = self.symbols[value.name] = len(self.symbols)
+                counts.append(index)
+            elif type(value) is int:
+                ops.append(NUMBER)
+                args.append(value)
+            elif type(value) is Pair:
+                if self.recall(value):
+                    continue
+                items = []
+                head = value
+                while type(value) is Pair:
+                    items.append(value.first)
+                    value = value.second
+                push(_Finish(LIST, (len(items),), value=head))
+                push(value)
+                items.reverse()
+                stack.extend(items)
+            elif type(value) is SchemeVector:
+                if self.recall(value):
+                    continue
+                push(_Finish(VECTOR, (len(value.items),), value=value))
+                stack.extend(reversed(value.items))
+            elif type(value) is tuple:
+                push(_Finish(TUPLE, (len(value),)))
+                stack.extend(reversed(value))
+            elif isinstance(value, GlobalFrame):
+                ops.append(GLOBAL)
+            elif type(value) is Layout:
+                if self.recall(value):
+                    continue
+                push(_Finish(LAYOUT, (value.nparams, int(value.by_name), int(value.by_need)), value=value))
+                push(value.names)
+                push(value.parent)
+            elif type(value) is Code:
+                push(_Finish(CODE, (), arg=array('i', value.instructions).tobytes()))
+                for part in reversed((value.name, value.formals, value.body, value.layout,
+                                      tuple(value.constants), tuple(value.names))):
+                    push(part)
+            else:
+                raise SchemeError('cannot cache {}'.format(repr(value)))
+
+
+class _Finish:
+    """The opcode, counts and argument that end a value whose parts have been encoded, and the value to remember."""
+
+    __slots__ = ('op', 'counts', 'arg', 'value')
+
+    def __init__(self, op, counts, arg=None, value=None):
+        self.op = op
+        self.counts = counts
+        self.arg = arg
+        self.value = value
+
+
+# Decoding
+
+
+def load_values(data, frame):
+    """
+    Build the value encoded as data, linking global names to the cells of frame.
+    The cyclic garbage collector is paused meanwhile: every value made is kept,
+    and it would otherwise walk them all again each few thousand allocations.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return decode(data, frame)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def decode(data, frame):
+    """Build the value encoded as data, linking global names to the cells of frame."""
+    ops, typecode, counts, args, names = data
+    symbols = [intern(name) for name in names]
+    stack = []
+    push = stack.append
+    memo = []
+    next_count = iter(array(typecode, counts)).__next__
+    next_arg = iter(args).__next__
+    # Numbers and pairs are made directly, skipping the checks of scnum and
+    # make_pair, as they are most of what is loaded
+    small_int = _small_ints.get
+    new_pair = object.__new__
+    for op in ops:
+        if op == SYMBOL:
+            push(symbols[next_count()])
+        elif op == LIST:
+            count = next_count()
+            value = stack.pop()
+            for item in reversed(stack[-count:]):
+                pair = new_pair(Pair)
+                pair.first = item
+                pair.second = value
+                value = pair
+            counters['pairs'] += count
+            del stack[-count:]
+            memo.append(value)
+            push(value)
+        elif op == INT:
+            number = next_arg()
+            value = small_int(number)
+            push(SchemeInt(number) if value is None else value)
+        elif op == NIL:
+            push(nil)
+        elif op == STRING:
+            push(scstr(next_arg()))
+        elif op == FLOAT:
+            push(SchemeFloat(next_arg()))
+        elif op == TRUE:
+            push(scheme_true)
+        elif op == FALSE:
+            push(scheme_false)
+        elif op == OKAY:
+            push(okay)
+        elif op == NONE:
+            push(None)
+        elif op == NUMBER:
+            push(next_arg())
+        elif op == TUPLE:
+            count = next_count()
+            value = tuple(stack[len(stack) - count:])
+            del stack[len(stack) - count:]
+            push(value)
+        elif op == VECTOR:
+            count = next_count()
+            value = SchemeVector(stack[len(stack) - count:])
+            del stack[len(stack) - count:]
+            memo.append(value)
+            push(value)
+        elif op == GLOBAL:
+            push(frame)
+        elif op == LAYOUT:
+            names = stack.pop()
+            parent = stack.pop()
+            layout = Layout(names, parent, next_count(), bool(next_count()), bool(next_count()))
+            memo.append(layout)
+            push(layout)
+        elif op == MEMO:
+            push(memo[next_count()])
+        elif op == CODE:
+            names = stack.pop()
+            constants = stack.pop()
+            layout = stack.pop()
+            body = stack.pop()
+            formals = stack.pop()
+            code = Code(stack.pop(), formals, body, layout)
+            code.instructions = array('i', next_arg()).tolist()
+            code.constants = list(constants)
+            code.names = list(names)
+            code.link(frame)
+            push(code)
+        else:
+            raise SchemeError('bad cache opcode: {}'.format(op))
+    return stack.pop()
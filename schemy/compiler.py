@@ -0,0 +1,613 @@
+# -*- coding: utf-8 -*-
+# Author: Forrest Chang (forrestchang7@gmail.com)
+
+"""
+The compiler module analyzes Scheme expressions ahead of evaluation.
+
+Each expression is turned once into a tree of Python closures that take an
+environment and return the value of the expression in it. Special forms are
+dispatched and checked at analysis time, so evaluating the result never walks
+the source Pair again.
+
+A call in tail position returns a TailCall instead of making the call, and the
+procedure that returned it makes the call in a loop, so tail calls run in
+constant Python stack.
+"""
+
+from .environments import CallFrame, GlobalFrame, Layout
+from .eval import check_form, check_formals, do_profile_form
+from .exception import SchemeError
+from .procedure import LambdaProcedure, LazyProcedure, NuProcedure, PrimitiveProcedure, Promise, Thunk
+from .stats import applications, counters
+from .types import *
+
+
+def compile_eval(expr, env):
+    """
+    Evaluate Scheme expression expr in env by analyzing it first.
+
+    >>> env = create_global_frame(compile_eval)
+    >>> compile_eval(read_line("(+ 1 2)"), env)
+    scnum(3)
+    """
+    return analyze(expr, scope_of(env))(env)
+
+
+def scope_of(env):
+    """
+    The scope that code evaluated in env is analyzed in: the layout of env, the
+    global frame itself, or None if variables must be looked up by name.
+    """
+    frame = env
+    while isinstance(frame, CallFrame):
+        if frame.bindings:
+            return None
+        frame = frame.parent
+    if isinstance(env, CallFrame):
+        return env.layout
+    elif isinstance(env, GlobalFrame):
+        return env
+    return None
+
+
+def analyze(expr, scope, tail=False):
+    """
+    Return a closure that evaluates Scheme expression expr in the environment
+    it is called with, which must be laid out as described by scope. If tail is
+    true, expr is in tail position of a procedure body and the closure may return
+    a TailCall for the procedure to make.
+    """
+    if expr is None:
+        raise SchemeError('Cannot evaluate an undefined expression.')
+    if scheme_symbolp(expr):
+        return analyze_variable(expr, scope)
+    elif scheme_atomp(expr):
+        return analyze_constant(expr)
+    elif not scheme_listp(expr):
+        raise SchemeError('malformed list: {}'.format(str(expr)))
+    first, rest = expr.first, expr.second
+    if scheme_symbolp(first) and first in SPECIAL_FORMS:
+        return SPECIAL_FORMS[first](rest, scope, tail)
+    return analyze_application(first, rest, scope, tail)
+
+
+def analyze_constant(value):
+    def execute(env):
+        return value
+    return execute
+
+
+# Variables
+
+
+def resolve(sym, scope):
+    """
+    Return the address of variable sym seen from scope as a tuple (depth, layout),
+    where layout is the Layout binding sym depth frames up, the GlobalFrame, or None
+    if the frame depth levels up must be searched by name.
+    """
+    depth = 0
+    while isinstance(scope, Layout):
+        if sym in scope.index:
+            return depth, scope
+        scope = scope.parent
+        depth += 1
+    return depth, scope
+
+
+def analyze_variable(sym, scope):
+    depth, layout = resolve(sym, scope)
+    if isinstance(layout, Layout):
+        return analyze_local(sym, depth, layout)
+    elif layout is None:
+        return analyze_dynamic(sym, depth)
+    return analyze_global(sym, layout.cell(sym))
+
+
+def analyze_local(sym, depth, layout):
+    slot = layout.index[sym]
+    if slot < layout.nparams and not layout.by_name:
+        if depth == 0:
+            def execute(env):
+                return env.values[slot]
+        elif depth == 1:
+            def execute(env):
+                return env.parent.values[slot]
+        else:
+            def execute(env):
+                for _ in range(depth):
+                    env = env.parent
+                return env.values[slot]
+        return execute
+
+    # Arguments passed by name must be forced, and names defined in the body
+    # may not be bound yet.
+    def execute(env):
+        for _ in range(depth):
+            env = env.parent
+        value = env.values[slot]
+        if value is None:
+            return env.lookup(sym)
+        if isinstance(value, Thunk):
+            return value.get_actual_value()
+        return value
+    return execute
+
+
+def analyze_global(sym, cell):
+    def execute(env):
+        value = cell.value
+        if value is None:
+            # The name may have been defined since in a frame around env, by eval
+            return env.lookup(sym)
+        return value
+    return execute
+
+
+def analyze_dynamic(sym, depth):
+    def execute(env):
+        for _ in range(depth):
+            env = env.parent
+        value = env.lookup(sym)
+        if isinstance(value, Thunk):
+            return value.get_actual_value()
+        return value
+    return execute
+
+
+def scan_defines(expr, names):
+    """
+    Append to the list names the variables that define forms in expr bind in the
+    frame expr is evaluated in. Nested lambda, nu and let bodies have frames of
+    their own and are not searched.
+    """
+    if not isinstance(expr, Pair) or not scheme_listp(expr):
+        return
+    first = expr.first
+    if first is quote_sym or first is lambda_sym or first is nu_sym or first is lazy_sym:
+        return
+    elif first is define_sym and expr.second is not nil:
+        target = expr.second.first
+        if isinstance(target, Pair):
+            target = target.first
+        else:
+            for value in expr.second.second:
+                scan_defines(value, names)
+        if scheme_symbolp(target) and target not in names:
+            names.append(target)
+    elif first is let_sym and expr.second is not nil and scheme_listp(expr.second.first):
+        for binding in expr.second.first:
+            if isinstance(binding, Pair) and binding.second is not nil:
+                scan_defines(binding.second, names)
+    else:
+        for subexpr in expr:
+            scan_defines(subexpr, names)
+
+
+def analyze_sequence(exprs, scope, tail=False):
+    """Analyze a Scheme list of expressions evaluated in order for the value of the last."""
+    if exprs is nil:
+        return analyze_constant(okay)
+    exprs = list(exprs)
+    init = [analyze(expr, scope) for expr in exprs[:-1]]
+    last = analyze(exprs[-1], scope, tail)
+    if not init:
+        return last
+    def execute(env):
+        for proc in init:
+            proc(env)
+        return last(env)
+    return execute
+
+
+# Procedures
+
+
+class TailCall:
+    """A call to analyzed code with a list of arguments, left for the caller to make."""
+
+    __slots__ = ('code', 'env', 'args')
+
+    def __init__(self, code, env, args):
+        self.code = code
+        self.env = env
+        self.args = args
+
+
+class LambdaCode:
+    """
+    The analyzed form of a lambda expression. It is shared by every procedure
+    the expression creates, and runs their bodies in fresh call frames.
+    """
+
+    def __init__(self, formals, body, scope, by_name=False, by_need=False):
+        names = list(formals)
+        nparams = len(names)
+        scan_defines(body, names)
+        self.layout = Layout(names, scope, nparams, by_name, by_need)
+        self.nparams = nparams
+        self.padding = self.layout.padding
+        self.body = analyze(body, self.layout, True)
+
+    def make_frame(self, env, args):
+        """A new frame of env binding the formals to the list args."""
+        if len(args) != self.nparams:
+            raise SchemeError('different number of formal parameters and args')
+        if self.padding:
+            args.extend(self.padding)
+        return CallFrame(self.layout, args, env)
+
+    def call(self, env, args):
+        """
+        Evaluate the body in a new frame of env binding the formals to the list args,
+        then make the tail calls it returns until one returns a value.
+        """
+        if len(args) != self.nparams:
+            raise SchemeError('different number of formal parameters and args')
+        if self.padding:
+            args.extend(self.padding)
+        result = self.body(CallFrame(self.layout, args, env))
+        while type(result) is TailCall:
+            code = result.code
+            result = code.body(code.make_frame(result.env, result.args))
+        return result
+
+    def tail_call(self, env, args):
+        return TailCall(self, env, args)
+
+
+class CompiledThunk(Thunk):
+    """A by-name argument whose operand has already been analyzed."""
+
+    def __init__(self, operand, proc, env):
+        Thunk.__init__(self, nil, operand, env)
+        self.proc = proc
+
+    def get_actual_value(self):
+        counters['thunks_forced'] += 1
+        return self.proc(self.env)
+
+
+class CompiledPromise(Promise):
+    """A by-need argument whose operand has already been analyzed."""
+
+    def __init__(self, operand, proc, env):
+        Promise.__init__(self, nil, operand, env)
+        self.proc = proc
+
+    def force(self):
+        return self.proc(self.env)
+
+
+def compile_procedure(procedure):
+    """Analyze and cache the body of a procedure created outside the compiler."""
+    by_name = isinstance(procedure, NuProcedure)
+    by_need = isinstance(procedure, LazyProcedure)
+    procedure.code = LambdaCode(procedure.formals, procedure.body, scope_of(procedure.env), by_name, by_need)
+    return procedure.code
+
+
+def apply_procedure(procedure, args, env):
+    """Apply procedure to the Python list of argument values args in env."""
+    if type(procedure) is PrimitiveProcedure:
+        applications['primitive'] += 1
+        if procedure.use_env:
+            args.append(env)
+        try:
+            return procedure.func(*args)
+        except TypeError as e:
+            raise SchemeError(e)
+    elif isinstance(procedure, LambdaProcedure):
+        applications[procedure.kind] += 1
+        code = procedure.code or compile_procedure(procedure)
+        return code.call(procedure.env, args)
+    expr, env = procedure.apply(scheme_list(*args), env)
+    return expr
+
+
+def analyze_application(operator, operands, scope, tail=False):
+    if scheme_symbolp(operator):
+        depth, layout = resolve(operator, scope)
+        if isinstance(layout, GlobalFrame):
+            return analyze_global_application(operator, layout.cell(operator), operands, scope, tail)
+    return analyze_general_application(operator, operands, scope, tail)
+
+
+def analyze_general_application(operator, operands, scope, tail=False):
+    fproc = analyze(operator, scope)
+    aprocs = [analyze(operand, scope) for operand in operands]
+    return application(fproc, operands, aprocs, tail)
+
+
+def application(fproc, operands, aprocs, tail=False):
+    """
+    A closure applying the procedure fproc evaluates to, with the operands,
+    analyzed as aprocs, evaluated or delayed as it takes them.
+    """
+    operands = list(operands)
+    def execute(env):
+        procedure = fproc(env)
+        if isinstance(procedure, LazyProcedure):
+            strict = procedure.strictness(len(aprocs))
+            args = [aproc(env) if strict[i] else CompiledPromise(operand, aproc, env)
+                    for i, (operand, aproc) in enumerate(zip(operands, aprocs))]
+        elif isinstance(procedure, NuProcedure):
+            args = [CompiledThunk(operand, aproc, env) for operand, aproc in zip(operands, aprocs)]
+        else:
+            args = [aproc(env) for aproc in aprocs]
+        if tail and isinstance(procedure, LambdaProcedure):
+            applications[procedure.kind] += 1
+            code = procedure.code or compile_procedure(procedure)
+            return TailCall(code, procedure.env, args)
+        return apply_procedure(procedure, args, env)
+    return execute
+
+
+def analyze_global_application(operator, cell, operands, scope, tail=False):
+    """
+    Analyze a call whose operator is a global variable. The call site caches how
+    to call the procedure in the variable's cell, and only looks at that procedure
+    again when the version of the cell changes.
+    """
+    aprocs = [analyze(operand, scope) for operand in operands]
+    general = application(analyze_global(operator, cell), operands, aprocs, tail)
+    version = -1
+    func = call = penv = None
+    def execute(env):
+        nonlocal version, func, call, penv
+        if cell.version != version:
+            version = cell.version
+            procedure = cell.value
+            func = call = penv = None
+            if type(procedure) is PrimitiveProcedure and not procedure.use_env:
+                func = procedure.func
+            elif type(procedure) is LambdaProcedure:
+                code = procedure.code or compile_procedure(procedure)
+                call = code.tail_call if tail else code.call
+                penv = procedure.env
+        if func is not None:
+            args = [aproc(env) for aproc in aprocs]
+            applications['primitive'] += 1
+            try:
+                return func(*args)
+            except TypeError as e:
+                raise SchemeError(e)
+        elif call is not None:
+            applications['lambda'] += 1
+            return call(penv, [aproc(env) for aproc in aprocs])
+        return general(env)
+    return execute
+
+
+# Special forms
+
+
+def analyze_lambda_form(vals, scope, tail=False, function_type=LambdaProcedure):
+    check_form(vals, 2)
+    formals = vals[0]
+    check_formals(formals)
+    body = vals[1]
+    if len(vals) > 2:
+        body = make_pair(begin_sym, scheme_cdr(vals))
+    code = LambdaCode(formals, body, scope, issubclass(function_type, NuProcedure),
+                      function_type is LazyProcedure)
+    def execute(env):
+        return function_type(formals, body, env, code)
+    return execute
+
+
+def analyze_nu_form(vals, scope, tail=False):
+    return analyze_lambda_form(vals, scope, tail, NuProcedure)
+
+
+def analyze_lazy_form(vals, scope, tail=False):
+    return analyze_lambda_form(vals, scope, tail, LazyProcedure)
+
+
+def analyze_define_form(vals, scope, tail=False):
+    check_form(vals, 2)
+    target = vals[0]
+    if scheme_symbolp(target): # for assigning values
+        check_form(vals, 2, 2)
+        value = analyze(vals[1], scope)
+    elif scheme_pairp(target): # for defining functions
+        formals = scheme_cdr(target)
+        func_name = scheme_car(target)
+        if not scheme_symbolp(func_name):
+            raise SchemeError('bad variable')
+        value = analyze_lambda_form(scheme_cons(formals, scheme_cdr(vals)), scope)
+        target = func_name
+    else:
+        raise SchemeError('bad argument to define')
+
+    value = analyze_named(value, target)
+    if isinstance(scope, Layout) and target in scope.index:
+        slot = scope.index[target]
+        def execute(env):
+            env.values[slot] = value(env)
+            return target
+    elif isinstance(scope, GlobalFrame):
+        cell = scope.cell(target)
+        def execute(env):
+            cell.assign(value(env))
+            return target
+    else:
+        def execute(env):
+            env.define(target, value(env))
+            return target
+    return execute
+
+
+def analyze_named(proc, name):
+    """A closure returning the value of proc, naming it name if it is a procedure with no name yet."""
+    def execute(env):
+        value = proc(env)
+        if isinstance(value, LambdaProcedure) and value.name is None:
+            value.name = name
+        return value
+    return execute
+
+
+def analyze_set_form(vals, scope, tail=False):
+    check_form(vals, 2, 2)
+    target = vals[0]
+    if not scheme_symbolp(target):
+        raise SchemeError('bad argument to set!')
+    value = analyze(vals[1], scope)
+    depth, layout = resolve(target, scope)
+    if isinstance(layout, Layout):
+        slot = layout.index[target]
+        def execute(env):
+            val = value(env)
+            for _ in range(depth):
+                env = env.parent
+            if env.values[slot] is None:
+                env.set(target, val)
+            else:
+                env.values[slot] = val
+            return okay
+    elif layout is None:
+        def execute(env):
+            val = value(env)
+            for _ in range(depth):
+                env = env.parent
+            env.set(target, val)
+            return okay
+    else:
+        cell = layout.cell(target)
+        def execute(env):
+            val = value(env)
+            if cell.value is None:
+                env.set(target, val)
+            else:
+                cell.assign(val)
+            return okay
+    return execute
+
+
+def analyze_quote_form(vals, scope, tail=False):
+    check_form(vals, 1, 1)
+    return analyze_constant(vals[0])
+
+
+def analyze_profile_form(vals, scope, tail=False):
+    check_form(vals, 1, 1)
+    def execute(env):
+        return do_profile_form(vals, env)[0]
+    return execute
+
+
+def analyze_let_form(vals, scope, tail=False):
+    check_form(vals, 2)
+    bindings = vals[0]
+    if not scheme_listp(bindings):
+        raise SchemeError('bad bindings list in let form')
+    names, values = [], []
+    for binding in bindings:
+        check_form(binding, 2, 2)
+        names.append(binding[0])
+        values.append(analyze(binding[1], scope))
+
+    # Check if duplicate bindings
+    check_formals(names)
+    nparams = len(names)
+    scan_defines(vals.second, names)
+    layout = Layout(names, scope, nparams)
+    padding = layout.padding
+    body = analyze_sequence(vals.second, layout, tail)
+    def execute(env):
+        return body(CallFrame(layout, [value(env) for value in values] + padding, env))
+    return execute
+
+
+def analyze_if_form(vals, scope, tail=False):
+    check_form(vals, 2, 3)
+    predicate = analyze(vals[0], scope)
+    consequent = analyze(vals[1], scope, tail)
+    if len(vals) == 3:
+        alternative = analyze(vals[2], scope, tail)
+    else:
+        alternative = analyze_constant(okay)
+    def execute(env):
+        if predicate(env) is not scheme_false:
+            return consequent(env)
+        return alternative(env)
+    return execute
+
+
+def analyze_and_form(vals, scope, tail=False):
+    if vals is nil:
+        return analyze_constant(scheme_true)
+    vals = list(vals)
+    init = [analyze(val, scope) for val in vals[:-1]]
+    last = analyze(vals[-1], scope, tail)
+    def execute(env):
+        for proc in init:
+            if proc(env) is scheme_false:
+                return scheme_false
+        return last(env)
+    return execute
+
+
+def analyze_or_form(vals, scope, tail=False):
+    if vals is nil:
+        return analyze_constant(scheme_false)
+    vals = list(vals)
+    init = [analyze(val, scope) for val in vals[:-1]]
+    last = analyze(vals[-1], scope, tail)
+    def execute(env):
+        for proc in init:
+            predicate = proc(env)
+            if predicate is not scheme_false:
+                return predicate
+        return last(env)
+    return execute
+
+
+def analyze_cond_form(vals, scope, tail=False):
+    clauses = []
+    num_clauses = len(vals)
+    for i, clause in enumerate(vals):
+        check_form(clause, 1)
+        if clause.first is else_sym:
+            if i < num_clauses - 1:
+                raise SchemeError('else must be last')
+            if clause.second is nil:
+                raise SchemeError('badly formed else clause')
+            test = analyze_constant(scheme_true)
+        else:
+            test = analyze(clause.first, scope)
+        body = None if clause.second is nil else analyze_sequence(clause.second, scope, tail)
+        clauses.append((test, body))
+    def execute(env):
+        for test, body in clauses:
+            value = test(env)
+            if value is not scheme_false:
+                if body is None:
+                    return value
+                return body(env)
+        return okay
+    return execute
+
+
+def analyze_begin_form(vals, scope, tail=False):
+    check_form(vals, 0)
+    return analyze_sequence(vals, scope, tail)
+
+
+# Collected special forms
+SPECIAL_FORMS = {
+    and_sym: analyze_and_form,
+    begin_sym: analyze_begin_form,
+    cond_sym: analyze_cond_form,
+    define_sym: analyze_define_form,
+    if_sym: analyze_if_form,
+    lambda_sym: analyze_lambda_form,
+    lazy_sym: analyze_lazy_form,
+    let_sym: analyze_let_form,
+    nu_sym: analyze_nu_form,
+    or_sym: analyze_or_form,
+    profile_sym: analyze_profile_form,
+    quote_sym: analyze_quote_form,
+    set_bang_sym: analyze_set_form,
+}
@@ -1,12 +1,15 @@
 # -*- coding: utf-8 -*-
 # Author: Forrest Chang (forrestchang7@gmail.com)
 from .exception import SchemeError
-from .types import intern, scheme_car, nil, scheme_cdr, SchemeValue
+from .stats import counters, note_stack_depth
+from .types import intern, SchemeValue
 
 
 class Frame:
     """An environment binds Scheme symbols to Scheme values."""
 
+    __slots__ = ('bindings', 'parent')
+
     def __init__(self, parent):
         """An empty frame with a Parent frame (that may be None)."""
         self.bindings = {}
@@ -29,10 +32,19 @@ class Frame:
         if symbol in self.bindings:
             return self.bindings[symbol]
         elif self.parent:
-            return Frame.lookup(self.parent, symbol)
+            return self.parent.lookup(symbol)
         else:
             raise SchemeError('unknown identifier: {0}'.format(str(symbol)))
 
+    def set(self, sym, val):
+        """Rebind Scheme symbol sym to val in the nearest frame that binds it."""
+        if sym in self.bindings:
+            self.bindings[sym] = val
+        elif self.parent:
+            self.parent.set(sym, val)
+        else:
+            raise SchemeError('unknown identifier: {0}'.format(str(sym)))
+
     def global_frame(self):
         """The global environment at the root of the parent chain."""
         e = self
@@ -45,19 +57,162 @@ class Frame:
         Return a new local frame whose parent is self, in which the symbol in the Scheme formal
         parameter list formals are bound to the Scheme values in the Scheme value list vals. Raise an
         error if too many or too few arguments are given.
+
+        Formals may also be a Layout precomputed from the formal parameter list.
         """
-        frame = Frame(self)
-        if len(formals) == len(vals):
-            while formals != nil and vals != nil:
-                frame.define(scheme_car(formals), scheme_car(vals))
-                formals, vals = scheme_cdr(formals), scheme_cdr(vals)
-        else:
+        if not isinstance(formals, Layout):
+            formals = Layout(formals)
+        values = list(vals)
+        if len(values) != formals.nparams:
             raise SchemeError('different number of formal parameters and args')
-
+        if formals.padding:
+            values.extend(formals.padding)
+        return CallFrame(formals, values, self)
 
     def define(self, sym, val):
         """Define Scheme symbol sym to have value val in self."""
         assert isinstance(val, SchemeValue)
         if type(sym) is str:
             sym = intern(sym)
-        self.bindings[sym] = val
\ No newline at end of file
+        self.bindings[sym] = val
+
+
+class Layout:
+    """
+    The shape shared by all frames of one procedure body: the slot that holds each
+    name bound in the frame, and the scope the body is nested in. The parent is
+    another Layout, the GlobalFrame the body was analyzed against, or None when the
+    enclosing frames are only known at run time and must be searched by name.
+
+    The first nparams slots hold the arguments, and hold thunks when by_name is
+    set, which are promises when by_need is set too; the remaining slots hold
+    names defined inside the body.
+    """
+
+    def __init__(self, names, parent=None, nparams=None, by_name=False, by_need=False):
+        self.names = tuple(names)
+        self.index = {name: slot for slot, name in enumerate(self.names)}
+        self.parent = parent
+        self.nparams = len(self.names) if nparams is None else nparams
+        self.padding = [None] * (len(self.names) - self.nparams)
+        self.by_name = by_name
+        self.by_need = by_need
+
+    def __repr__(self):
+        return 'Layout({})'.format(', '.join(map(str, self.names)))
+
+
+class CallFrame(Frame):
+    """
+    A frame whose bindings live in a list of values addressed by slot, laid out
+    by a Layout. Names defined at run time that the layout does not know about
+    are kept in a bindings dict, which is only created when the first of them is.
+    """
+
+    __slots__ = ('layout', 'values')
+
+    def __init__(self, layout, values, parent):
+        self.layout = layout
+        self.values = values
+        self.bindings = None
+        self.parent = parent
+        frames = counters['frames'] = counters['frames'] + 1
+        if not frames & 1023:
+            note_stack_depth()
+
+    def __repr__(self):
+        s = ['{0}: {1}'.format(k, v) for k, v in zip(self.layout.names, self.values)]
+        if self.bindings:
+            s += sorted('{0}: {1}'.format(k, v) for k, v in self.bindings.items())
+        return '<{{{0}}} -> {1}>'.format(', '.join(s), repr(self.parent))
+
+    def lookup(self, symbol):
+        if type(symbol) is str:
+            symbol = intern(symbol)
+        slot = self.layout.index.get(symbol)
+        if slot is not None and self.values[slot] is not None:
+            return self.values[slot]
+        elif self.bindings and symbol in self.bindings:
+            return self.bindings[symbol]
+        return self.parent.lookup(symbol)
+
+    def define(self, sym, val):
+        assert isinstance(val, SchemeValue)
+        if type(sym) is str:
+            sym = intern(sym)
+        slot = self.layout.index.get(sym)
+        if slot is not None:
+            self.values[slot] = val
+        elif self.bindings is None:
+            self.bindings = {sym: val}
+        else:
+            self.bindings[sym] = val
+
+    def set(self, sym, val):
+        slot = self.layout.index.get(sym)
+        if slot is not None and self.values[slot] is not None:
+            self.values[slot] = val
+        elif self.bindings and sym in self.bindings:
+            self.bindings[sym] = val
+        else:
+            self.parent.set(sym, val)
+
+
+class Cell:
+    """
+    A mutable box holding the value of a global variable, or None while it is unbound.
+    The version counts assignments, so code that caches facts about the value can
+    tell when they are stale.
+    """
+
+    __slots__ = ('name', 'value', 'version')
+
+    def __init__(self, name):
+        self.name = name
+        self.value = None
+        self.version = 0
+
+    def assign(self, val):
+        self.value = val
+        self.version += 1
+
+
+class GlobalFrame(Frame):
+    """
+    The root frame of an interpreter, which also records how it evaluates expressions.
+    Each global variable lives in a Cell, so analyzed code can hold on to it directly.
+    """
+
+    __slots__ = ('cells', 'evaluator')
+
+    def __init__(self, evaluator):
+        self.cells = {}
+        self.parent = None
+        self.evaluator = evaluator
+
+    def lookup(self, symbol):
+        if type(symbol) is str:
+            symbol = intern(symbol)
+        cell = self.cells.get(symbol)
+        if cell is None or cell.value is None:
+            raise SchemeError('unknown identifier: {0}'.format(str(symbol)))
+        return cell.value
+
+    def define(self, sym, val):
+        assert isinstance(val, SchemeValue)
+        if type(sym) is str:
+            sym = intern(sym)
+        self.cell(sym).assign(val)
+
+    def set(self, sym, val):
+        cell = self.cells.get(sym)
+        if cell is None or cell.value is None:
+            raise SchemeError('unknown identifier: {0}'.format(str(sym)))
+        cell.assign(val)
+
+    def cell(self, sym):
+        """The cell of global variable sym, which is created unbound if needed."""
+        cell = self.cells.get(sym)
+        if cell is None:
+            cell = self.cells[sym] = Cell(sym)
+        return cell
\ No newline at end of file
@@ -1,8 +1,13 @@
 # -*- coding: utf-8 -*-
 # Author: Forrest Chang (forrestchang7@gmail.com)
-from .procedure import LambdaProcedure, NuProcedure
+import contextlib
+
+from .exception import SchemeError, check_type
+from .procedure import LambdaProcedure, LazyProcedure, NuProcedure, PrimitiveProcedure
+from .profiler import Profiler, Sampler
+from .stats import StatsWriter, counters
+from .tracing import EvalHooks, TraceWriter
 from .types import *
-from .repl import *
 from .utils import main, trace
 
 
@@ -11,6 +16,10 @@ def scheme_eval(expr, env):
     Evaluate Scheme expression expr in env. If env is None, simply
     returns expr as its value without futher evaluation.
 
+    Special forms and procedures return the expression in tail position
+    together with its environment, and the loop below evaluates it in place,
+    so tail calls run in constant Python stack.
+
     >>> expr = read_line("(+ 1 2)")
     >>> expr
     Pair('+', Pair(1, Pair(2, nil)))
@@ -19,13 +28,14 @@ def scheme_eval(expr, env):
     """
 
     while env is not None:
+        counters['eval_steps'] += 1
 
         if expr is None:
             raise SchemeError('Cannot evaluate an undefined expression.')
 
         # Evaluate atoms
         if scheme_symbolp(expr):
-            expr, env = env.loopup(expr).get_actual_value(), None
+            expr, env = env.lookup(expr).get_actual_value(), None
         elif scheme_atomp(expr):
             env = None
 
@@ -37,22 +47,165 @@ def scheme_eval(expr, env):
 
             # Evaluate combinations
             if (scheme_symbolp(first) and first in SPECIAL_FORMS):
-                if proper_tail_recursion:
-                    expr, env = SPECIAL_FORMS[first](rest, env)
-                else:
-                    expr, env = SPECIAL_FORMS[first](rest, env)
-                    expr, env = scheme_eval(expr, env), None
+                expr, env = SPECIAL_FORMS[first](rest, env)
             else:
                 procedure = scheme_eval(first, env)
                 args = procedure.evaluate_arguments(rest, env)
-                if proper_tail_recursion:
-                    expr, env = procedure.apply(args, env)
-                else:
-                    expr, env = scheme_apply(procedure, args, env), None
+                expr, env = procedure.apply(args, env)
     return expr
 
-# Tail recursion
-proper_tail_recursion = False
+
+# Instrumentation
+
+
+def instrumented_eval(expr, env):
+    """
+    Evaluate expr in env as scheme_eval does, passing each procedure applied to
+    the enter function of the instruments in use, and calling their leave
+    function once it returns or raises. A tail call leaves the procedure whose
+    body it ends before entering the next.
+
+    It only takes the place of scheme_eval while instruments are in use, so the
+    evaluator pays nothing for them otherwise.
+    """
+    return watched_eval(expr, env, _instruments[-1])
+
+
+def traced_eval(expr, env):
+    """
+    Evaluate expr in env as scheme_eval does, reporting to the eval hooks in
+    use. Like instrumented_eval, it only takes the place of scheme_eval while
+    hooks are in use.
+    """
+    return watched_eval(expr, env, _hooks[-1])
+
+
+def watched_eval(expr, env, hooks):
+    """
+    Evaluate expr in env as scheme_eval does, reporting to hooks:
+    on_call(procedure, args, tail) before each procedure is applied,
+    on_return(procedure, value) or on_error(procedure, error) once it is done,
+    and on_define(name, value) after each define. A call whose body ends in a
+    tail call is reported done with on_tail(procedure) instead, just before the
+    tail call, which takes its place, is reported with tail set.
+    """
+    on_call, on_return, on_error = hooks.on_call, hooks.on_return, hooks.on_error
+    current = None
+    try:
+        while env is not None:
+            counters['eval_steps'] += 1
+
+            if expr is None:
+                raise SchemeError('Cannot evaluate an undefined expression.')
+
+            if scheme_symbolp(expr):
+                expr, env = env.lookup(expr).get_actual_value(), None
+            elif scheme_atomp(expr):
+                env = None
+            elif not scheme_listp(expr):
+                raise SchemeError('malformed list: {}'.format(str(expr)))
+            else:
+                first, rest = scheme_car(expr), scheme_cdr(expr)
+                if first is define_sym:
+                    name = do_define_form(rest, env)[0]
+                    hooks.on_define(name, env.lookup(name))
+                    expr, env = name, None
+                elif (scheme_symbolp(first) and first in SPECIAL_FORMS):
+                    expr, env = SPECIAL_FORMS[first](rest, env)
+                else:
+                    procedure = scheme_eval(first, env)
+                    args = procedure.evaluate_arguments(rest, env)
+                    if type(procedure) is PrimitiveProcedure:
+                        on_call(procedure, args, False)
+                        try:
+                            expr, env = procedure.apply(args, env)
+                        except BaseException as e:
+                            on_error(procedure, e)
+                            raise
+                        on_return(procedure, expr)
+                    else:
+                        if current is not None:
+                            hooks.on_tail(current)
+                        on_call(procedure, args, current is not None)
+                        current = procedure
+                        expr, env = procedure.apply(args, env)
+        if current is not None:
+            on_return(current, expr)
+        return expr
+    except BaseException as e:
+        if current is not None:
+            on_error(current, e)
+        raise
+
+
+class _Instruments(EvalHooks):
+    """Eval hooks passing each procedure called to enter, and calling leave when it is done."""
+
+    def __init__(self, enter, leave):
+        self.enter = enter
+        self.leave = leave
+
+    def on_call(self, procedure, args, tail):
+        self.enter(procedure)
+
+    def on_return(self, procedure, value):
+        self.leave()
+
+    def on_error(self, procedure, error):
+        self.leave()
+
+    def on_tail(self, procedure):
+        self.leave()
+
+
+_plain_eval = scheme_eval
+_instruments = []
+_hooks = []
+
+
+def _install_evaluator():
+    """Put the evaluator for the instruments and hooks in use in place of scheme_eval."""
+    global scheme_eval
+    if _hooks:
+        scheme_eval = traced_eval
+    elif _instruments:
+        scheme_eval = instrumented_eval
+    else:
+        scheme_eval = _plain_eval
+    # Procedures compiled by the other evaluators run their bodies in scheme_eval
+    # too, so that every call they make is seen
+    LambdaProcedure.interpreted = bool(_hooks or _instruments)
+
+
+@contextlib.contextmanager
+def instruments(enter, leave):
+    """
+    Evaluate with instrumented_eval in place of scheme_eval within the with
+    statement, passing procedures to enter and leave.
+    """
+    _instruments.append(_Instruments(enter, leave))
+    _install_evaluator()
+    try:
+        yield
+    finally:
+        _instruments.pop()
+        _install_evaluator()
+
+
+@contextlib.contextmanager
+def eval_hooks(hooks):
+    """
+    Evaluate with traced_eval in place of scheme_eval within the with statement,
+    reporting to hooks, which has the methods on_call, on_return, on_error and
+    on_define. Evaluation is traced instead of instrumented while both are in use.
+    """
+    _hooks.append(hooks)
+    _install_evaluator()
+    try:
+        yield
+    finally:
+        _hooks.pop()
+        _install_evaluator()
 
 
 def scheme_apply(procedure, args, env):
@@ -65,6 +218,21 @@ def scheme_apply(procedure, args, env):
     return scheme_eval(expr, env)
 
 
+def scheme_vector_map(procedure, vector, *args):
+    """
+    Apply procedure to the elements of vector, and of the further vectors
+    before the env at the end of args, at each index up to the shortest one.
+
+    Returns a new vector of the results.
+    """
+    *vectors, env = args
+    vectors = (vector,) + tuple(vectors)
+    for i, v in enumerate(vectors, 1):
+        check_type(v, scheme_vectorp, i, 'vector-map')
+    return SchemeVector([scheme_apply(procedure, scheme_list(*items), env)
+                         for items in zip(*(v.items for v in vectors))])
+
+
 # Special forms
 
 
@@ -103,28 +271,31 @@ def check_formals(formals):
 
 
 def do_lambda_form(vals, env, function_type=LambdaProcedure):
-    check_form(vals, 2, 2)
+    check_form(vals, 2)
     formals = vals[0]
     check_formals(formals)
     body = vals[1]
     if len(vals) > 2:
-        body = Pair('begin', scheme_cdr(vals))
-    if function_type == LambdaProcedure:
-        return LambdaProcedure(formals, body, env), env
-    if function_type == NuProcedure:
-        return NuProcedure(formals, body, env), env
+        body = make_pair(begin_sym, scheme_cdr(vals))
+    return function_type(formals, body, env), env
 
 
 def do_nu_form(vals, env):
     return do_lambda_form(vals, env, function_type=NuProcedure)
 
 
+def do_lazy_form(vals, env):
+    return do_lambda_form(vals, env, function_type=LazyProcedure)
+
+
 def do_define_form(vals, env):
     check_form(vals, 2)
     target = vals[0]
     if scheme_symbolp(target): # for assigning values
         check_form(vals, 2, 2)
         value = scheme_eval(vals[1], env)
+        if isinstance(value, LambdaProcedure) and value.name is None:
+            value.name = target
         env.define(target, value)
         return target, None
     elif scheme_pairp(target): # for defining functions
@@ -133,6 +304,7 @@ def do_define_form(vals, env):
         if scheme_symbolp(func_name):
             body = scheme_cdr(vals)
             value = do_lambda_form(scheme_cons(formals, body), env)[0]
+            value.name = func_name
             env.define(func_name, value)
             return func_name, None
         else:
@@ -141,6 +313,16 @@ def do_define_form(vals, env):
         raise SchemeError('bad argument to define')
 
 
+def do_set_form(vals, env):
+    check_form(vals, 2, 2)
+    target = vals[0]
+    if not scheme_symbolp(target):
+        raise SchemeError('bad argument to set!')
+    value = scheme_eval(vals[1], env)
+    env.set(target, value)
+    return okay, None
+
+
 def do_quote_form(vals, env):
     check_form(vals, 1, 1)
     return vals[0], None
@@ -154,11 +336,11 @@ def do_let_form(vals, env):
         raise SchemeError('bad bindings list in let form')
 
     # Add a frame containing bindings
-    name, values = nil, nil
+    names, values = nil, nil
     for binding in bindings:
-        check_form(binding, 2)
-        names = Pair(binding[0], names)
-        values = Pair(scheme_eval(binding[1], env), values)
+        check_form(binding, 2, 2)
+        names = make_pair(binding[0], names)
+        values = make_pair(scheme_eval(binding[1], env), values)
 
     # Check if duplicate bindings
     check_formals(names)
@@ -182,13 +364,14 @@ def do_if_form(vals, env):
 
 
 def do_and_form(vals, env):
-    if len(vals) == 0:
+    check_form(vals, 0)
+    if vals is nil:
         return scheme_true, None
-    for i in range(len(vals)-1):
-        predicate = scheme_eval(vals[i], env)
-        if not predicate:
+    while vals.second is not nil:
+        if not scheme_eval(vals.first, env):
             return scheme_false, None
-    return vals[len(vals)-1], env
+        vals = vals.second
+    return vals.first, env
 
 
 def quote(value):
@@ -196,13 +379,15 @@ def quote(value):
 
 
 def do_or_form(vals, env):
-    if len(vals):
+    check_form(vals, 0)
+    if vals is nil:
         return scheme_false, None
-    for i in range(len(vals)-1):
-        predicate = scheme_eval(vals[i], env)
+    while vals.second is not nil:
+        predicate = scheme_eval(vals.first, env)
         if predicate:
             return predicate, None
-    return vals[len(vals)-1], env
+        vals = vals.second
+    return vals.first, env
 
 
 def do_cond_form(vals, env):
@@ -224,13 +409,36 @@ def do_cond_form(vals, env):
     return okay, None
 
 
+def do_profile_form(vals, env):
+    """
+    Evaluate the expression in vals with a Profiler on, printing its report.
+
+    Only instrumented_eval reports the procedures it applies, so the expression
+    is evaluated by it whichever evaluator env belongs to, and the other
+    evaluators hand the profile form over to this function. The report says
+    when the evaluator profiled is not the one in use.
+    """
+    check_form(vals, 1, 1)
+    evaluator = env.global_frame().evaluator
+    title = None
+    if evaluator is not _plain_eval:
+        title = 'profiled with scheme_eval in place of {}'.format(evaluator.__name__)
+    profiler = Profiler()
+    try:
+        with instruments(profiler.enter, profiler.leave):
+            return instrumented_eval(vals.first, env), None
+    finally:
+        profiler.report(title=title)
+
+
 def do_begin_form(vals, env):
     check_form(vals, 0)
     if scheme_nullp(vals):
         return okay, None
-    for i in range(len(vals)-1):
-        result = scheme_eval(vals[i], env)
-    return vals[len(vals)-1], env
+    while vals.second is not nil:
+        scheme_eval(vals.first, env)
+        vals = vals.second
+    return vals.first, env
 
 
 # Collected special forms
@@ -241,18 +449,51 @@ SPECIAL_FORMS = {
     define_sym: do_define_form,
     if_sym: do_if_form,
     lambda_sym: do_lambda_form,
+    lazy_sym: do_lazy_form,
     let_sym: do_let_form,
     nu_sym: do_nu_form,
     or_sym: do_or_form,
+    profile_sym: do_profile_form,
     quote_sym: do_quote_form,
+    set_bang_sym: do_set_form,
 }
 
 
 @main
 def run(*argv):
+    from .repl import buffer_input, buffer_lines, create_global_frame, read_eval_print_loop
+    # Run with python -m this module is __main__, so take the evaluator from
+    # schemy.eval, whose scheme_eval the rest of the package calls and instruments
+    from .eval import eval_hooks, instrumented_eval, instruments, scheme_eval, traced_eval
     next_line = buffer_input
     interactive = True
     load_files = ()
+    evaluator = scheme_eval
+    profiler = sampler = tracer = profile_file = writer = None
+    if argv and argv[0].startswith('-stats='):
+        # -stats=file writes the runtime stats to file now and then, and at the end
+        writer, argv = StatsWriter(argv[0].partition('=')[2]), argv[1:]
+    if argv and argv[0].startswith('-profile'):
+        # -profile prints a report at the end, and -profile=file writes pstats data to file
+        profiler, profile_file = Profiler(), argv[0].partition('=')[2]
+        evaluator, argv = instrumented_eval, argv[1:]
+    elif argv and argv[0].startswith('-sample'):
+        # -sample prints collapsed stacks at the end, and -sample=file writes them to file
+        sampler, profile_file = Sampler(), argv[0].partition('=')[2]
+        evaluator, argv = instrumented_eval, argv[1:]
+    elif argv and argv[0].startswith('-trace='):
+        # -trace=file writes every call to file, as binary records if it ends in .bin
+        tracer = TraceWriter(argv[0].partition('=')[2])
+        evaluator, argv = traced_eval, argv[1:]
+    elif argv and argv[0] == '-compile':
+        from .compiler import compile_eval
+        evaluator, argv = compile_eval, argv[1:]
+    elif argv and argv[0] == '-machine':
+        from .machine import machine_eval
+        evaluator, argv = machine_eval, argv[1:]
+    elif argv and argv[0] == '-vm':
+        from .vm import vm_eval
+        evaluator, argv = vm_eval, argv[1:]
     if argv:
         try:
             filename = argv[0]
@@ -260,17 +501,33 @@ def run(*argv):
                 load_files = argv[1:]
             else:
                 input_file = open(argv[0])
-                lines = input_file.readline()
                 def next_line():
-                    return buffer_lines(lines)
+                    return buffer_lines(input_file)
                 interactive = False
         except IOError as e:
             print(e)
             sys.exit(1)
-    read_eval_print_loop(
-        next_line,
-        create_global_frame(),
-        startup=True,
-        interactive=interactive,
-        load_files=load_files
-    )
+    env = create_global_frame(evaluator)
+    with writer or contextlib.nullcontext():
+        if tracer is not None:
+            with tracer, eval_hooks(tracer):
+                read_eval_print_loop(next_line, env, startup=True, interactive=interactive, load_files=load_files)
+            return
+        if sampler is not None:
+            with instruments(sampler.enter, sampler.leave), sampler:
+                read_eval_print_loop(next_line, env, startup=True, interactive=interactive, load_files=load_files)
+            if profile_file:
+                with open(profile_file, 'w') as outfile:
+                    sampler.write_collapsed(outfile)
+            else:
+                sampler.write_collapsed()
+            return
+        if profiler is None:
+            read_eval_print_loop(next_line, env, startup=True, interactive=interactive, load_files=load_files)
+            return
+        with instruments(profiler.enter, profiler.leave):
+            read_eval_print_loop(next_line, env, startup=True, interactive=interactive, load_files=load_files)
+        if profile_file:
+            profiler.dump_stats(profile_file)
+        else:
+            profiler.report()
@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+# Author: Forrest Chang (forrestchang7@gmail.com)
+
+"""
+The machine module evaluates Scheme expressions without Python recursion.
+
+Work still to be done after a subexpression is evaluated is kept as a
+continuation record on a list that lives on the heap, so the depth of
+non-tail recursion in a Scheme program is limited only by memory.
+
+Every step follows the protocol of the special forms in eval: it returns
+(expr, env) to go on evaluating expr in env, or (value, None) once a value is
+known, which is then passed to the continuation record on top of the stack.
+A record is a list whose first element is the function that continues with
+the value; the rest is whatever that function needs.
+"""
+
+from .eval import check_form, check_formals, do_lambda_form, do_lazy_form, do_nu_form, do_profile_form, scheme_apply
+from .exception import SchemeError
+from .procedure import LambdaProcedure, LazyProcedure, NuProcedure, PrimitiveProcedure, Procedure, Promise, Thunk
+from .stats import applications, counters
+from .types import *
+
+
+def machine_eval(expr, env):
+    """
+    Evaluate Scheme expression expr in env, keeping pending work on a heap
+    allocated stack of continuation records.
+
+    >>> env = create_global_frame(machine_eval)
+    >>> machine_eval(read_line("(+ 1 2)"), env)
+    scnum(3)
+    """
+    stack = []
+    while True:
+        while env is not None:
+            counters['eval_steps'] += 1
+            if expr is None:
+                raise SchemeError('Cannot evaluate an undefined expression.')
+            if type(expr) is SchemeSymbol:
+                value = env.lookup(expr)
+                if not isinstance(value, Thunk):
+                    expr, env = value, None
+                elif not isinstance(value, Promise):
+                    counters['thunks_forced'] += 1
+                    expr, env = value.body, value.env
+                elif value.forced:
+                    expr, env = value.value, None
+                else:
+                    counters['thunks_forced'] += 1
+                    stack.append([continue_force, value])
+                    expr, env = value.body, value.env
+            elif not isinstance(expr, Pair):
+                env = None
+            elif not expr.listp():
+                raise SchemeError('malformed list: {}'.format(str(expr)))
+            else:
+                first = expr.first
+                if type(first) is SchemeSymbol and first in MACHINE_FORMS:
+                    expr, env = MACHINE_FORMS[first](expr.second, env, stack)
+                else:
+                    stack.append([continue_operator, expr.second, env])
+                    expr = first
+        if not stack:
+            return expr
+        record = stack.pop()
+        expr, env = record[0](expr, record, stack)
+
+
+# Applications
+
+
+def continue_operator(procedure, record, stack):
+    _, operands, env = record
+    if isinstance(procedure, LazyProcedure):
+        operands = list(operands)
+        strict = procedure.strictness(len(operands))
+        args = [None if s else Promise(nil, operand, env) for operand, s in zip(operands, strict)]
+        pending = [(i, operand) for i, (operand, s) in enumerate(zip(operands, strict)) if s]
+        pending.reverse()
+        return continue_strict(None, [continue_strict, procedure, args, pending, env, None], stack)
+    elif isinstance(procedure, NuProcedure):
+        args = [Thunk(nil, operand, env) for operand in operands]
+        return machine_apply(procedure, args, env)
+    elif not isinstance(procedure, Procedure):
+        procedure.evaluate_arguments(operands, env)
+    if operands is nil:
+        return machine_apply(procedure, [], env)
+    stack.append([continue_operand, procedure, operands.second, [], env])
+    return operands.first, env
+
+
+def continue_strict(value, record, stack):
+    """Evaluate the operands of a call by need that are strict, one at a time, then apply."""
+    _, procedure, args, pending, env, index = record
+    if index is not None:
+        args[index] = value
+    if not pending:
+        return machine_apply(procedure, args, env)
+    record[5], operand = pending.pop()
+    stack.append(record)
+    return operand, env
+
+
+def continue_force(value, record, stack):
+    """Keep value as the value of the promise that was forced for it."""
+    record[1].keep(value)
+    return value, None
+
+
+def continue_operand(value, record, stack):
+    _, procedure, operands, args, env = record
+    args.append(value)
+    if operands is nil:
+        return machine_apply(procedure, args, env)
+    record[2] = operands.second
+    stack.append(record)
+    return operands.first, env
+
+
+def machine_apply(procedure, args, env):
+    """
+    Apply procedure to the Python list of argument values args in env. The
+    eval and apply primitives continue on the machine instead of recursing.
+    """
+    while type(procedure) is PrimitiveProcedure:
+        if procedure.func is scheme_apply:
+            if len(args) != 2:
+                raise SchemeError('apply takes 2 arguments ({} given)'.format(len(args)))
+            applications['primitive'] += 1
+            procedure, args = args[0], list(args[1])
+        elif procedure.func is machine_eval:
+            if len(args) != 1:
+                raise SchemeError('eval takes 1 argument ({} given)'.format(len(args)))
+            applications['primitive'] += 1
+            return args[0], env
+        else:
+            break
+    return procedure.apply(args, env)
+
+
+# Sequences
+
+
+def start_sequence(exprs, env, stack):
+    """Evaluate the Scheme list of expressions exprs for the value of the last one."""
+    if exprs.second is not nil:
+        stack.append([continue_sequence, exprs.second, env])
+    return exprs.first, env
+
+
+def continue_sequence(value, record, stack):
+    _, exprs, env = record
+    return start_sequence(exprs, env, stack)
+
+
+def continue_and(value, record, stack):
+    _, exprs, env = record
+    if value is scheme_false:
+        return scheme_false, None
+    if exprs.second is not nil:
+        stack.append([continue_and, exprs.second, env])
+    return exprs.first, env
+
+
+def continue_or(value, record, stack):
+    _, exprs, env = record
+    if value is not scheme_false:
+        return value, None
+    if exprs.second is not nil:
+        stack.append([continue_or, exprs.second, env])
+    return exprs.first, env
+
+
+# Special forms
+
+
+def do_lambda(vals, env, stack):
+    return do_lambda_form(vals, env)[0], None
+
+
+def do_nu(vals, env, stack):
+    return do_nu_form(vals, env)[0], None
+
+
+def do_lazy(vals, env, stack):
+    return do_lazy_form(vals, env)[0], None
+
+
+def do_define(vals, env, stack):
+    check_form(vals, 2)
+    target = vals.first
+    if scheme_symbolp(target):
+        check_form(vals, 2, 2)
+        stack.append([continue_define, target, env])
+        return vals.second.first, env
+    elif scheme_pairp(target):
+        func_name = target.first
+        if not scheme_symbolp(func_name):
+            raise SchemeError('bad variable')
+        value = do_lambda_form(scheme_cons(target.second, vals.second), env)[0]
+        value.name = func_name
+        env.define(func_name, value)
+        return func_name, None
+    else:
+        raise SchemeError('bad argument to define')
+
+
+def continue_define(value, record, stack):
+    _, target, env = record
+    if isinstance(value, LambdaProcedure) and value.name is None:
+        value.name = target
+    env.define(target, value)
+    return target, None
+
+
+def do_set(vals, env, stack):
+    check_form(vals, 2, 2)
+    if not scheme_symbolp(vals.first):
+        raise SchemeError('bad argument to set!')
+    stack.append([continue_set, vals.first, env])
+    return vals.second.first, env
+
+
+def continue_set(value, record, stack):
+    _, target, env = record
+    env.set(target, value)
+    return okay, None
+
+
+def do_quote(vals, env, stack):
+    check_form(vals, 1, 1)
+    return vals.first, None
+
+
+def do_profile(vals, env, stack):
+    return do_profile_form(vals, env)[0], None
+
+
+def do_let(vals, env, stack):
+    check_form(vals, 2)
+    bindings = vals.first
+    if not scheme_listp(bindings):
+        raise SchemeError('bad bindings list in let form')
+    names, exprs = [], []
+    for binding in bindings:
+        check_form(binding, 2, 2)
+        names.append(binding.first)
+        exprs.append(binding.second.first)
+
+    # Check if duplicate bindings
+    check_formals(names)
+    if not exprs:
+        return start_sequence(vals.second, env.make_call_frame(names, []), stack)
+    stack.append([continue_let, names, exprs, [], vals.second, env])
+    return exprs[0], env
+
+
+def continue_let(value, record, stack):
+    _, names, exprs, values, body, env = record
+    values.append(value)
+    if len(values) == len(exprs):
+        return start_sequence(body, env.make_call_frame(names, values), stack)
+    stack.append(record)
+    return exprs[len(values)], env
+
+
+def do_if(vals, env, stack):
+    check_form(vals, 2, 3)
+    stack.append([continue_if, vals.second, env])
+    return vals.first, env
+
+
+def continue_if(value, record, stack):
+    _, branches, env = record
+    if value is not scheme_false:
+        return branches.first, env
+    elif branches.second is nil:
+        return okay, None
+    return branches.second.first, env
+
+
+def do_and(vals, env, stack):
+    if vals is nil:
+        return scheme_true, None
+    return continue_and(scheme_true, [continue_and, vals, env], stack)
+
+
+def do_or(vals, env, stack):
+    if vals is nil:
+        return scheme_false, None
+    return continue_or(scheme_false, [continue_or, vals, env], stack)
+
+
+def do_cond(vals, env, stack):
+    num_clauses = len(vals)
+    for i, clause in enumerate(vals):
+        check_form(clause, 1)
+        if clause.first is else_sym:
+            if i < num_clauses - 1:
+                raise SchemeError('else must be last')
+            if clause.second is nil:
+                raise SchemeError('badly formed else clause')
+    return continue_cond(scheme_false, [continue_cond, vals, env], stack)
+
+
+def continue_cond(value, record, stack):
+    """Continue with the value of the test of the clause before the clauses in record."""
+    _, clauses, env = record
+    if value is not scheme_false:
+        return value, None
+    while clauses is not nil:
+        clause = clauses.first
+        if clause.first is else_sym:
+            return start_sequence(clause.second, env, stack)
+        if clause.second is nil:
+            stack.append([continue_cond, clauses.second, env])
+        else:
+            stack.append([continue_clause, clause.second, clauses.second, env])
+        return clause.first, env
+    return okay, None
+
+
+def continue_clause(value, record, stack):
+    _, body, clauses, env = record
+    if value is not scheme_false:
+        return start_sequence(body, env, stack)
+    return continue_cond(scheme_false, [continue_cond, clauses, env], stack)
+
+
+def do_begin(vals, env, stack):
+    check_form(vals, 0)
+    if vals is nil:
+        return okay, None
+    return start_sequence(vals, env, stack)
+
+
+# Collected special forms
+MACHINE_FORMS = {
+    and_sym: do_and,
+    begin_sym: do_begin,
+    cond_sym: do_cond,
+    define_sym: do_define,
+    if_sym: do_if,
+    lambda_sym: do_lambda,
+    lazy_sym: do_lazy,
+    let_sym: do_let,
+    nu_sym: do_nu,
+    or_sym: do_or,
+    profile_sym: do_profile,
+    quote_sym: do_quote,
+    set_bang_sym: do_set,
+}
@@ -1,8 +1,9 @@
 # -*- coding: utf-8 -*-
 # Author: Forrest Chang (forrestchang7@gmail.com)
-from .eval import proper_tail_recursion, scheme_eval, nil
+from .environments import CallFrame, GlobalFrame, Layout
 from .exception import SchemeError
-from .types import SchemeValue
+from .stats import applications, counters
+from .types import *
 
 
 class Procedure(SchemeValue):
@@ -20,9 +21,13 @@ class Procedure(SchemeValue):
 class PrimitiveProcedure(Procedure):
     """A Scheme procedure defined as a Python function."""
 
-    def __init__(self, func, use_env=False):
+    # The kind its applications are counted as in the runtime stats
+    kind = 'primitive'
+
+    def __init__(self, func, use_env=False, name=None):
         self.func= func
         self.use_env = use_env
+        self.name = name
 
     def __str__(self):
         return '#[primitive]'
@@ -36,6 +41,7 @@ class PrimitiveProcedure(Procedure):
 
         Returns a pair (val, None), where val is the resulting value.
         """
+        applications['primitive'] += 1
         try:
             args_list = list(args)
             if self.use_env:
@@ -49,10 +55,20 @@ class PrimitiveProcedure(Procedure):
 class LambdaProcedure(Procedure):
     """A procedure defined by a lambda expression or the complex define form."""
 
-    def __init__(self, formals, body, env=None):
+    # The name it was first defined as, if any
+    name = None
+    kind = 'lambda'
+    # Whether apply evaluates the body even if it has been compiled, while instrumented
+    interpreted = False
+
+    def __init__(self, formals, body, env=None, code=None):
         self.formals = formals
         self.body = body
         self.env = env
+        # The analyzed body, filled in by the compiler the first time it is needed
+        self.code = code
+        # The layout of call frames, computed from formals on the first call
+        self.layout = None
 
     def _symbol(self):
         return 'lambda'
@@ -74,26 +90,245 @@ class LambdaProcedure(Procedure):
             self.env == other.env
 
     def apply(self, args, env):
-        if proper_tail_recursion:
-            new_env = self.env.make_call_frame(self.formals, args)
-            return self.body, new_env
-        else:
-            new_env = self.env.make_call_frame(self.formals, args)
-            return scheme_eval(self.body, new_env), None
+        applications[self.kind] += 1
+        if self.code is not None and not self.interpreted:
+            return self.code.call(self.env, list(args)), None
+        if self.layout is None:
+            self.layout = Layout(self.formals, by_name=isinstance(self, NuProcedure),
+                                 by_need=isinstance(self, LazyProcedure))
+        new_env = self.env.make_call_frame(self.layout, args)
+        return self.body, new_env
 
 
 class NuProcedure(LambdaProcedure):
     """A procedure whose parameters are to be passed by name."""
 
+    kind = 'nu'
+
     def _symbol(self):
         return 'nu'
 
     def evaluate_arguments(self, arg_list, env):
         return arg_list.map(lambda operand: Thunk(nil, operand, env))
 
+    def delay_arguments(self, operands, env):
+        """The Python list of thunks for operands in env."""
+        return [Thunk(nil, operand, env) for operand in operands]
+
 
 class Thunk(LambdaProcedure):
     """A by-name value that is to be called as a parameterless function when its value is fetched to be used."""
 
     def get_actual_value(self):
+        from .eval import scheme_eval
+        counters['thunks_forced'] += 1
+        return scheme_eval(self.body, self.env)
+
+
+class LazyProcedure(NuProcedure):
+    """
+    A procedure whose parameters are passed by need. Each argument is a Promise,
+    evaluated at most once, the first time it is used. Arguments of parameters
+    the body is strict in are evaluated at the call instead, as their values
+    are certain to be needed before anything else happens.
+    """
+
+    # Whether each parameter is strict, found on the first call, and the
+    # cells of the primitives that was found with, and their versions
+    strict = None
+    depends = ()
+    kind = 'lazy'
+
+    def _symbol(self):
+        return 'lazy'
+
+    def strictness(self, count):
+        """
+        Whether each of count arguments is to be evaluated at the call. None of
+        them are when count is not the number of parameters, which the call will
+        report.
+        """
+        if self.strict is None or any(cell.version != version for cell, version in self.depends):
+            cells = []
+            self.strict = strict_parameters(self.formals, self.body, self.env, cells)
+            self.depends = tuple((cell, cell.version) for cell in cells)
+        if count != len(self.strict):
+            return (False,) * count
+        return self.strict
+
+    def evaluate_arguments(self, arg_list, env):
+        return self.delay_arguments(arg_list, env)
+
+    def delay_arguments(self, operands, env):
+        """The Python list of arguments for operands in env: values for strict parameters and promises otherwise."""
+        from .eval import scheme_eval
+        operands = list(operands)
+        return [scheme_eval(operand, env) if strict else Promise(nil, operand, env)
+                for operand, strict in zip(operands, self.strictness(len(operands)))]
+
+
+class Promise(Thunk):
+    """A by-need value, which is evaluated the first time it is fetched and then kept."""
+
+    forced = False
+    value = None
+
+    def get_actual_value(self):
+        if not self.forced:
+            counters['thunks_forced'] += 1
+            self.keep(self.force())
+        return self.value
+
+    def force(self):
+        from .eval import scheme_eval
         return scheme_eval(self.body, self.env)
+
+    def keep(self, value):
+        """Remember value as the value of self, and let go of what computed it."""
+        self.value = value
+        self.forced = True
+        self.env = None
+
+
+# Strictness analysis
+
+
+def strict_parameters(formals, body, env, cells=None):
+    """
+    Which parameters of a procedure with formals and body, created in env, can
+    be evaluated at the call without changing what the program does: those the
+    body is certain to fetch before anything else it does could be seen, such
+    as applying a procedure or raising an error, and in the order of the
+    formals, as that is the order the call evaluates them in.
+
+    Operands of a primitive procedure, named by a global variable, are fetched
+    before it is applied; the cell of each such variable is appended to the
+    list cells, so that the caller can tell when the analysis is stale. The
+    analysis gives up on parameters that are defined or set! in the body.
+
+    >>> env = create_global_frame()
+    >>> strict_parameters(read_line('(n x y)'), read_line('(if (= n 0) x (+ x y))'), env)
+    (True, False, False)
+    >>> strict_parameters(read_line('(x y)'), read_line('(+ y x)'), env)
+    (False, True)
+    """
+    assigned = set()
+    scan_assignments(body, assigned)
+    local = set(formals) | assigned
+    order = []
+    leading_fetches(body, set(formals) - assigned, set(), local, env, order,
+                    [] if cells is None else cells)
+    index = {formal: i for i, formal in enumerate(formals)}
+    strict, last = set(), -1
+    for name in order:
+        if name not in strict:
+            if index[name] < last:
+                break
+            strict.add(name)
+            last = index[name]
+    return tuple(formal in strict for formal in formals)
+
+
+def scan_assignments(expr, assigned):
+    """Add to the set assigned every name that a define or set! anywhere in expr binds."""
+    stack = [expr]
+    while stack:
+        expr = stack.pop()
+        if type(expr) is not Pair or expr.first is quote_sym:
+            continue
+        if (expr.first is define_sym or expr.first is set_bang_sym) and type(expr.second) is Pair:
+            target = expr.second.first
+            if type(target) is Pair:
+                target = target.first
+            if scheme_symbolp(target):
+                assigned.add(target)
+        while type(expr) is Pair:
+            stack.append(expr.first)
+            expr = expr.second
+
+
+def leading_fetches(expr, names, bound, local, env, order, cells):
+    """
+    Append to the list order the names in the set names that evaluating expr
+    fetches, in turn, until it first does anything else. Return whether expr
+    is evaluated without doing anything else at all. Bound is the set of names
+    bound by let forms around expr, which are safe to fetch, and local the set
+    of all names bound inside the procedure.
+    """
+    if type(expr) is SchemeSymbol:
+        if expr in names:
+            order.append(expr)
+            return True
+        return expr in bound
+    elif type(expr) is not Pair:
+        return expr is not None and expr is not nil and scheme_atomp(expr)
+    elif not expr.listp():
+        return False
+    first, rest = expr.first, expr.second
+    if first is quote_sym:
+        return len(rest) == 1
+    elif first is if_sym or first is and_sym or first is or_sym:
+        # Only the first operand is certain to be evaluated
+        if rest is not nil:
+            leading_fetches(rest.first, names, bound, local, env, order, cells)
+        return False
+    elif first is cond_sym:
+        if rest is not nil and type(rest.first) is Pair:
+            clause = rest.first
+            if clause.first is else_sym:
+                return all_leading_fetches(clause.second, names, bound, local, env, order, cells)
+            leading_fetches(clause.first, names, bound, local, env, order, cells)
+        return False
+    elif first is begin_sym:
+        return rest is not nil and all_leading_fetches(rest, names, bound, local, env, order, cells)
+    elif first is define_sym or first is set_bang_sym:
+        if len(rest) == 2 and scheme_symbolp(rest.first):
+            leading_fetches(rest.second.first, names, bound, local, env, order, cells)
+        return False
+    elif first is let_sym:
+        if rest is nil or not scheme_listp(rest.first) or rest.second is nil:
+            return False
+        let_bound = set()
+        for binding in rest.first:
+            if (type(binding) is not Pair or not scheme_symbolp(binding.first) or
+                    binding.second is nil or
+                    not leading_fetches(binding.second.first, names, bound, local, env, order, cells)):
+                return False
+            let_bound.add(binding.first)
+        return all_leading_fetches(rest.second, names - let_bound, bound | let_bound, local | let_bound,
+                                   env, order, cells)
+    elif first is lambda_sym or first is nu_sym or first is lazy_sym:
+        return False
+    if scheme_symbolp(first) and first not in local and first not in bound:
+        cell = primitive_cell(first, env)
+        if cell is not None:
+            cells.append(cell)
+            all_leading_fetches(rest, names, bound, local, env, order, cells)
+            return False
+    leading_fetches(first, names, bound, local, env, order, cells)
+    return False
+
+
+def all_leading_fetches(exprs, names, bound, local, env, order, cells):
+    """Like leading_fetches, for evaluating every expression in the Scheme list exprs in turn."""
+    for expr in exprs:
+        if not leading_fetches(expr, names, bound, local, env, order, cells):
+            return False
+    return True
+
+
+def primitive_cell(sym, env):
+    """The cell of global variable sym if env sees it as a primitive procedure, or None."""
+    frame = env
+    while frame.parent is not None:
+        if frame.bindings and sym in frame.bindings:
+            return None
+        if isinstance(frame, CallFrame) and sym in frame.layout.index:
+            return None
+        frame = frame.parent
+    if not isinstance(frame, GlobalFrame):
+        return None
+    cell = frame.cells.get(sym)
+    if cell is None or type(cell.value) is not PrimitiveProcedure:
+        return None
+    return cell
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+# Author: Forrest Chang (forrestchang7@gmail.com)
+
+"""
+The profiler module measures where the time of a Scheme program goes.
+
+A Profiler is given every procedure the instrumented evaluator applies as it
+is entered, and is told when it is left again, keeping a shadow stack of the
+procedures running. For each procedure it counts the calls, the self time
+spent in its own body and the cumulative time including the procedures it
+calls, and the same for each pair of caller and callee.
+
+Procedures are keyed the way pstats keys Python functions, by a tuple of a
+file, a line and a name. The file is the definition site: the start of the
+source of a compound procedure, which tells apart procedures of the same
+name, or <primitive>. There are no line numbers, so the line is always 0.
+
+A Sampler costs far less: the evaluator only pushes and pops procedures on
+its shadow stack, and a background thread counts the stacks it finds there
+every so often, for flamegraph tools.
+"""
+
+import collections
+import marshal
+import sys
+import threading
+import time
+
+from .procedure import PrimitiveProcedure
+
+SITE_WIDTH = 40
+
+
+def procedure_key(procedure):
+    """The pstats style key of procedure: its definition site, 0 and its name."""
+    if isinstance(procedure, PrimitiveProcedure):
+        return ('<primitive>', 0, procedure.name or procedure.func.__name__)
+    site = str(procedure)
+    if len(site) > SITE_WIDTH:
+        site = site[:SITE_WIDTH - 3] + '...'
+    return (site, 0, str(procedure.name or procedure._symbol()))
+
+
+class Profiler:
+    """
+    A deterministic profiler of procedure calls, fed by enter and leave.
+
+    Time spent in a procedure that is already running further down the stack
+    is added to its cumulative time only once, when the outermost call leaves,
+    so that recursion is not counted over and over.
+    """
+
+    def __init__(self, timer=time.perf_counter):
+        self.timer = timer
+        self.stack = []     # [key, start time, time in callees] for each call running
+        self.stats = {}     # key -> [calls, self time, cumulative time]
+        self.callers = {}   # (caller key, key) -> [calls, self time, cumulative time]
+        self.running = {}   # key -> number of its calls on the stack
+        self.keys = {}      # id of a procedure body or primitive -> (it, its key)
+
+    def key(self, procedure):
+        """The key of procedure, worked out once for each body and name."""
+        body = procedure.func if isinstance(procedure, PrimitiveProcedure) else procedure.body
+        entry = self.keys.get((id(body), procedure.name))
+        if entry is None:
+            # The body is kept with its key, so that its id is not reused
+            entry = self.keys[(id(body), procedure.name)] = (body, procedure_key(procedure))
+        return entry[1]
+
+    def enter(self, procedure):
+        """Start timing a call of procedure."""
+        key = self.key(procedure)
+        self.running[key] = self.running.get(key, 0) + 1
+        self.stack.append([key, self.timer(), 0.0])
+
+    def leave(self):
+        """Stop timing the call entered last."""
+        key, start, callees = self.stack.pop()
+        elapsed = self.timer() - start
+        self.running[key] -= 1
+        outermost = not self.running[key]
+        caller = self.stack[-1] if self.stack else None
+        if caller is not None:
+            caller[2] += elapsed
+        for stats, k in ((self.stats, key), (self.callers, (caller and caller[0], key))):
+            record = stats.get(k)
+            if record is None:
+                record = stats[k] = [0, 0.0, 0.0]
+            record[0] += 1
+            record[1] += elapsed - callees
+            if outermost:
+                record[2] += elapsed
+
+    def sorted_stats(self, sort='cumulative'):
+        """The (key, calls, self time, cumulative time) of each procedure, most costly first."""
+        column = {'calls': 0, 'self': 1, 'cumulative': 2}[sort]
+        return sorted(((key, *record) for key, record in self.stats.items()),
+                      key=lambda row: row[column + 1], reverse=True)
+
+    def report(self, sort='cumulative', limit=None, file=None, title=None):
+        """Print a table of the procedures profiled, sorted by the column sort, under title if given."""
+        file = file or sys.stdout
+        rows = self.sorted_stats(sort)[:limit]
+        if title is not None:
+            print(title, file=file)
+        print('{:>10} {:>10} {:>10} {:>12}  {}'.format(
+            'calls', 'self s', 'cumul s', 'cumul/call', 'procedure'), file=file)
+        for (site, _, name), calls, own, cumulative in rows:
+            print('{:>10} {:>10.4f} {:>10.4f} {:>12.6f}  {} {}'.format(
+                calls, own, cumulative, cumulative / calls, name, site), file=file)
+
+    def create_stats(self):
+        """The profile as the dict that pstats.Stats loads."""
+        callers = {}
+        for (caller, key), (calls, own, cumulative) in self.callers.items():
+            if caller is not None:
+                callers.setdefault(key, {})[caller] = (calls, calls, own, cumulative)
+        return {key: (calls, calls, own, cumulative, callers.get(key, {}))
+                for key, (calls, own, cumulative) in self.stats.items()}
+
+    def dump_stats(self, filename):
+        """Write the profile to filename in the format of pstats."""
+        with open(filename, 'wb') as outfile:
+            marshal.dump(self.create_stats(), outfile)
+
+
+def frame_name(procedure):
+    """The name of procedure in a sampled stack."""
+    name = procedure.name
+    if name is None:
+        return procedure._symbol()
+    return str(name)
+
+
+class Sampler:
+    """
+    A sampling profiler of the Scheme call stack. While it is running, the
+    evaluator keeps the procedures it is in on the shadow stack, and a thread
+    takes a sample of the names on it every interval seconds. Samples taken
+    while no procedure is running are not counted.
+
+    The samples are written as collapsed stacks, one line of names from the
+    outermost call inward, separated by ;, and the number of times it was seen,
+    which is what flamegraph.pl and speedscope read.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.stack = []
+        # The instruments only push and pop procedures, leaving names to the thread
+        self.enter, self.leave = self.stack.append, self.stack.pop
+        self.counts = collections.Counter()
+        self.done = threading.Event()
+        self.thread = None
+
+    def run(self):
+        stack, counts, wait = self.stack, self.counts, self.done.wait
+        while not wait(self.interval):
+            sample = stack[:]
+            if sample:
+                counts[tuple(map(frame_name, sample))] += 1
+
+    def start(self):
+        """Start taking samples in a background thread."""
+        self.done.clear()
+        self.thread = threading.Thread(target=self.run, name='schemy-sampler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop taking samples, waiting for the thread to finish."""
+        self.done.set()
+        self.thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def write_collapsed(self, file=None):
+        """Write the samples to file as collapsed stacks, the most frequent first."""
+        file = file or sys.stdout
+        for stack, count in self.counts.most_common():
+            print('{} {}'.format(';'.join(stack), count), file=file)
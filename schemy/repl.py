@@ -1,20 +1,28 @@
 # -*- coding: utf-8 -*-
 # Author: Forrest Chang (forrestchang7@gmail.com)
-from .buffer import Buffer, InputReader, LineReader
-from .environments import Frame
-from .eval import scheme_eval, scheme_apply
+from .buffer import Buffer, InputReader, LineReader, MappedLines
+from .bytecode import Code, compile_expression, scheme_disassemble
+from .cache import MAX_SOURCE_SIZE, read_cache, source_key, write_cache
+from .environments import GlobalFrame
+from .eval import scheme_eval, scheme_apply, scheme_vector_map
 from .exception import SchemeError, check_type
 from .procedure import PrimitiveProcedure
+from .stats import scheme_runtime_stats
 from .tokenizer import tokenize_lines, DELIMITERS
-from .types import nil, scnum, scbool, scstr, intern, Pair, scheme_stringp, scheme_symbolp, okay, \
+from .types import nil, scbool, scstr, intern, make_pair, quote_sym, Pair, SchemeFloat, SchemeInt, SchemeStr, SchemeVector, scheme_stringp, scheme_symbolp, okay, \
     get_primitive_bindings, scheme_print
 from .utils import main
+from .vm import execute, vm_eval
 
 
 def scheme_read(src):
     """
     Read the next expression from SRC, a Buffer of tokens.
 
+    Lists are built with an explicit stack of the ones still open rather than
+    by recursion, so neither the length nor the depth of a list is limited by
+    the Python stack.
+
     >>> lines = ["(+ 1 ", "(+ 23 4)) ("]
     >>> src = Buffer(tokenize_lines(lines))
     >>> print(scheme_read(src))
@@ -27,24 +35,7 @@ def scheme_read(src):
 
     if src.current() is None:
         raise EOFError
-    val = src.pop()
-    if val == 'nil':
-        return nil
-    elif type(val) is int or type(val) is float:
-        return scnum(val)
-    elif type(val) is bool:
-        return scbool(val)
-    elif val not in DELIMITERS:
-        if val[0] == '"':
-            return scstr(eval(val))
-        else:
-            return intern(val)
-    elif val == "'":
-        return Pair('quote', Pair(scheme_read(src), nil))
-    elif val == '(':
-        return read_tail(src)
-    else:
-        raise SyntaxError('unexpected token: {}'.format(val))
+    return read_datum(src, [])
 
 
 def read_tail(src):
@@ -64,30 +55,95 @@ def read_tail(src):
     >>> read_line("(1 . 2 3)")
     Traceback (most recent call last):
         ...
-    SyntaxError: Expected one element after .
+    SyntaxError: expected one element after .
     >>> scheme_read(Buffer(tokenize_lines(["(1", "2 .", "'(3 4))", "4"])))
     Pair(1, Pair(2, Pair('quote', Pair(Pair(3, Pair(4, nil)), nil))))
     >>> read_line("((1 1 . 2) . 1)")
     Pair(Pair(1, Pair(1, 2)), 1)
     """
+    return read_datum(src, [[]])
+
+
+# Markers on the reader stack for a quote, and a dot, waiting for the next expression
+_QUOTE = object()
+_DOT = object()
+
+
+class _VectorItems(list):
+    """The elements read so far of a vector still open, on the reader stack."""
+
+
+def read_datum(src, stack):
+    """
+    Read tokens from src until an expression is complete, and return it.
+
+    Each entry of stack is the list of elements read so far of a list or vector
+    still open, or a marker for a quote or dot waiting for the next expression.
+    """
+    pop = src.pop
     try:
-        if src.current() is None:
-            raise SyntaxError('unexpected end of file')
-        if src.current() == ')':
-            src.pop()
-            return nil
-        if src.current() == '.':
-            src.pop()
-            first = scheme_read(src)
-            if read_tail(src) is nil:
-                return first
-            raise SyntaxError('expected one element after .')
-        first = scheme_read(src)
-        rest = read_tail(src)
-        return Pair(first, rest)
+        while True:
+            val = pop()
+            if type(val) is SchemeStr:
+                datum = val
+            elif val == 'nil':
+                datum = nil
+            elif type(val) is SchemeInt or type(val) is SchemeFloat:
+                datum = val
+            elif type(val) is bool:
+                datum = scbool(val)
+            elif val is None:
+                raise SyntaxError('unexpected end of file')
+            elif val not in DELIMITERS:
+                datum = intern(val)
+            elif val == '(':
+                stack.append([])
+                continue
+            elif val == '#(':
+                stack.append(_VectorItems())
+                continue
+            elif val == "'":
+                stack.append(_QUOTE)
+                continue
+            elif val == ')' and stack and type(stack[-1]) is list:
+                datum = build_list(stack.pop(), nil)
+            elif val == ')' and stack and type(stack[-1]) is _VectorItems:
+                datum = SchemeVector(list(stack.pop()))
+            elif val == '.' and stack and type(stack[-1]) is list:
+                stack.append(_DOT)
+                continue
+            else:
+                raise SyntaxError('unexpected token: {}'.format(val))
+
+            # Finish the quotes and dotted lists that datum completes
+            while stack:
+                top = stack[-1]
+                if top is _QUOTE:
+                    stack.pop()
+                    datum = make_pair(quote_sym, make_pair(datum, nil))
+                elif top is _DOT:
+                    stack.pop()
+                    val = pop()
+                    if val is None:
+                        raise SyntaxError('unexpected end of file')
+                    elif val != ')':
+                        raise SyntaxError('expected one element after .')
+                    datum = build_list(stack.pop(), datum)
+                else:
+                    top.append(datum)
+                    break
+            else:
+                return datum
     except EOFError:
         raise SyntaxError('unexpected end of file')
 
+
+def build_list(elements, tail):
+    """The Scheme list of elements, ending in tail."""
+    for element in reversed(elements):
+        tail = make_pair(element, tail)
+    return tail
+
 # helper methods
 
 def buffer_input(prompt='Schemy> '):
@@ -95,7 +151,10 @@ def buffer_input(prompt='Schemy> '):
 
 
 def buffer_lines(lines, prompt='Schemy> ', show_prompt=False):
-    """Return a Buffer instance iterating through Lines."""
+    """
+    Return a Buffer instance iterating through Lines, an iterator shared by
+    the buffers made one after another for the same input.
+    """
     if show_prompt:
         input_lines = lines
     else:
@@ -108,7 +167,13 @@ def read_line(line):
     return scheme_read(Buffer(tokenize_lines([line])))
 
 
-def read_eval_print_loop(next_line, env, quiet=False, startup=False, interactive=False, load_files=()):
+def read_eval_print_loop(next_line, env, quiet=False, startup=False, interactive=False, load_files=(),
+                         location=None):
+    """
+    Read, evaluate and print the expressions in the Buffers returned by
+    next_line, reporting errors and going on to the next line. Location, if
+    given, returns where in the input the last line read is, for error messages.
+    """
     if startup:
         for filename in load_files:
             scheme_load(scstr(filename), True, env)
@@ -117,14 +182,17 @@ def read_eval_print_loop(next_line, env, quiet=False, startup=False, interactive
             src = next_line()
             while src.more_on_line:
                 expression = scheme_read(src)
-            result = scheme_eval(expression, env)
-            if not quiet and result is not None:
-                scheme_print(result)
+                result = env.evaluator(expression, env)
+                if not quiet and result is not None:
+                    scheme_print(result)
         except (SchemeError, SyntaxError, ValueError, RuntimeError) as e:
             if (isinstance(e, RuntimeError) and
                 'maximum recursion depth exceeded' not in e.args[0]):
                 raise
-            print('Error: ', e)
+            if location is not None:
+                print('Error: ', location() + ':', e)
+            else:
+                print('Error: ', e)
         except KeyboardInterrupt:
             if not startup:
                 raise
@@ -146,20 +214,79 @@ def scheme_load(*args):
     if (scheme_stringp(sym)):
         sym = intern(str(sym))
     check_type(sym, scheme_symbolp, 0, 'load')
-    with scheme_open(str(sym)) as infile:
-        lines = infile.readlines()
-    args = (lines, None) if quiet else (lines,)
-    def next_line():
-        return buffer_lines(*args)
-    read_eval_print_loop(next_line, env.global_frame(), quiet=quiet)
+    env = env.global_frame()
+    with scheme_open(str(sym)) as infile, MappedLines(infile) as source:
+        if quiet and load_compiled(source, env):
+            return okay
+        lines = iter(source)
+        args = (lines, None) if quiet else (lines,)
+        def next_line():
+            return buffer_lines(*args)
+        def location():
+            return '{}:{}'.format(source.name, source.line_number())
+        read_eval_print_loop(next_line, env, quiet=quiet, location=location)
     return okay
 
 
+def load_compiled(source, env):
+    """
+    Evaluate the expressions of source, the MappedLines of a source file, in
+    global frame env, reading them from the on-disk cache if it is up to date
+    and filling the cache otherwise. The vm caches compiled bytecode instead of
+    expressions. Return False, having evaluated nothing, if the file is too
+    large to cache or cannot be read. As when a file is loaded line by line,
+    (exit) ends the load and an interrupt ends it and the caller.
+    """
+    filename = source.name
+    if source.size > MAX_SOURCE_SIZE:
+        return False
+    key = source_key(filename, source.view if source.map is not None else None)
+    kind = 'bytecode' if env.evaluator is vm_eval else 'forms'
+    entries = read_cache(filename, key, kind, env)
+    if entries is None:
+        try:
+            entries = tuple(read_expressions(source))
+        except (SyntaxError, ValueError):
+            return False
+        if kind == 'bytecode':
+            entries = tuple(compile_entry(expr, env) for expr in entries)
+        write_cache(filename, key, kind, entries)
+    for entry in entries:
+        try:
+            if type(entry) is Code:
+                execute(entry, env)
+            else:
+                env.evaluator(entry, env)
+        except (SchemeError, SyntaxError, ValueError, RuntimeError) as e:
+            if (isinstance(e, RuntimeError) and
+                'maximum recursion depth exceeded' not in e.args[0]):
+                raise
+            print('Error: ', e)
+        except EOFError:
+            break
+    return True
+
+
+def read_expressions(lines):
+    """Read the expressions in the iterable lines one at a time, as they are needed."""
+    src = Buffer(tokenize_lines(lines))
+    while src.current() is not None:
+        yield scheme_read(src)
+
+
+def compile_entry(expr, env):
+    """Compile expr for the global frame env, or leave it to be reported when evaluated."""
+    try:
+        return compile_expression(expr, env)
+    except SchemeError:
+        return expr
+
+
 def scheme_open(filename):
     try:
         return open(filename)
     except IOError as exc:
-        if filename.endwith('.scm'):
+        if filename.endswith('.scm'):
             raise SchemeError(str(exc))
     try:
         return open(filename + '.scm')
@@ -167,16 +294,22 @@ def scheme_open(filename):
         raise SchemeError(str(exc))
 
 
-def create_global_frame():
-    """Init and return a single frame env with build in names."""
-    env = Frame(None)
-    env.define('eval', PrimitiveProcedure(scheme_eval, True))
-    env.define('apply', PrimitiveProcedure(scheme_apply, True))
-    env.define('load', PrimitiveProcedure(scheme_load, True))
+def create_global_frame(evaluator=scheme_eval):
+    """
+    Init and return a single frame env with build in names. Expressions read by
+    the interpreter, including those passed to eval, are evaluated with evaluator.
+    """
+    env = GlobalFrame(evaluator)
+    env.define('eval', PrimitiveProcedure(evaluator, True, 'eval'))
+    env.define('apply', PrimitiveProcedure(scheme_apply, True, 'apply'))
+    env.define('load', PrimitiveProcedure(scheme_load, True, 'load'))
+    env.define('vector-map', PrimitiveProcedure(scheme_vector_map, True, 'vector-map'))
+    env.define('disassemble', PrimitiveProcedure(scheme_disassemble, name='disassemble'))
+    env.define('runtime-stats', PrimitiveProcedure(scheme_runtime_stats, name='runtime-stats'))
 
     for names, func in get_primitive_bindings():
         for name in names:
-            proc = PrimitiveProcedure(func)
+            proc = PrimitiveProcedure(func, name=name)
             env.define(name, proc)
     return env
 
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+# Author: Forrest Chang (forrestchang7@gmail.com)
+
+"""
+The stats module keeps counters of the work the interpreter does. They are
+cheap enough to be always on, so that a script running away with memory or
+time shows up while it is still running.
+
+The evaluators, procedures, frames and pairs add to the counters as they go,
+each with a single increment of a dict entry:
+
+    eval_steps      expressions dispatched by the loops of scheme_eval and
+                    machine_eval (compiled closures and the bytecode of the vm
+                    run without one, and take no steps: counting each
+                    instruction would slow the vm down by a third)
+    applications    procedures applied, by kind: primitive, lambda, nu or lazy
+    frames          call frames created, for procedure calls and let forms
+    pairs           pairs allocated
+    thunks_forced   arguments passed by name or need that were evaluated
+
+Two more are not counted as they change. Symbols, the number of symbols
+interned, is looked up when the counters are read. Peak_stack_depth, the
+deepest Python stack seen so far, is sampled: it is measured on every 1024th
+frame created, as deep recursion creates many frames, and of every thread
+when the counters are read, which a StatsWriter does every interval.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+counters = {'eval_steps': 0, 'frames': 0, 'pairs': 0, 'thunks_forced': 0}
+applications = {'primitive': 0, 'lambda': 0, 'nu': 0, 'lazy': 0}
+peak_stack_depth = 0
+
+STATS_INTERVAL = 10.0
+
+# The help text of each metric in the Prometheus text format
+METRICS = (
+    ('eval_steps', 'counter', 'Expressions the evaluator loops have dispatched.'),
+    ('applications', 'counter', 'Procedures applied, by kind.'),
+    ('frames', 'counter', 'Call frames created.'),
+    ('pairs', 'counter', 'Pairs allocated.'),
+    ('thunks_forced', 'counter', 'Arguments passed by name or need that were evaluated.'),
+    ('symbols', 'gauge', 'Symbols interned.'),
+    ('peak_stack_depth', 'gauge', 'Deepest Python stack seen.'),
+)
+
+
+def stack_depth(frame):
+    """The number of Python frames on the stack ending in frame."""
+    depth = 0
+    while frame is not None:
+        frame, depth = frame.f_back, depth + 1
+    return depth
+
+
+def note_stack_depth():
+    """Raise the peak stack depth to the depth of the stack of the caller, if it is deeper."""
+    global peak_stack_depth
+    depth = stack_depth(sys._getframe(1))
+    if depth > peak_stack_depth:
+        peak_stack_depth = depth
+
+
+def runtime_stats():
+    """The counters as a dict of names to numbers, with a dict of kinds to counts under applications."""
+    global peak_stack_depth
+    from .types import _all_symbols
+    depth = max(map(stack_depth, sys._current_frames().values()), default=0)
+    peak_stack_depth = max(peak_stack_depth, depth)
+    stats = dict(counters)
+    stats['applications'] = dict(applications)
+    stats['symbols'] = len(_all_symbols)
+    stats['peak_stack_depth'] = peak_stack_depth
+    return stats
+
+
+def reset_stats():
+    """Set every counter back to zero."""
+    global peak_stack_depth
+    for table in (counters, applications):
+        for name in table:
+            table[name] = 0
+    peak_stack_depth = 0
+
+
+def scheme_runtime_stats():
+    """The counters as a Scheme association list, with a list of kinds and counts for applications."""
+    from .types import intern, make_pair, nil, scint
+
+    def alist(items):
+        result = nil
+        for name, value in reversed(list(items)):
+            if isinstance(value, dict):
+                value = alist(value.items())
+            else:
+                value = scint(value)
+            result = make_pair(make_pair(intern(name.replace('_', '-')), value), result)
+        return result
+    return alist(runtime_stats().items())
+
+
+def prometheus_text(stats):
+    """The text of stats in the Prometheus exposition format, as read by the node exporter's textfile collector."""
+    lines = []
+    for name, kind, description in METRICS:
+        metric = 'schemy_' + name + ('_total' if kind == 'counter' else '')
+        lines.append('# HELP {} {}'.format(metric, description))
+        lines.append('# TYPE {} {}'.format(metric, kind))
+        value = stats[name]
+        if isinstance(value, dict):
+            for label, count in value.items():
+                lines.append('{}{{kind="{}"}} {}'.format(metric, label, count))
+        else:
+            lines.append('{} {}'.format(metric, value))
+    return '\n'.join(lines) + '\n'
+
+
+class StatsWriter:
+    """
+    A thread writing the counters to path every interval seconds, and once
+    more when it stops. A path ending in .prom is replaced each time by a
+    Prometheus text file; any other has a JSON object appended as a line,
+    with the time it was taken.
+    """
+
+    def __init__(self, path, interval=STATS_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.done = threading.Event()
+        self.thread = None
+
+    def write(self):
+        """Write the counters as they are now."""
+        stats = runtime_stats()
+        if self.path.endswith('.prom'):
+            # Written aside and renamed, so that a collector never reads half a file
+            partial = self.path + '.tmp'
+            with open(partial, 'w') as outfile:
+                outfile.write(prometheus_text(stats))
+            os.replace(partial, self.path)
+        else:
+            with open(self.path, 'a') as outfile:
+                print(json.dumps(dict(time=time.time(), **stats)), file=outfile)
+
+    def run(self):
+        while not self.done.wait(self.interval):
+            self.write()
+
+    def start(self):
+        """Start writing the counters in a background thread."""
+        self.done.clear()
+        self.thread = threading.Thread(target=self.run, name='schemy-stats', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the thread, writing the counters a last time."""
+        self.done.set()
+        self.thread.join()
+        self.write()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
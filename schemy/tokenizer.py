@@ -1,10 +1,11 @@
 # -*- coding: utf-8 -*-
 # Author: Forrest Chang (forrestchang7@gmail.com)
 import itertools
+import re
 import string
 import sys
-import tokenize
 
+from .types import SchemeStr, scfloat, scint
 from .utils import main
 
 _NUMERAL_STARTS = set(string.digits) | set('+-.')
@@ -13,7 +14,34 @@ _STRING_DELIMS = set('"')
 _WHITESPACE = set(' \t\n\r')
 _SINGLE_CHAR_TOKENS = set("()'`")
 _TOKEN_END = _WHITESPACE | _SINGLE_CHAR_TOKENS | _STRING_DELIMS | {',', ',@'}
-DELIMITERS = _SINGLE_CHAR_TOKENS | {'.', ',', ',@'}
+DELIMITERS = _SINGLE_CHAR_TOKENS | {'.', ',', ',@', '#('}
+_DIGITS = r'[0-9](?:_?[0-9])*'
+_INTEGER = re.compile(r'[+-]?{}\Z'.format(_DIGITS))
+_FLOAT = re.compile(r'[+-]?(?:(?:{0})?\.{0}|{0}\.?)(?:[eE][+-]?{0})?\Z|[+-]?(?:inf|infinity|nan)\Z'.format(_DIGITS),
+                    re.IGNORECASE)
+_SYMBOL = re.compile(r'[-!$%&*/:<=>?@^_~a-zA-Z0-9+.]+\Z')
+
+# One alternative per kind of token, tried in order after any whitespace.
+# Every character that is not whitespace starts one of them, and the end of the
+# line counts as a comment, so matching never backtracks into the whitespace.
+_TOKEN = re.compile(r'''[ \t\n\r]*(?:
+    (?P<comment>;|\Z)
+  | (?P<delimiter>[()'`]|,@?)
+  | (?P<hash>\#[\s\S]?)
+  | (?P<string>"[^"\\]*")
+  | (?P<escaped>")
+  | (?P<word>[^ \t\n\r()'`",]+)
+)''', re.VERBOSE)
+_COMMENT, _DELIMITER, _HASH, _STRING, _ESCAPED, _WORD = range(1, 7)
+
+# The tokens of words seen recently, as most words in a file are repeated
+_WORDS = {}
+_MAX_WORDS = 1 << 12
+
+_STRING_ESCAPES = {
+    '"': '"', '\\': '\\', '|': '|', "'": "'",
+    'n': '\n', 't': '\t', 'r': '\r', 'a': '\a', 'b': '\b', '0': '\0',
+}
 
 
 def valid_symbol(s):
@@ -26,10 +54,48 @@ def valid_symbol(s):
     return True
 
 
+def scan_string(line, k):
+    """
+    A tuple (s, k), where s is the SchemeStr value of the string literal whose opening quote is at
+    position k of line, and k is the position in line following its closing quote.
+
+    Escapes are \\n, \\t, \\r, \\a, \\b, \\0, \\", \\\\, \\| and \\xHEX; for a character code.
+
+    >>> scan_string('(display "a \\\\"b\\\\" c")', 9)
+    (scstr('a "b" c'), 20)
+    """
+    chunks = []
+    start = k + 1
+    while True:
+        end = line.find('"', start)
+        if end < 0:
+            raise ValueError('unterminated string: {}'.format(line[k:]))
+        escape = line.find('\\', start, end)
+        if escape < 0:
+            chunks.append(line[start:end])
+            return SchemeStr(''.join(chunks)), end + 1
+        chunks.append(line[start:escape])
+        c = line[escape + 1]
+        if c in _STRING_ESCAPES:
+            chunks.append(_STRING_ESCAPES[c])
+            start = escape + 2
+        elif c == 'x':
+            semicolon = line.find(';', escape + 2, end)
+            try:
+                if semicolon < 0:
+                    raise ValueError
+                chunks.append(chr(int(line[escape + 2:semicolon], 16)))
+            except (ValueError, OverflowError):
+                raise ValueError('invalid hex escape in string: {}'.format(line[k:]))
+            start = semicolon + 1
+        else:
+            raise ValueError('invalid escape \\{} in string: {}'.format(c, line[k:]))
+
+
 def next_candidate_token(line, k):
     """
     A tuple (tok, k), where tok is the next substring of line at or after position k that could be a token,
-    and k is the position in line following that token.
+    or the SchemeStr value of a string literal, and k is the position in line following that token.
 
     Returns (None, len(line)) when there are no more tokens.
     """
@@ -41,22 +107,14 @@ def next_candidate_token(line, k):
             k += 1
         elif c in _SINGLE_CHAR_TOKENS:
             return c, k+1
-        elif c == '#': # Boolean #t or #f
+        elif c == '#': # Boolean #t or #f, or the start of a vector
             return line[k:k+2], min(k+2, len(line))
         elif c == ',': # Unquote; check for @
             if k+1 < len(line) and line[k+1] == '@':
                 return ',@', k+2
             return c, k+1
         elif c in _STRING_DELIMS:
-            if k+1 < len(line) and line[k+1] == c: # No triple quotes in Scheme
-                return c+c, k+2
-            line_bytes = (bytes(line[k:], encoding='utf-8'),)
-            gen = tokenize.tokenize(iter(line_bytes).__next__)
-            next(gen) # Throw away encoding token
-            token = next(gen)
-            if token.type != tokenize.STRING:
-                raise ValueError('invalid string: {}'.format(token.string))
-            return token.string, token.end[1]+k
+            return scan_string(line, k)
         else:
             j = k
             while j < len(line) and line[j] not in _TOKEN_END:
@@ -66,11 +124,110 @@ def next_candidate_token(line, k):
 
 
 def tokenize_line(line):
-    """ The list of Scheme tokens on line. Excludes comments and whitespace. """
+    """
+    The list of Scheme tokens on line. Excludes comments and whitespace.
+
+    Tokens are found by matching the master pattern _TOKEN along the line.
+    Words are told apart by pattern rather than by trying int and float, so no
+    exception is raised for an ordinary symbol such as - or ->string, and the
+    token of each word is remembered in _WORDS for the next time it appears.
+    Numbers are read as Scheme numbers, so every use of a numeral in the
+    source while it is remembered shares the one constant.
+
+    >>> tokenize_line("(f -1 2.5 -> #t ,@x) ; done")
+    ['(', 'f', scnum(-1), scnum(2.5), '->', True, ',@', 'x', ')']
+    """
+    result = []
+    append = result.append
+    match = _TOKEN.match
+    words = _WORDS
+    i = 0
+    while True:
+        m = match(line, i)
+        kind, i = m.lastindex, m.end()
+        if kind == _WORD:
+            text = m.group(kind)
+            token = words.get(text)
+            if token is not None:
+                append(token)
+            elif text[0] in _SYMBOL_CHARS:
+                token = classify_word(text)
+                if len(words) >= _MAX_WORDS:
+                    words.clear()
+                words[text] = token
+                append(token)
+            else:
+                invalid_token(text, line, i)
+        elif kind == _DELIMITER:
+            append(m.group(kind))
+        elif kind == _STRING:
+            append(SchemeStr(m.group(kind)[1:-1]))
+        elif kind == _ESCAPED:
+            text, i = scan_string(line, i - 1)
+            append(text)
+        elif kind == _HASH:
+            text = m.group(kind)
+            if text == '#t':
+                append(True)
+            elif text == '#f':
+                append(False)
+            elif text == '#(':
+                append(text)
+            else:
+                invalid_token(text, line, i)
+        else: # Comment or end of line
+            return result
+
+
+def classify_word(text):
+    """
+    The token for word text, which starts with a symbol character: a boolean,
+    nil, a number or a symbol.
+
+    >>> classify_word('-'), classify_word('-7'), classify_word('1e3'), classify_word('True')
+    ('-', scnum(-7), scnum(1000.0), True)
+    """
+    lower = text.lower()
+    if lower == 'true':
+        return True
+    elif lower == 'false':
+        return False
+    elif text == 'nil':
+        return text
+    elif text[0] in _NUMERAL_STARTS:
+        if _INTEGER.match(text):
+            return scint(int(text))
+        elif _FLOAT.match(text):
+            return scfloat(float(text))
+        elif not _SYMBOL.match(text):
+            # int and float also accept digits of other scripts, and surrounding
+            # whitespace other than the delimiters, so leave those to them
+            return tokenize_line_by_char(text)[0]
+    if _SYMBOL.match(text):
+        return lower
+    raise ValueError('invalid numeral or symbol: {}'.format(text))
+
+
+def invalid_token(text, line, i):
+    """Warn that text, which ends at position i of line, is not a token."""
+    print('warning: invalid token: {}'.format(text), file=sys.stderr)
+    print('    ', line, file=sys.stderr)
+    print(' ' * (i+3), '^', file=sys.stderr)
+
+
+def tokenize_line_by_char(line):
+    """
+    The list of Scheme tokens on line, found by walking it a character at a time
+    with next_candidate_token and classifying numbers by trying int and float.
+
+    This is the reference that tokenize_line must agree with.
+    """
     result = []
     text, i = next_candidate_token(line, 0)
     while text is not None:
-        if text in DELIMITERS:
+        if type(text) is SchemeStr:
+            result.append(text)
+        elif text in DELIMITERS:
             result.append(text)
         elif text == '#t' or text.lower() == 'true':
             result.append(True)
@@ -82,11 +239,11 @@ def tokenize_line(line):
             number = False
             if text[0] in _NUMERAL_STARTS:
                 try:
-                    result.append(int(text))
+                    result.append(scint(int(text)))
                     number = True
                 except ValueError:
                     try:
-                        result.append(float(text))
+                        result.append(scfloat(float(text)))
                         number = True
                     except ValueError:
                         pass
@@ -95,24 +252,20 @@ def tokenize_line(line):
                     result.append(text.lower())
                 else:
                     raise ValueError('invalid numeral or symbol: {}'.format(text))
-        elif text[0] in _STRING_DELIMS:
-            result.append(text)
         else:
-            print('warning: invalid token: {}'.format(text), file=sys.stderr)
-            print('    ', line, file=sys.stderr)
-            print(' ' * (i+3), '^', file=sys.stderr)
+            invalid_token(text, line, i)
         text, i = next_candidate_token(line, i)
     return result
 
 
 def tokenize_lines(input):
     """ An iterator that returns list of tokens, one for each line of the iterable input sequence. """
-    return [tokenize_line(line) for line in input]
+    return (tokenize_line(line) for line in input)
 
 
 def count_tokens(input):
     """ Count the number of no-delimiter tokens in input. """
-    return len(list(filter(lambda x: x not in DELIMITERS, itertools.chain(*tokenize_lines(input)))))
+    return sum(1 for token in itertools.chain.from_iterable(tokenize_lines(input)) if token not in DELIMITERS)
 
 
 @main
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+# Author: Forrest Chang (forrestchang7@gmail.com)
+
+"""
+The tracing module records the procedures a program calls, the values they
+return, the tail calls they end in and the names it defines, from the eval
+hooks of traced_eval.
+
+EvalHooks is the base of hooks objects, and does nothing for each event. A
+TraceWriter writes each event to a file, as a line of JSON or, for a file
+whose name ends in .bin, as a compact binary record, and read_trace reads
+either back. A writer can record only every so many calls, and only calls no
+deeper than a limit, while still following the depth of every call.
+
+Values are summarized in at most VALUE_WIDTH characters, by stopping the
+printer as soon as it has written that many, so that tracing a call on a long
+list costs no more than on a short one.
+"""
+
+import json
+import struct
+import time
+
+from .procedure import Procedure
+from .profiler import frame_name
+from .types import SchemeStr, write_value
+
+VALUE_WIDTH = 60
+
+# Events, numbered as in binary records
+CALL, RETURN, ERROR, DEFINE, TAIL = range(5)
+EVENTS = ('call', 'return', 'error', 'define', 'tail')
+
+# A binary trace is MAGIC followed by records. Each record is its event, its
+# depth, its time in seconds since tracing started and the number of strings
+# after it, each written as its length in bytes and its UTF-8 bytes: the
+# name, then the arguments of a call, the value of a return or a define, or
+# the error. A tail record has the name alone.
+MAGIC = b'schemy-trace-2\n'
+RECORD = struct.Struct('<BIdH')
+LENGTH = struct.Struct('<H')
+
+
+class _Enough(Exception):
+    """Raised to stop the printer once a summary is long enough."""
+
+
+def summary(value, width=VALUE_WIDTH):
+    """The printed form of value, cut short with ... after width characters."""
+    if isinstance(value, Procedure):
+        return '#[{}]'.format(frame_name(value))
+    if type(value) is SchemeStr and len(value) > width:
+        value = SchemeStr(value[:width])
+    parts, size = [], 0
+    def write(text):
+        nonlocal size
+        parts.append(text)
+        size += len(text)
+        if size > width:
+            raise _Enough
+    try:
+        write_value(value, write, quoted=True)
+    except _Enough:
+        return ''.join(parts)[:width - 3] + '...'
+    return ''.join(parts)
+
+
+class EvalHooks:
+    """
+    Hooks for traced_eval that do nothing, to be overridden by subclasses.
+
+    Only what traced_eval evaluates itself is reported: the calls and defines
+    of code run by another evaluator, such as the top level of a program run
+    with -compile or -vm, are not.
+    """
+
+    def on_call(self, procedure, args, tail):
+        """Procedure is about to be applied to the Scheme list args, in place of the current call if tail."""
+
+    def on_return(self, procedure, value):
+        """The call of procedure made last has returned value."""
+
+    def on_error(self, procedure, error):
+        """The call of procedure made last has raised the exception error."""
+
+    def on_tail(self, procedure):
+        """The call of procedure made last has ended in a tail call, which is about to be reported."""
+
+    def on_define(self, name, value):
+        """The symbol name has been defined as value."""
+
+
+class TraceWriter(EvalHooks):
+    """
+    Hooks writing trace records to the file at path, as JSON lines, or as
+    binary records if path ends in .bin. Only every sample-th call is recorded,
+    with the return, error or tail call that ends it, and only if it is no more
+    than max_depth calls deep. Defines are always recorded, unless they are too
+    deep.
+    """
+
+    def __init__(self, path, sample=1, max_depth=None, width=VALUE_WIDTH, timer=time.perf_counter):
+        self.binary = path.endswith('.bin')
+        self.file = open(path, 'wb' if self.binary else 'w')
+        if self.binary:
+            self.file.write(MAGIC)
+        self.sample = sample
+        self.max_depth = max_depth
+        self.width = width
+        self.timer = timer
+        self.start = timer()
+        self.calls = 0
+        self.stack = []     # whether each call running is recorded
+
+    def record(self, event, depth, name, strings):
+        """Write a record of event at depth, about name, with strings summarizing its values."""
+        seconds = self.timer() - self.start
+        if self.binary:
+            parts = [RECORD.pack(event, depth, seconds, 1 + len(strings))]
+            for string in (name, *strings):
+                data = string.encode('utf-8')[:0xffff]
+                parts.append(LENGTH.pack(len(data)))
+                parts.append(data)
+            self.file.write(b''.join(parts))
+        else:
+            print(json.dumps(as_dict(event, depth, seconds, name, strings)), file=self.file)
+
+    def on_call(self, procedure, args, tail):
+        depth = len(self.stack) + 1
+        self.calls += 1
+        recorded = (self.calls % self.sample == 0 and
+                    (self.max_depth is None or depth <= self.max_depth))
+        self.stack.append(recorded)
+        if recorded:
+            self.record(CALL, depth, frame_name(procedure), [summary(arg, self.width) for arg in args])
+
+    def on_return(self, procedure, value):
+        depth = len(self.stack)
+        if self.stack.pop():
+            self.record(RETURN, depth, frame_name(procedure), [summary(value, self.width)])
+
+    def on_error(self, procedure, error):
+        depth = len(self.stack)
+        if self.stack.pop():
+            self.record(ERROR, depth, frame_name(procedure), ['{}: {}'.format(type(error).__name__, error)])
+
+    def on_tail(self, procedure):
+        depth = len(self.stack)
+        if self.stack.pop():
+            self.record(TAIL, depth, frame_name(procedure), [])
+
+    def on_define(self, name, value):
+        depth = len(self.stack)
+        if self.max_depth is None or depth <= self.max_depth:
+            self.record(DEFINE, depth, str(name), [summary(value, self.width)])
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def as_dict(event, depth, seconds, name, strings):
+    """A trace record as the dict written as a JSON line."""
+    record = {'event': EVENTS[event], 'depth': depth, 'time': seconds, 'name': name}
+    if event == CALL:
+        record['args'] = list(strings)
+    elif event == ERROR:
+        record['error'] = strings[0]
+    elif event != TAIL:
+        record['value'] = strings[0]
+    return record
+
+
+def read_trace(path):
+    """Yield the records of the trace at path as dicts, whichever way it was written."""
+    with open(path, 'rb') as infile:
+        data = infile.read()
+    if not data.startswith(MAGIC):
+        for line in data.decode('utf-8').splitlines():
+            yield json.loads(line)
+        return
+    offset = len(MAGIC)
+    while offset < len(data):
+        event, depth, seconds, count = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        strings = []
+        for _ in range(count):
+            length, = LENGTH.unpack_from(data, offset)
+            offset += LENGTH.size
+            strings.append(data[offset:offset + length].decode('utf-8', 'replace'))
+            offset += length
+        yield as_dict(event, depth, seconds, strings[0], strings[1:])
@@ -3,7 +3,6 @@
 import math
 import numbers
 import operator
-import re
 import sys
 
 try:
@@ -12,6 +11,7 @@ except:
     print('could not import turtle module', file=sys.stderr)
 
 from .exception import bad_type, SchemeError, check_type
+from .stats import counters as _counters
 
 
 class SchemeValue:
@@ -21,6 +21,9 @@ class SchemeValue:
     subclasses of SchemeValue.
     """
 
+    # No instance dict here, so that subclasses declaring __slots__ have none
+    __slots__ = ()
+
     def __bool__(self):
         """
         This is the method used by Python's conditionals (if, and, or, not, while)
@@ -60,7 +63,7 @@ class SchemeValue:
         """
         return scbool(self == y)
 
-    def tomp(self):
+    def atomp(self):
         return scheme_true
 
     def pairp(self):
@@ -119,7 +122,7 @@ class SchemeValue:
         bad_type(self, 0, "zero?")
 
     def cons(self, y):
-        return Pair(self, y)
+        return make_pair(self, y)
 
     def append(self, y):
         bad_type(self, 0, "append")
@@ -142,6 +145,9 @@ class SchemeValue:
     def integerp(self):
         return scheme_false
 
+    def vectorp(self):
+        return scheme_false
+
     def evaluate_arguments(self, arg_list, env):
         """
         Evaluate the expression in ARG_LIST in env to produce arguments for this procedure.
@@ -183,7 +189,7 @@ def scheme_coerce(x):
     elif isinstance(x, str):
         return intern(x)
     else:
-        raise TypeError('cannot covert type {} to a SchemeValue').format(type(x))
+        raise TypeError('cannot covert type {} to a SchemeValue'.format(type(x)))
 
 
 class okay(SchemeValue):
@@ -247,11 +253,11 @@ def _check_num(x, name):
 class SchemeNumber(SchemeValue):
     """The parent class of all Scheme numeric types."""
 
-    def numbrep(self):
+    def numberp(self):
         return scheme_true
 
     def __repr__(self):
-        return 'scnum({})'.format(self)
+        return 'scnum({})'.format(str(self))
 
     def eq(self, y):
         return scbool(self == _check_num(y, '='))
@@ -274,32 +280,34 @@ class SchemeNumber(SchemeValue):
 
 class SchemeInt(SchemeNumber, int):
 
+    __str__ = int.__repr__
+
     def integerp(self):
         return scheme_true
 
     def neg(self):
-        return SchemeInt(-self)
+        return scint(-self)
 
     def quo(self, y):
         check_type(y, scheme_integerp, 1, 'quotient')
         try:
             if (y < 0) != (self < 0):
-                return SchemeInt(- (abs(self) // abs(y)))
+                return scint(- (abs(self) // abs(y)))
             else:
-                return SchemeInt(self // y)
+                return scint(self // y)
         except ZeroDivisionError as e:
             raise SchemeError(e)
 
     def modulo(self, y):
         check_type(y, scheme_integerp, 1, 'modulo')
         try:
-            return SchemeInt(self % y)
+            return scint(self % y)
         except ZeroDivisionError as e:
             raise SchemeError(e)
 
     def rem(self, y):
-        q = self.quo()
-        return SchemeInt(self - q * y)
+        q = self.quo(y)
+        return scint(self - q * y)
 
     def floor(self):
         return self
@@ -319,26 +327,53 @@ class SchemeInt(SchemeNumber, int):
 
 class SchemeFloat(SchemeNumber, float):
 
+    __str__ = float.__repr__
+
     def neg(self):
         return SchemeFloat(-self)
 
     def floor(self):
-        return SchemeInt(int(math.floor(self)))
+        return scint(int(math.floor(self)))
 
     def ceil(self):
-        return SchemeInt(int(math.ceil(self)))
+        return scint(int(math.ceil(self)))
 
     def eqvp(self, y):
         return scbool(self == y)
 
-scint = SchemeInt
 scfloat = SchemeFloat
 
+SMALL_INT_RANGE = (-256, 1024)
+
+_small_ints = {}
+
+
+def cache_small_ints(low, high):
+    """
+    Preallocate the SchemeInts from low to high inclusive, which scint then
+    shares instead of making new ones. An empty range turns the cache off.
+    """
+    _small_ints.clear()
+    _small_ints.update((i, SchemeInt(i)) for i in range(low, high + 1))
+
+cache_small_ints(*SMALL_INT_RANGE)
+
+
+def scint(num):
+    """The SchemeInt for the int num, shared when it is small."""
+    small = _small_ints.get(num)
+    if small is None:
+        return SchemeInt(num)
+    return small
+
 
 def scnum(num):
-    r = round(num)
-    if r == num:
-        return scint(r)
+    """
+    The Scheme number for the Python number num. Integers are exact and
+    everything else is inexact, so 2.0 stays a SchemeFloat.
+    """
+    if isinstance(num, numbers.Integral):
+        return scint(num)
     else:
         return scfloat(num)
 
@@ -402,18 +437,14 @@ class SchemeStr(SchemeValue, str):
     def __repr__(self):
         return 'scstr({!r})'.format(str(self))
 
-    _escape = re.compile(r'''"|\.''')
+    # The escapes written for characters that cannot appear as themselves in a literal
+    _escapes = str.maketrans({
+        '"': '\\"', '\\': '\\\\', '\n': '\\n', '\t': '\\t', '\r': '\\r',
+        '\a': '\\a', '\b': '\\b', '\0': '\\0',
+    })
 
     def print_repr(self):
-        s = str.__repr__(self)
-        if s[0] == "'":
-            s = s[1:-1]
-            s = SchemeStr._escape.sub(
-                lambda x: (r'\"' if x == '"' else "'" if x == r"\'" else x),
-                s
-            )
-            s = '"' + s + '"'
-        return s
+        return '"' + self.translate(SchemeStr._escapes) + '"'
 
 scstr = SchemeStr
 
@@ -438,123 +469,169 @@ class Pair(SchemeValue):
     scnum(2)
     >>> print(s.map(lambda x: x+5))
     (6 7)
+
+    Pair coerces Python numbers and strings given to it into Scheme values.
+    The interpreter, whose values are Scheme values already, builds pairs with
+    make_pair instead.
     """
 
+    __slots__ = ('first', 'second')
+
     def __init__(self, first, second):
-        first = scheme_coerce(first)
-        second = scheme_coerce(second)
+        self.first = scheme_coerce(first)
+        self.second = scheme_coerce(second)
+        _counters['pairs'] += 1
 
-        assert isinstance(first, SchemeValue) and \
-            isinstance(second, SchemeValue)
+    def atomp(self):
+        return scheme_false
 
-        self.first = first
-        self.second = second
+    def pairp(self):
+        return scheme_true
 
-        def atomp(self):
-            return scheme_false
+    def car(self):
+        return self.first
 
-        def pairp(self):
-            return scheme_true
+    def cdr(self):
+        return self.second
 
-        def car(self):
-            return self.first
+    def set_car(self, v):
+        self.first = v
+        return okay
 
-        def cdr(self):
-            return self.second
+    def set_cdr(self, v):
+        self.second = v
+        return okay
 
-        def set_car(self, v):
-            self.first = v
-            return okay
+    def length(self):
+        return scint(self.__len__())
 
-        def set_cdr(self, v):
-            self.second = v
-            return okay
+    def equalp(self, y):
+        return scbool(self == y)
 
-        def length(self):
-            return SchemeInt(self.__len__())
+    def listp(self):
+        """
+        Whether self is a proper list, ending in nil. A circular list is not, and
+        is found by a second walker moving at half speed being caught up with.
+        """
+        slow = fast = self
+        while True:
+            fast = fast.second
+            if type(fast) is not Pair:
+                return scbool(fast is nil)
+            fast = fast.second
+            if type(fast) is not Pair:
+                return scbool(fast is nil)
+            slow = slow.second
+            if fast is slow:
+                return scheme_false
 
-        def equalp(self, y):
-            return scbool(self == y)
+    def __repr__(self):
+        def uncoerce(x):
+            if scheme_numberp(x):
+                return x + 0
+            elif scheme_symbolp(x):
+                return str(x)
+            else:
+                return x
 
-        def listp(self):
-            return self._list_end().nullp()
+        parts, p = [], self
+        while type(p) is Pair:
+            parts.append('Pair({0!r}, '.format(uncoerce(p.first)))
+            p = p.second
+        parts.append(repr(uncoerce(p)))
+        parts.append(')' * (len(parts) - 1))
+        return ''.join(parts)
 
-        def _list_end(self):
-            p0 = self
-            p1 = self.second
-            while p1 is not p0 and p1.pairp():
-                p1 = p1.second
-                if p1 is p0 or not p1.pairp():
-                    break
-                p0 = p0.second
-            return p1
-
-        def __repr__(self):
-            def uncoerce(x):
-                if scheme_numberp(x):
-                    return x + 0
-                elif scheme_symbolp(x):
-                    return str(x)
-                else:
-                    return x
-
-            return "Pair({0!r}, {1!r})".format(uncoerce(self.first),
-                                               uncoerce(self.second))
-
-        def __str__(self):
-            s = "(" + str(self.first)
-            second = self.second
-            while second.pairp():
-                s += " " + str(second.car())
-                second = second.cdr()
-            if not second.nullp():
-                s += " . " + str(second)
-            return s + ")"
-
-        def __len__(self):
-            if not self._list_end().nullp():
+    def __str__(self):
+        return to_string(self)
+
+    def print_repr(self):
+        return to_string(self, True)
+
+    def __len__(self):
+        # A second walker moving at half speed is caught up with in a circular list
+        n, slow, fast = 1, self, self.second
+        while type(fast) is Pair:
+            if fast is slow:
                 raise SchemeError("length attempted on improper list")
-            n, second = 1, self.second
-            while second.pairp():
-                n += 1
-                second = second.second
-            return n
-
-        def __getitem__(self, k):
-            if k < 0:
-                raise IndexError("negative index into list")
-            y = self
-            for _ in range(k):
-                if y.second is nil:
-                    raise IndexError("list index out of bounds")
-                elif not isinstance(y.second, Pair):
-                    raise SchemeError("ill-formed list")
-                y = y.second
-            return y.first
-
-        def __eq__(self, p):
-            if not isinstance(p, Pair):
-                return False
-            return bool(self.first.equalp(p.first) and self.second.equalp(p.second))
+            fast = fast.second
+            n += 1
+            if n & 1:
+                slow = slow.second
+        if fast is not nil:
+            raise SchemeError("length attempted on improper list")
+        return n
+
+    def __iter__(self):
+        p = self
+        while isinstance(p, Pair):
+            yield p.first
+            p = p.second
+        if p is not nil:
+            raise SchemeError("ill-formed list")
 
-        def map(self, fn):
-            """Return a Scheme list after mapping Python function FN to SELF."""
-            mapped = fn(self.first)
-            if self.second.nullp() or self.second.pairp():
-                return Pair(mapped, self.second.map(fn))
-            else:
+    def __getitem__(self, k):
+        if k < 0:
+            raise IndexError("negative index into list")
+        y = self
+        for _ in range(k):
+            if y.second is nil:
+                raise IndexError("list index out of bounds")
+            elif not isinstance(y.second, Pair):
                 raise SchemeError("ill-formed list")
+            y = y.second
+        return y.first
+
+    def __eq__(self, p):
+        x = self
+        while type(x) is Pair:
+            if type(p) is not Pair or not x.first.equalp(p.first):
+                return False
+            x, p = x.second, p.second
+        return bool(x.equalp(p))
 
-        def append(self, y):
-            if not self.listp():
+    def map(self, fn):
+        """Return a Scheme list after mapping Python function FN, which returns Scheme values, to SELF."""
+        result = last = make_pair(fn(self.first), nil)
+        p = self.second
+        while type(p) is Pair:
+            last.second = make_pair(fn(p.first), nil)
+            last = last.second
+            p = p.second
+        if p is not nil:
+            raise SchemeError("ill-formed list")
+        return result
+
+    def append(self, y):
+        """Return a copy of SELF, which must be a proper list, followed by Y."""
+        result = last = make_pair(self.first, y)
+        n, slow, p = 1, self, self.second
+        while type(p) is Pair:
+            if p is slow:
                 raise SchemeError("attempt to append to improper list")
-            result = last = Pair(self.first, y)
-            p = self.second
-            while p is not nil:
-                last.second = Pair(p.first, y)
-                last = last.second
-                p = p.second
-            return result
+            last.second = make_pair(p.first, y)
+            last = last.second
+            p = p.second
+            n += 1
+            if n & 1:
+                slow = slow.second
+        if p is not nil:
+            raise SchemeError("attempt to append to improper list")
+        return result
+
+_new_object = object.__new__
+
+
+def make_pair(first, second):
+    """
+    A Pair of first and second, which must be Scheme values already. This is
+    the trusted way to build pairs, skipping the coercion done by Pair.
+    """
+    pair = _new_object(Pair)
+    pair.first = first
+    pair.second = second
+    _counters['pairs'] += 1
+    return pair
 
 
 class nil(SchemeValue):
@@ -567,7 +644,7 @@ class nil(SchemeValue):
         return scheme_true
 
     def length(self):
-        return SchemeInt(0)
+        return scint(0)
 
     def __repr__(self):
         return "nil"
@@ -578,6 +655,9 @@ class nil(SchemeValue):
     def __len__(self):
         return 0
 
+    def __iter__(self):
+        return iter(())
+
     def __getitem__(self, k):
         if k < 0:
             raise IndexError("negative index into list")
@@ -592,6 +672,173 @@ class nil(SchemeValue):
 nil = nil()
 
 
+# -------
+# Vectors
+# -------
+
+
+class SchemeVector(SchemeValue):
+    """
+    A vector holds its elements in a Python list, items, so that indexing
+    takes constant time. Vectors evaluate to themselves.
+
+    >>> v = SchemeVector([scnum(1), scstr('a'), nil])
+    >>> v
+    SchemeVector([scnum(1), scstr('a'), nil])
+    >>> print(v)
+    #(1 a ())
+    >>> v.print_repr()
+    '#(1 "a" ())'
+    """
+
+    __slots__ = ('items',)
+
+    def __init__(self, items):
+        self.items = items
+
+    def vectorp(self):
+        return scheme_true
+
+    def equalp(self, y):
+        return scbool(self == y)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __eq__(self, y):
+        if not isinstance(y, SchemeVector) or len(self.items) != len(y.items):
+            return False
+        return all(a.equalp(b) for a, b in zip(self.items, y.items))
+
+    def __repr__(self):
+        return 'SchemeVector({!r})'.format(self.items)
+
+    def __str__(self):
+        return to_string(self)
+
+    def print_repr(self):
+        return to_string(self, True)
+
+
+# --------
+# Printing
+# --------
+
+# Chunks of output are gathered into strings of about this many pieces
+_PRINT_CHUNK = 4096
+_END = object()
+
+
+def write_value(value, write, quoted=False, cycles=False):
+    """
+    Write the printed form of value, in chunks, to write, a function taking a
+    string. Strings are written as they are, or with print_repr if quoted.
+
+    Lists and vectors are followed with an explicit stack holding, for each
+    one still open, the rest of its elements, so printing takes time linear in
+    the size of value and memory only for the depth of its nesting.
+
+    If cycles, structure reached more than once, as in a circular list, is
+    labeled where it first appears with #n= and referred to afterwards with #n#,
+    at the cost of first finding every pair and vector in value.
+
+    >>> items = scheme_list(scnum(1), scstr('a'), SchemeVector([nil]))
+    >>> write_value(Pair(items, scnum(2)), print, True)
+    ((1 "a" #(())) . 2)
+    >>> items.second.second = items
+    >>> write_value(items, print, cycles=True)
+    #0=(1 a . #0#)
+    """
+    shared = find_shared(value) if cycles else None
+    labels = {}
+    parts = []
+    emit = parts.append
+    stack = []
+    while True:
+        # Write value, or open it and go on to its first element
+        if shared and id(value) in labels:
+            emit('#{}#'.format(labels[id(value)]))
+        else:
+            if shared and id(value) in shared:
+                labels[id(value)] = len(labels)
+                emit('#{}='.format(labels[id(value)]))
+            if type(value) is Pair:
+                emit('(')
+                stack.append([value.second])
+                value = value.first
+                continue
+            elif type(value) is SchemeVector:
+                items = iter(value.items)
+                value = next(items, _END)
+                if value is not _END:
+                    emit('#(')
+                    stack.append(items)
+                    continue
+                emit('#()')
+            elif quoted:
+                emit(value.print_repr())
+            else:
+                emit(str(value))
+        if len(parts) >= _PRINT_CHUNK:
+            write(''.join(parts))
+            parts.clear()
+
+        # Find the next element to write, closing the lists and vectors it ends
+        while stack:
+            top = stack[-1]
+            if type(top) is list:
+                rest = top[0]
+                if type(rest) is Pair and not (shared and id(rest) in shared):
+                    emit(' ')
+                    top[0] = rest.second
+                    value = rest.first
+                    break
+                elif rest is nil:
+                    emit(')')
+                    stack.pop()
+                else:
+                    emit(' . ')
+                    top[0] = nil
+                    value = rest
+                    break
+            else:
+                value = next(top, _END)
+                if value is not _END:
+                    emit(' ')
+                    break
+                emit(')')
+                stack.pop()
+        else:
+            write(''.join(parts))
+            return
+
+
+def find_shared(value):
+    """The set of the ids of the pairs and vectors reached more than once from value."""
+    seen, shared = set(), set()
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        while type(value) is Pair or type(value) is SchemeVector:
+            if id(value) in seen:
+                shared.add(id(value))
+                break
+            seen.add(id(value))
+            if type(value) is SchemeVector:
+                stack.extend(value.items)
+                break
+            stack.append(value.second)
+            value = value.first
+    return shared
+
+
+def to_string(value, quoted=False, cycles=False):
+    """The printed form of value, as written by write_value."""
+    chunks = []
+    write_value(value, chunks.append, quoted, cycles)
+    return ''.join(chunks)
+
+
 # ----------------
 # Primitive Operations
 # ----------------
@@ -677,8 +924,8 @@ def scheme_cdr(x):
 @primitive("list")
 def scheme_list(*vals):
     result = nil
-    for i in range(len(vals)-1, -1, -1):
-        result = scheme_cons(vals[i], result)
+    for val in reversed(vals):
+        result = make_pair(val, result)
     return result
 
 
@@ -692,11 +939,94 @@ def scheme_append(*vals):
     return result
 
 
+@primitive("vector?")
+def scheme_vectorp(x):
+    return x.vectorp()
+
+
+@primitive("vector")
+def scheme_vector(*vals):
+    return SchemeVector(list(vals))
+
+
+@primitive("make-vector")
+def scheme_make_vector(k, fill=None):
+    check_type(k, scheme_integerp, 0, "make-vector")
+    if k < 0:
+        raise SchemeError("make-vector: negative length {}".format(k))
+    return SchemeVector([scnum(0) if fill is None else fill] * k)
+
+
+def _check_index(v, k, name):
+    """Check that V is a vector and K an index into it."""
+    check_type(v, scheme_vectorp, 0, name)
+    check_type(k, scheme_integerp, 1, name)
+    if not 0 <= k < len(v.items):
+        raise SchemeError("{}: index {} out of range for vector of length {}".format(name, k, len(v.items)))
+
+
+@primitive("vector-ref")
+def scheme_vector_ref(v, k):
+    _check_index(v, k, "vector-ref")
+    return v.items[k]
+
+
+@primitive("vector-set!")
+def scheme_vector_set(v, k, val):
+    _check_index(v, k, "vector-set!")
+    v.items[k] = val
+    return okay
+
+
+@primitive("vector-length")
+def scheme_vector_length(v):
+    check_type(v, scheme_vectorp, 0, "vector-length")
+    return scint(len(v.items))
+
+
+@primitive("vector->list")
+def scheme_vector_to_list(v):
+    check_type(v, scheme_vectorp, 0, "vector->list")
+    return scheme_list(*v.items)
+
+
+@primitive("list->vector")
+def scheme_list_to_vector(x):
+    check_type(x, scheme_listp, 0, "list->vector")
+    return SchemeVector(list(x))
+
+
+@primitive("vector-fill!")
+def scheme_vector_fill(v, fill):
+    check_type(v, scheme_vectorp, 0, "vector-fill!")
+    v.items[:] = [fill] * len(v.items)
+    return okay
+
+
 @primitive("string?")
 def scheme_stringp(x):
     return x.stringp()
 
 
+@primitive("string-length")
+def scheme_string_length(s):
+    check_type(s, scheme_stringp, 0, "string-length")
+    return scint(len(s))
+
+
+@primitive("string-append")
+def scheme_string_append(*strings):
+    for i, s in enumerate(strings):
+        check_type(s, scheme_stringp, i, "string-append")
+    return scstr(''.join(strings))
+
+
+@primitive("number->string")
+def scheme_number_to_string(x):
+    check_type(x, scheme_numberp, 0, "number->string")
+    return scstr(str(x))
+
+
 @primitive("symbol?")
 def scheme_symbolp(x):
     return x.symbolp()
@@ -724,24 +1054,56 @@ def _arith(fn, init, vals):
     """
     Perform the fn operation on the number values of VALS, with INIT as
     the value when VALS is empty. Returns the result as a Scheme value.
+
+    Python keeps the exact/inexact split for us: operations on ints give
+    ints, and any float operand makes the result a float, which stays one.
     """
-    _check_nums(*vals)
     s = init
-    for val in vals:
-        s = fn(s, val)
-    if round(s) == s:
-        return SchemeInt(round(s))
+    try:
+        for i, val in enumerate(vals):
+            if type(val) is not SchemeInt and not scheme_numberp(val):
+                raise SchemeError('operand {0} ({1}) is not a number'.format(i, val))
+            s = fn(s, val)
+    except OverflowError as err:
+        raise SchemeError(err)
+    if isinstance(s, int):
+        return scint(s)
     else:
         return SchemeFloat(s)
 
 
+def _divide(x, y):
+    """x / y, exact when both are exact and y divides x."""
+    if isinstance(x, int) and isinstance(y, int) and y != 0:
+        q, r = divmod(x, y)
+        if not r:
+            return q
+    return x / y
+
+
+# The binary forms of + - * < > = on two SchemeInts are the most common calls
+# of all, so they are answered before any of the general checks.
+
 @primitive("+")
 def scheme_add(*vals):
+    if len(vals) == 2:
+        x, y = vals
+        if type(x) is SchemeInt and type(y) is SchemeInt:
+            s = x + y
+            small = _small_ints.get(s)
+            return SchemeInt(s) if small is None else small
     return _arith(operator.add, 0, vals)
 
 
 @primitive("-")
 def scheme_sub(val0, *vals):
+    if len(vals) == 1:
+        y = vals[0]
+        if type(val0) is SchemeInt and type(y) is SchemeInt:
+            s = val0 - y
+            small = _small_ints.get(s)
+            return SchemeInt(s) if small is None else small
+    _check_nums(val0)
     if len(vals) == 0:
         return val0.neg()
     return _arith(operator.sub, val0, vals)
@@ -749,6 +1111,12 @@ def scheme_sub(val0, *vals):
 
 @primitive("*")
 def scheme_mul(*vals):
+    if len(vals) == 2:
+        x, y = vals
+        if type(x) is SchemeInt and type(y) is SchemeInt:
+            s = x * y
+            small = _small_ints.get(s)
+            return SchemeInt(s) if small is None else small
     return _arith(operator.mul, 1, vals)
 
 
@@ -756,10 +1124,11 @@ def scheme_mul(*vals):
 def scheme_div(*vals):
     try:
         if len(vals) == 1:
-            return _arith(operator.truediv, scnum(1), vals)
+            return _arith(_divide, 1, vals)
         elif len(vals) == 0:
             raise SchemeError("/ takes at least one argument")
-        return _arith(operator.truediv, vals[0], vals[1:])
+        _check_nums(vals[0])
+        return _arith(_divide, vals[0], vals[1:])
     except ZeroDivisionError as err:
         raise SchemeError(err)
 
@@ -791,16 +1160,22 @@ def scheme_ceil(val):
 
 @primitive("=")
 def scheme_eq(x, y):
+    if type(x) is SchemeInt and type(y) is SchemeInt:
+        return scheme_true if x == y else scheme_false
     return x.eq(y)
 
 
 @primitive("<")
 def scheme_lt(x, y):
+    if type(x) is SchemeInt and type(y) is SchemeInt:
+        return scheme_true if x < y else scheme_false
     return x.ltp(y)
 
 
 @primitive(">")
 def scheme_gt(x, y):
+    if type(x) is SchemeInt and type(y) is SchemeInt:
+        return scheme_true if x > y else scheme_false
     return x.gtp(y)
 
 
@@ -836,13 +1211,22 @@ def scheme_atomp(x):
 
 @primitive("display")
 def scheme_display(val):
-    print(str(val), end="")
+    write_value(val, sys.stdout.write)
     return okay
 
 
 @primitive("print")
 def scheme_print(val):
-    print(val.print_repr())
+    write_value(val, sys.stdout.write, True)
+    sys.stdout.write('\n')
+    return okay
+
+
+@primitive("print-shared")
+def scheme_print_shared(val):
+    """Print val, labeling structure reached more than once, so that circular lists can be printed."""
+    write_value(val, sys.stdout.write, True, True)
+    sys.stdout.write('\n')
     return okay
 
 
@@ -1053,9 +1437,11 @@ define_sym = intern("define")
 else_sym = intern("else")
 if_sym = intern("if")
 lambda_sym = intern("lambda")
+lazy_sym = intern("lazy")
 let_sym = intern("let")
 nu_sym = intern("nu")
 or_sym = intern("or")
+profile_sym = intern("profile")
 quasiquote_sym = intern("quasiquote")
 quote_sym = intern("quote")
 set_bang_sym = intern("set!")
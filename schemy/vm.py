@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+# Author: Forrest Chang (forrestchang7@gmail.com)
+
+"""
+The vm module runs the bytecode produced by the bytecode module.
+
+Values are pushed on one operand stack, and the code, position and frame of
+each pending call are saved on a list that lives on the heap, so calls between
+compiled procedures never recurse in Python. A tail call replaces the current
+call instead of saving it.
+
+Arguments passed by name are evaluated by the tree-walking evaluator, which
+can evaluate any expression in a frame made by the vm.
+"""
+
+from .bytecode import *
+from .compiler import scope_of
+from .environments import CallFrame
+from .eval import do_profile_form, scheme_apply
+from .exception import SchemeError
+from .procedure import LambdaProcedure, LazyProcedure, NuProcedure, PrimitiveProcedure, Thunk
+from .stats import applications
+from .types import *
+
+
+def vm_eval(expr, env):
+    """
+    Evaluate Scheme expression expr in env by compiling it to bytecode and
+    running it.
+
+    >>> env = create_global_frame(vm_eval)
+    >>> vm_eval(read_line("(+ 1 2)"), env)
+    scnum(3)
+    """
+    return execute(compile_expression(expr, scope_of(env)), env)
+
+
+def compile_procedure(procedure):
+    """Compile and cache the body of a procedure created outside the vm."""
+    procedure.code = compile_lambda(procedure.formals, procedure.body, scope_of(procedure.env),
+                                    isinstance(procedure, NuProcedure), by_need=isinstance(procedure, LazyProcedure))
+    return procedure.code
+
+
+def execute(code, env):
+    """Run code in env and return the value it returns."""
+    # Opcodes are copied to locals, which Python compares fastest
+    _LOAD_CONST, _LOAD_LOCAL, _LOAD_OUTER, _LOAD_CHECKED = LOAD_CONST, LOAD_LOCAL, LOAD_OUTER, LOAD_CHECKED
+    _LOAD_NAME, _LOAD_GLOBAL, _STORE_LOCAL, _SET_LOCAL = LOAD_NAME, LOAD_GLOBAL, STORE_LOCAL, SET_LOCAL
+    _STORE_NAME, _SET_NAME, _STORE_GLOBAL, _SET_GLOBAL = STORE_NAME, SET_NAME, STORE_GLOBAL, SET_GLOBAL
+    _POP, _JUMP, _JUMP_IF_FALSE = POP, JUMP, JUMP_IF_FALSE
+    _JUMP_IF_FALSE_OR_POP, _JUMP_IF_TRUE_OR_POP = JUMP_IF_FALSE_OR_POP, JUMP_IF_TRUE_OR_POP
+    _MAKE_CLOSURE, _BY_NAME, _CALL, _TAIL_CALL = MAKE_CLOSURE, BY_NAME, CALL, TAIL_CALL
+    _ENTER_FRAME, _LEAVE_FRAME, _RETURN, _LOAD_OPERATOR = ENTER_FRAME, LEAVE_FRAME, RETURN, LOAD_OPERATOR
+
+    stack = []
+    calls = []
+    instructions, constants, cells = code.instructions, code.constants, code.cells
+    pc = 0
+    while True:
+        op = instructions[pc]
+        arg = instructions[pc + 1]
+        pc += 2
+
+        # The most frequent instructions are tested first
+        if op == _LOAD_LOCAL:
+            stack.append(env.values[arg])
+        elif op == _LOAD_GLOBAL:
+            value = cells[arg].value
+            if value is None:
+                # The name may have been defined since in a frame around env, by eval
+                value = env.lookup(cells[arg].name)
+            stack.append(value)
+        elif op == _LOAD_CONST:
+            stack.append(constants[arg])
+        elif op == _LOAD_OPERATOR:
+            cell = cells[arg & 0xffff]
+            value = cell.value
+            if value is None:
+                value = env.lookup(cell.name)
+            stack.append(value)
+            if isinstance(value, NuProcedure):
+                operands, pc = constants[arg >> 16]
+                stack.extend(value.delay_arguments(operands, env))
+        elif op == _CALL or op == _TAIL_CALL:
+            if arg:
+                args = stack[-arg:]
+                del stack[-arg:]
+            else:
+                args = []
+            procedure = stack.pop()
+            callee = None
+            while True:
+                if type(procedure) is PrimitiveProcedure:
+                    applications['primitive'] += 1
+                    func = procedure.func
+                    if not procedure.use_env:
+                        try:
+                            value = func(*args)
+                        except TypeError as e:
+                            raise SchemeError(e)
+                        break
+                    elif func is scheme_apply:
+                        if len(args) != 2:
+                            raise SchemeError('apply takes 2 arguments ({} given)'.format(len(args)))
+                        procedure, args = args[0], list(args[1])
+                        continue
+                    elif func is vm_eval:
+                        if len(args) != 1:
+                            raise SchemeError('eval takes 1 argument ({} given)'.format(len(args)))
+                        callee, new_env = compile_expression(args[0], scope_of(env)), env
+                    else:
+                        args.append(env)
+                        try:
+                            value = func(*args)
+                        except TypeError as e:
+                            raise SchemeError(e)
+                        break
+                elif isinstance(procedure, LambdaProcedure) and not isinstance(procedure, Thunk):
+                    applications[procedure.kind] += 1
+                    callee = procedure.code
+                    if type(callee) is not Code:
+                        if callee is not None:
+                            value = callee.call(procedure.env, args)
+                            break
+                        callee = compile_procedure(procedure)
+                    layout = callee.layout
+                    if len(args) != layout.nparams:
+                        raise SchemeError('different number of formal parameters and args')
+                    if layout.padding:
+                        args.extend(layout.padding)
+                    new_env = CallFrame(layout, args, procedure.env)
+                else:
+                    raise SchemeError('{} is not callable'.format(str(procedure)))
+                break
+            if callee is not None:
+                # Start running the body of a compound procedure
+                if op == _CALL:
+                    calls.append((code, pc, env))
+                code, env, pc = callee, new_env, 0
+                instructions, constants, cells = code.instructions, code.constants, code.cells
+            elif op == _CALL:
+                stack.append(value)
+            elif not calls:
+                return value
+            else:
+                code, pc, env = calls.pop()
+                instructions, constants, cells = code.instructions, code.constants, code.cells
+                stack.append(value)
+        elif op == _RETURN:
+            if not calls:
+                return stack.pop()
+            code, pc, env = calls.pop()
+            instructions, constants, cells = code.instructions, code.constants, code.cells
+        elif op == _JUMP_IF_FALSE:
+            if stack.pop() is scheme_false:
+                pc = arg
+
+        # Variables
+        elif op == _LOAD_OUTER:
+            frame = env
+            for _ in range(arg >> 16):
+                frame = frame.parent
+            stack.append(frame.values[arg & 0xffff])
+        elif op == _LOAD_CHECKED:
+            frame = env
+            for _ in range(arg >> 16):
+                frame = frame.parent
+            slot = arg & 0xffff
+            value = frame.values[slot]
+            if value is None:
+                value = frame.lookup(frame.layout.names[slot])
+            if isinstance(value, Thunk):
+                value = value.get_actual_value()
+            stack.append(value)
+        elif op == _LOAD_NAME:
+            frame = env
+            for _ in range(arg >> 16):
+                frame = frame.parent
+            value = frame.lookup(constants[arg & 0xffff])
+            if isinstance(value, Thunk):
+                value = value.get_actual_value()
+            stack.append(value)
+        elif op == _STORE_LOCAL:
+            frame = env
+            for _ in range(arg >> 16):
+                frame = frame.parent
+            frame.values[arg & 0xffff] = stack.pop()
+        elif op == _SET_LOCAL:
+            frame = env
+            for _ in range(arg >> 16):
+                frame = frame.parent
+            slot = arg & 0xffff
+            if frame.values[slot] is None:
+                frame.set(frame.layout.names[slot], stack.pop())
+            else:
+                frame.values[slot] = stack.pop()
+        elif op == _STORE_NAME:
+            env.define(constants[arg], stack.pop())
+        elif op == _SET_NAME:
+            frame = env
+            for _ in range(arg >> 16):
+                frame = frame.parent
+            frame.set(constants[arg & 0xffff], stack.pop())
+        elif op == _STORE_GLOBAL:
+            cells[arg].assign(stack.pop())
+        elif op == _SET_GLOBAL:
+            cell = cells[arg]
+            if cell.value is None:
+                env.set(cell.name, stack.pop())
+            else:
+                cell.assign(stack.pop())
+
+        # Control
+        elif op == _JUMP:
+            pc = arg
+        elif op == _POP:
+            stack.pop()
+        elif op == _JUMP_IF_FALSE_OR_POP:
+            if stack[-1] is scheme_false:
+                pc = arg
+            else:
+                stack.pop()
+        elif op == _JUMP_IF_TRUE_OR_POP:
+            if stack[-1] is not scheme_false:
+                pc = arg
+            else:
+                stack.pop()
+        elif op == _ENTER_FRAME:
+            layout = constants[arg]
+            nparams = layout.nparams
+            if nparams:
+                values = stack[-nparams:]
+                del stack[-nparams:]
+            else:
+                values = []
+            if layout.padding:
+                values.extend(layout.padding)
+            env = CallFrame(layout, values, env)
+        elif op == _LEAVE_FRAME:
+            env = env.parent
+
+        # Procedures
+        elif op == _MAKE_CLOSURE:
+            child = constants[arg]
+            if child.by_name:
+                function_type = LazyProcedure if child.by_need else NuProcedure
+            else:
+                function_type = LambdaProcedure
+            procedure = function_type(child.formals, child.body, env, child)
+            if child.name is not None:
+                procedure.name = child.name
+            stack.append(procedure)
+        elif op == _BY_NAME:
+            if isinstance(stack[-1], NuProcedure):
+                operands, pc = constants[arg]
+                stack.extend(stack[-1].delay_arguments(operands, env))
+        elif op == PROFILE:
+            stack.append(do_profile_form(constants[arg], env)[0])
+        else:
+            raise SchemeError('bad opcode: {}'.format(op))
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# Author: Forrest Chang (forrestchang7@gmail.com)
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from schemy.buffer import Buffer, LineReader, MappedLines
+from schemy.repl import buffer_lines, create_global_frame, read_eval_print_loop, read_expressions, scheme_load
+from schemy.tokenizer import tokenize_lines
+from schemy.types import scstr
+
+
+def counted(lines, pulled):
+    """Yield lines, appending each one to the list pulled as it is taken."""
+    for line in lines:
+        pulled.append(line)
+        yield line
+
+
+class TestBuffer(unittest.TestCase):
+
+    def test_window_is_bounded(self):
+        src = Buffer(tokenize_lines('({})'.format(i) for i in range(1000)))
+        while src.current() is not None:
+            src.pop()
+        self.assertEqual(len(src.lines), 4)
+        self.assertEqual(src.line_number, 1000)
+
+    def test_error_context_numbers_lines(self):
+        src = Buffer(tokenize_lines(['1', '2', '3', '4', '5 6']))
+        for _ in range(5):
+            src.pop()
+        self.assertEqual(str(src), '2: 2\n3: 3\n4: 4\n5: 5 >> 6')
+
+    def test_expressions_are_read_as_needed(self):
+        pulled = []
+        exprs = read_expressions(counted(['(+ 1', '2)', '(car', "'(1))", '3'], pulled))
+        self.assertEqual(str(next(exprs)), '(+ 1 2)')
+        self.assertEqual(len(pulled), 2)
+        self.assertEqual(str(next(exprs)), '(car (quote (1)))')
+        self.assertEqual(len(pulled), 4)
+        self.assertEqual([str(expr) for expr in exprs], ['3'])
+
+    def test_line_readers_share_input(self):
+        lines = iter(['1', '2', '3'])
+        self.assertEqual(next(iter(LineReader(lines, None))), '1')
+        self.assertEqual(list(zip(range(2), LineReader(lines, None))), [(0, '2'), (1, '3')])
+
+    def test_repl_streams_input(self):
+        pulled = []
+        lines = counted(['(define x 1)', '(define y', '  (+ x 1))', 'y'], pulled)
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            read_eval_print_loop(lambda: buffer_lines(lines, None), create_global_frame())
+        self.assertEqual(out.getvalue().split(), ['x', 'y', '2'])
+        self.assertEqual(len(pulled), 4)
+
+
+class TestMappedLines(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, data):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'wb') as outfile:
+            outfile.write(data)
+        return path
+
+    def test_lines(self):
+        path = self.write('a.scm', '(a)\r\n"\u03bb"\n\n(b)'.encode('utf-8'))
+        with open(path) as infile, MappedLines(infile) as source:
+            self.assertEqual(list(source), ['(a)', '"\u03bb"', '', '(b)'])
+            self.assertEqual(list(source), ['(a)', '"\u03bb"', '', '(b)'])
+        with open(self.write('empty.scm', b'')) as infile, MappedLines(infile) as source:
+            self.assertEqual(list(source), [])
+
+    def test_line_numbers(self):
+        path = self.write('a.scm', b''.join(b'(line %d)\n' % i for i in range(1, 101)))
+        with open(path) as infile, MappedLines(infile) as source:
+            for i, line in enumerate(source, 1):
+                if i % 7 == 0:
+                    self.assertEqual(source.line_number(), i)
+                    self.assertEqual(line, '(line {})'.format(i))
+            lines = iter(source)
+            next(lines)
+            self.assertEqual(source.line_number(), 1)
+
+    def test_streamed_load_reports_line_of_error(self):
+        # The stray ) keeps the file from being read whole, so it is streamed
+        path = self.write('a.scm', b'(define x 1)\n\n(car\n x)\n(display x)\n)\n')
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            scheme_load(scstr(path), create_global_frame())
+        self.assertEqual(out.getvalue().splitlines(), [
+            'Error:  {}:4: argument 0 of car has wrong type (SchemeInt)'.format(path),
+            '1Error:  {}:6: unexpected token: )'.format(path),
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
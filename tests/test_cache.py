@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+# Author: Forrest Chang (forrestchang7@gmail.com)
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from schemy.bytecode import LOAD_CONST, Code, compile_expression, disassemble
+from schemy.cache import cache_path, dump_values, load_values, read_cache, source_key, write_cache
+from schemy.compiler import compile_eval
+from schemy.exception import SchemeError
+from schemy.repl import create_global_frame, read_expressions, scheme_load
+from schemy.types import Pair, nil, scnum, scstr
+from schemy.vm import execute, vm_eval
+
+SOURCE = """
+(define (fact n) (if (<= n 1) 1 (* n (fact (- n 1)))))
+(define (make-adder n) (lambda (x) (let ((y 1)) (+ x n y))))
+(define greeting "hello world")
+(define data '(1 2.5 #t #f nil (a . b) "s"))
+(define table #(1 "x" (a b) #(2)))
+(define result (+ (fact 5) ((make-adder 3) 4)))
+"""
+
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'lib.scm')
+        with open(self.filename, 'w') as outfile:
+            outfile.write(SOURCE)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def load(self, evaluator):
+        env = create_global_frame(evaluator)
+        scheme_load(scstr(self.filename), env)
+        return env
+
+    def test_forms_round_trip(self):
+        forms = tuple(read_expressions(SOURCE.splitlines()))
+        env = create_global_frame()
+        self.assertEqual(load_values(dump_values(forms), env), forms)
+        self.assertEqual([str(form) for form in load_values(dump_values(forms), env)],
+                         [str(form) for form in forms])
+
+    def test_long_lists_are_encoded_without_recursion(self):
+        items = nil
+        for i in range(10000):
+            items = Pair(scnum(i), items)
+        loaded = load_values(dump_values(items), create_global_frame())
+        self.assertEqual(list(loaded), list(items))
+
+    def test_bytecode_round_trip(self):
+        env = create_global_frame(vm_eval)
+        codes = tuple(compile_expression(form, env) for form in read_expressions(SOURCE.splitlines()))
+        other = create_global_frame(vm_eval)
+        loaded = load_values(dump_values(codes), other)
+        self.assertEqual([disassemble(code) for code in loaded], [disassemble(code) for code in codes])
+        for code in loaded:
+            execute(code, other)
+        self.assertEqual(other.lookup('result'), 128)
+
+    def test_load_fills_and_uses_cache(self):
+        for evaluator, kind in ((compile_eval, 'forms'), (vm_eval, 'bytecode')):
+            env = self.load(evaluator)
+            self.assertEqual(env.lookup('result'), 128)
+            self.assertTrue(os.path.exists(cache_path(self.filename, kind)))
+            env = self.load(evaluator)
+            self.assertEqual(env.lookup('result'), 128)
+            self.assertEqual(str(env.lookup('greeting')), 'hello world')
+            self.assertEqual(str(env.lookup('data')), '(1 2.5 #t #f () (a . b) s)')
+        key = source_key(self.filename)
+        entries = read_cache(self.filename, key, 'bytecode', create_global_frame(vm_eval))
+        self.assertTrue(all(isinstance(entry, Code) for entry in entries))
+
+    def test_exit_ends_only_the_load(self):
+        with open(self.filename, 'w') as outfile:
+            outfile.write('(define before 1)\n(exit)\n(define after 2)\n')
+        for evaluator in (compile_eval, vm_eval):
+            for _ in range(2):
+                env = self.load(evaluator)
+                self.assertEqual(env.lookup('before'), 1)
+                with self.assertRaises(SchemeError):
+                    env.lookup('after')
+
+    def test_deeply_nested_data_is_cached(self):
+        with open(self.filename, 'w') as outfile:
+            outfile.write("(define deep '" + '(' * 20000 + ')' * 20000 + ')\n(define after 1)\n')
+        for evaluator, kind in ((compile_eval, 'forms'), (vm_eval, 'bytecode')):
+            for _ in range(2):
+                env = self.load(evaluator)
+                self.assertEqual(env.lookup('after'), 1)
+                self.assertIs(type(env.lookup('deep')), Pair)
+            self.assertTrue(os.path.exists(cache_path(self.filename, kind)))
+
+    def test_unencodable_entries_are_not_cached(self):
+        code = Code()
+        code.emit(LOAD_CONST, 1 << 40)
+        write_cache(self.filename, source_key(self.filename), 'bytecode', (code,))
+        self.assertFalse(os.path.exists(cache_path(self.filename, 'bytecode')))
+
+    def test_changed_source_is_read_again(self):
+        self.load(compile_eval)
+        key = source_key(self.filename)
+        with open(self.filename, 'w') as outfile:
+            outfile.write(SOURCE + '(define result 0)\n')
+        self.assertNotEqual(source_key(self.filename), key)
+        self.assertIsNone(read_cache(self.filename, source_key(self.filename), 'forms', create_global_frame()))
+        self.assertEqual(self.load(compile_eval).lookup('result'), 0)
+
+    def test_unreadable_cache_is_ignored(self):
+        self.load(compile_eval)
+        with open(cache_path(self.filename, 'forms'), 'wb') as outfile:
+            outfile.write(b'garbage')
+        self.assertEqual(self.load(compile_eval).lookup('result'), 128)
+
+
+if __name__ == '__main__':
+    unittest.main()
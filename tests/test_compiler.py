@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+# Author: Forrest Chang (forrestchang7@gmail.com)
+
+import unittest
+
+from schemy import compiler
+from schemy.buffer import Buffer
+from schemy.compiler import compile_eval
+from schemy.eval import scheme_eval
+from schemy.exception import SchemeError
+from schemy.repl import create_global_frame, scheme_read
+from schemy.tokenizer import tokenize_lines
+
+
+def run_all(source, evaluator):
+    """Evaluate every expression in source and return the value of the last one."""
+    env = create_global_frame(evaluator)
+    src = Buffer(tokenize_lines(source.splitlines()))
+    result = None
+    while src.current() is not None:
+        result = evaluator(scheme_read(src), env)
+    return result
+
+
+class TestCompiler(unittest.TestCase):
+
+    def assertSameResult(self, source):
+        expected = run_all(source, scheme_eval)
+        self.assertEqual(run_all(source, compile_eval), expected)
+        return expected
+
+    def test_constants(self):
+        self.assertEqual(self.assertSameResult('10'), 10)
+        self.assertEqual(str(self.assertSameResult('"hi"')), 'hi')
+        self.assertEqual(str(self.assertSameResult("'(1 2 . 3)")), '(1 2 . 3)')
+
+    def test_special_forms(self):
+        self.assertEqual(self.assertSameResult('(if (> 10 5) 10 5)'), 10)
+        self.assertEqual(str(self.assertSameResult('(if #f 1)')), 'okay')
+        self.assertEqual(self.assertSameResult('(and 1 2 3)'), 3)
+        self.assertEqual(str(self.assertSameResult('(and 1 #f 3)')), '#f')
+        self.assertEqual(self.assertSameResult('(or #f 5 6)'), 5)
+        self.assertEqual(str(self.assertSameResult('(or)')), '#f')
+        self.assertEqual(self.assertSameResult('(begin 1 2 3)'), 3)
+        self.assertEqual(self.assertSameResult('(let ((a 1) (b 2)) (+ a b))'), 3)
+        self.assertEqual(str(self.assertSameResult("(cond ((= 1 2) 'no) (else 'yes))")), 'yes')
+        self.assertEqual(self.assertSameResult('(cond (#f 1) (2))'), 2)
+
+    def test_define_and_lambda(self):
+        self.assertEqual(self.assertSameResult('(define r 10)\nr'), 10)
+        self.assertEqual(self.assertSameResult('(define sq (lambda (x) (* x x)))\n(sq 10)'), 100)
+        self.assertEqual(self.assertSameResult('(define (f x) (define y 2) (* x y))\n(f 4)'), 8)
+
+    def test_fact_function(self):
+        source = '(define (fact n) (if (<= n 1) 1 (* n (fact (- n 1)))))\n(fact 20)'
+        self.assertEqual(self.assertSameResult(source), 2432902008176640000)
+
+    def test_count_function(self):
+        source = """
+        (define count (lambda (item L) (if (null? L) 0 (+ (if (equal? item (car L)) 1 0) (count item (cdr L))))))
+        (count 'the '(the more the merrier the bigger the better))
+        """
+        self.assertEqual(self.assertSameResult(source), 4)
+
+    def test_nu_procedure(self):
+        source = '(define g (nu (x) (+ x x)))\n(g (+ 1 2))'
+        self.assertEqual(self.assertSameResult(source), 6)
+
+    def test_eval_and_apply(self):
+        self.assertEqual(self.assertSameResult("(eval '(+ 1 2))"), 3)
+        self.assertEqual(self.assertSameResult("(apply + '(1 2))"), 3)
+
+    def test_body_is_analyzed_once(self):
+        env = create_global_frame(compile_eval)
+        run = lambda line: compile_eval(scheme_read(Buffer(tokenize_lines([line]))), env)
+        run('(define (inc x) (+ x 1))')
+        code = env.lookup('inc').code
+        self.assertIsNotNone(code)
+        self.assertEqual(run('(inc 41)'), 42)
+        self.assertIs(env.lookup('inc').code, code)
+
+    def test_lexical_addressing(self):
+        source = """
+        (define (make-adder n) (lambda (x) (let ((y 1)) (+ x n y))))
+        ((make-adder 3) 4)
+        """
+        self.assertEqual(self.assertSameResult(source), 8)
+        self.assertEqual(self.assertSameResult("(let ((car cdr)) (car '(1 2)))").first, 2)
+        source = '(define (g) (define a 1) (define (h) (+ a 1)) (h))\n(g)'
+        self.assertEqual(self.assertSameResult(source), 2)
+        source = '(define n (nu (x) (lambda () x)))\n((n (+ 2 3)))'
+        self.assertEqual(self.assertSameResult(source), 5)
+
+    def test_eval_in_call_frame(self):
+        self.assertEqual(self.assertSameResult("(define (f x) (eval 'x))\n(f 7)"), 7)
+        source = "(define (k x) (eval '(define zz 5)) (eval '(+ zz x)))\n(k 1)"
+        self.assertEqual(self.assertSameResult(source), 6)
+        source = "(define (f) (eval '(define w 4)) (set! w (+ w 1)) (list w (+ w 1)))\n(f)"
+        self.assertEqual(str(self.assertSameResult(source)), '(5 6)')
+        source = "(define (g) (eval '(define (sq x) (* x x))) (sq 3))\n(g)"
+        self.assertEqual(self.assertSameResult(source), 9)
+        with self.assertRaises(SchemeError):
+            run_all("(define (f) w)\n(f)", compile_eval)
+
+    def test_global_defined_later(self):
+        source = '(define (f) (+ later 1))\n(define later 41)\n(f)'
+        self.assertEqual(self.assertSameResult(source), 42)
+
+    def test_set(self):
+        self.assertEqual(self.assertSameResult('(define x 1)\n(set! x (+ x 1))\nx'), 2)
+        source = """
+        (define (make-counter)
+          (define n 0)
+          (lambda () (set! n (+ n 1)) n))
+        (define c (make-counter))
+        (c)
+        (c)
+        """
+        self.assertEqual(self.assertSameResult(source), 2)
+        self.assertEqual(self.assertSameResult('(define (f x) (set! x 5) x)\n(f 1)'), 5)
+        with self.assertRaises(SchemeError):
+            run_all('(set! undefined-name 1)', compile_eval)
+        with self.assertRaises(SchemeError):
+            run_all('(set! undefined-name 1)', scheme_eval)
+
+    def test_redefined_global_call(self):
+        source = """
+        (define (f x) (car x))
+        (f '(1 2))
+        (define car cdr)
+        (f '(1 2))
+        """
+        self.assertEqual(str(self.assertSameResult(source)), '(2)')
+        source = """
+        (define (g) 1)
+        (define (f) (g))
+        (f)
+        (set! g (lambda () 2))
+        (f)
+        """
+        self.assertEqual(self.assertSameResult(source), 2)
+
+    def test_nested_calls_are_analyzed_once(self):
+        analyzed = []
+        analyze = compiler.analyze
+        def counting(expr, scope, tail=False):
+            analyzed.append(expr)
+            return analyze(expr, scope, tail)
+        compiler.analyze = counting
+        try:
+            env = create_global_frame(compile_eval)
+            source = '(+ 1 ' * 30 + '0' + ')' * 30
+            self.assertEqual(compile_eval(scheme_read(Buffer(tokenize_lines([source]))), env), 30)
+        finally:
+            compiler.analyze = analyze
+        self.assertEqual(len(analyzed), 30 * 2 + 1)
+
+    def test_global_cells_are_updated_in_place(self):
+        env = create_global_frame(compile_eval)
+        cell = env.cell(scheme_read(Buffer(tokenize_lines(['car']))))
+        version = cell.version
+        compile_eval(scheme_read(Buffer(tokenize_lines(['(define car cdr)']))), env)
+        self.assertIs(env.cell(cell.name), cell)
+        self.assertEqual(cell.version, version + 1)
+
+    def test_tail_calls(self):
+        source = """
+        (define (loop n acc) (if (= n 0) acc (loop (- n 1) (+ acc 1))))
+        (loop 10000 0)
+        """
+        self.assertEqual(self.assertSameResult(source), 10000)
+        source = """
+        (define (even2? n) (if (= n 0) #t (odd2? (- n 1))))
+        (define (odd2? n) (if (= n 0) #f (even2? (- n 1))))
+        (even2? 10000)
+        """
+        self.assertEqual(str(self.assertSameResult(source)), '#t')
+        source = """
+        (define (c n) (cond ((= n 0) 'done) (else (let ((m (- n 1))) (and #t (or #f (begin (c m))))))))
+        (c 10000)
+        """
+        self.assertEqual(str(self.assertSameResult(source)), 'done')
+
+    def test_errors(self):
+        with self.assertRaises(SchemeError):
+            run_all('(undefined-name)', compile_eval)
+        with self.assertRaises(SchemeError):
+            run_all('((lambda (x) x) 1 2)', compile_eval)
+        with self.assertRaises(SchemeError):
+            run_all('(1 2)', compile_eval)
+
+
+if __name__ == '__main__':
+    unittest.main()
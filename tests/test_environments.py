@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# Author: Forrest Chang (forrestchang7@gmail.com)
+
+import unittest
+
+from schemy.environments import CallFrame, Layout
+from schemy.exception import SchemeError
+from schemy.repl import create_global_frame
+from schemy.types import Pair, intern, nil, scnum
+
+
+class TestEnvironments(unittest.TestCase):
+
+    def setUp(self):
+        self.env = create_global_frame()
+        self.formals = Pair('a', Pair('b', nil))
+
+    def test_make_call_frame(self):
+        frame = self.env.make_call_frame(self.formals, Pair(1, Pair(2, nil)))
+        self.assertIsInstance(frame, CallFrame)
+        self.assertEqual(frame.values, [1, 2])
+        self.assertEqual(frame.lookup('b'), 2)
+        self.assertIsInstance(frame.lookup('car'), object)
+
+    def test_make_call_frame_with_layout(self):
+        layout = Layout(self.formals)
+        frame = self.env.make_call_frame(layout, Pair(1, Pair(2, nil)))
+        self.assertIs(frame.layout, layout)
+        self.assertEqual(frame.lookup('a'), 1)
+
+    def test_wrong_number_of_args(self):
+        with self.assertRaises(SchemeError):
+            self.env.make_call_frame(self.formals, Pair(1, nil))
+
+    def test_define_falls_back_to_dict(self):
+        frame = self.env.make_call_frame(self.formals, Pair(1, Pair(2, nil)))
+        self.assertIsNone(frame.bindings)
+        frame.define('a', scnum(3))
+        self.assertIsNone(frame.bindings)
+        frame.define('c', scnum(4))
+        self.assertEqual(frame.bindings, {intern('c'): 4})
+        self.assertEqual(frame.lookup('a'), 3)
+        self.assertEqual(frame.lookup('c'), 4)
+
+    def test_frames_have_no_dict(self):
+        frame = self.env.make_call_frame(self.formals, Pair(1, Pair(2, nil)))
+        self.assertFalse(hasattr(frame, '__dict__'))
+
+
+if __name__ == '__main__':
+    unittest.main()
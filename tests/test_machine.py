@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# Author: Forrest Chang (forrestchang7@gmail.com)
+
+import sys
+import unittest
+
+from schemy.eval import scheme_eval
+from schemy.exception import SchemeError
+from schemy.machine import machine_eval
+from tests.test_compiler import run_all
+
+
+class TestMachine(unittest.TestCase):
+
+    def assertSameResult(self, source):
+        expected = run_all(source, scheme_eval)
+        self.assertEqual(run_all(source, machine_eval), expected)
+        return expected
+
+    def test_special_forms(self):
+        self.assertEqual(self.assertSameResult('(if (> 10 5) 10 5)'), 10)
+        self.assertEqual(str(self.assertSameResult('(if #f 1)')), 'okay')
+        self.assertEqual(self.assertSameResult('(and 1 2 3)'), 3)
+        self.assertEqual(str(self.assertSameResult('(and 1 #f 3)')), '#f')
+        self.assertEqual(self.assertSameResult('(or #f 5 6)'), 5)
+        self.assertEqual(self.assertSameResult('(begin 1 2 3)'), 3)
+        self.assertEqual(self.assertSameResult('(let ((a 1) (b 2)) (+ a b))'), 3)
+        self.assertEqual(str(self.assertSameResult("(cond ((= 1 2) 'no) (else 'yes))")), 'yes')
+        self.assertEqual(self.assertSameResult('(cond (#f 1) (2))'), 2)
+        self.assertEqual(self.assertSameResult('(define x 1)\n(set! x (+ x 1))\nx'), 2)
+
+    def test_procedures(self):
+        source = '(define (fact n) (if (<= n 1) 1 (* n (fact (- n 1)))))\n(fact 20)'
+        self.assertEqual(self.assertSameResult(source), 2432902008176640000)
+        source = '(define (make-adder n) (lambda (x) (+ x n)))\n((make-adder 3) 4)'
+        self.assertEqual(self.assertSameResult(source), 7)
+        source = '(define g (nu (x) (+ x x)))\n(g (+ 1 2))'
+        self.assertEqual(self.assertSameResult(source), 6)
+
+    def test_eval_and_apply(self):
+        self.assertEqual(self.assertSameResult("(eval '(+ 1 2))"), 3)
+        self.assertEqual(self.assertSameResult("(apply + '(1 2))"), 3)
+        self.assertEqual(self.assertSameResult("(define (f x) (eval 'x))\n(f 7)"), 7)
+
+    def test_deep_recursion(self):
+        source = """
+        (define (range a b) (if (= a b) (quote ()) (cons a (range (+ a 1) b))))
+        (define (sum l) (if (null? l) 0 (+ (car l) (sum (cdr l)))))
+        (sum (range 0 20000))
+        """
+        self.assertGreater(20000, sys.getrecursionlimit())
+        self.assertEqual(run_all(source, machine_eval), 199990000)
+
+    def test_tail_calls(self):
+        source = '(define (loop n) (if (= n 0) (quote done) (loop (- n 1))))\n(loop 10000)'
+        self.assertEqual(str(run_all(source, machine_eval)), 'done')
+
+    def test_errors(self):
+        with self.assertRaises(SchemeError):
+            run_all('(undefined-name)', machine_eval)
+        with self.assertRaises(SchemeError):
+            run_all('((lambda (x) x) 1 2)', machine_eval)
+        with self.assertRaises(SchemeError):
+            run_all('(1 2)', machine_eval)
+        with self.assertRaises(SchemeError):
+            run_all('(cond (else 1) (#t 2))', machine_eval)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# Author: Forrest Chang (forrestchang7@gmail.com)
+
+import unittest
+
+from schemy.bytecode import compile_expression
+from schemy.cache import dump_values, load_values
+from schemy.compiler import compile_eval, scope_of
+from schemy.eval import scheme_eval
+from schemy.exception import SchemeError
+from schemy.machine import machine_eval
+from schemy.procedure import LazyProcedure, strict_parameters
+from schemy.repl import create_global_frame, read_line
+from schemy.vm import execute, vm_eval
+
+from .test_compiler import run_all
+
+EVALUATORS = (scheme_eval, compile_eval, machine_eval, vm_eval)
+
+COUNTER = '(define count 0) (define (tick) (set! count (+ count 1)) count) '
+
+
+class TestLazy(unittest.TestCase):
+
+    def assertResult(self, source, expected):
+        for evaluator in EVALUATORS:
+            self.assertEqual(str(run_all(source, evaluator)), expected, evaluator.__name__)
+
+    def test_arguments_are_evaluated_at_most_once(self):
+        self.assertResult(COUNTER + '(define f (nu (x) (list x x))) (f (tick))', '(1 2)')
+        self.assertResult(COUNTER + '(define f (lazy (x) (list x x))) (f (tick))', '(1 1)')
+        self.assertResult(COUNTER + '(define f (lazy (x) (list x x))) (f (tick)) count', '1')
+
+    def test_unused_arguments_are_not_evaluated(self):
+        self.assertResult(COUNTER + '(define f (lazy (x y) x)) (f 1 (tick)) count', '0')
+        self.assertResult("(define f (lazy (c x) (if c x 0))) (f #f (car '()))", '0')
+        self.assertResult('((lazy (x) (lambda () x)) (+ 2 3))', '(lambda () x)')
+        self.assertResult('(((lazy (x) (lambda () x)) (+ 2 3)))', '5')
+
+    def test_effects_keep_their_order(self):
+        log = "(define log nil) (define (note x v) (set! log (cons x log)) v) "
+        for kind in ('nu', 'lazy'):
+            self.assertResult(log + '(define f ({} (x) (begin (note 0 0) x))) (f (note 1 1)) log'.format(kind),
+                              '(1 0)')
+            self.assertResult(log + '(define h ({} (x) (if (note 0 #t) x x))) (h (note 1 1)) log'.format(kind),
+                              '(1 0)')
+            self.assertResult(log + '(define g ({} (x y) (+ y x))) (g (note 1 1) (note 2 2)) log'.format(kind),
+                              '(1 2)')
+
+    def test_redefined_primitives_are_seen(self):
+        self.assertResult(COUNTER + '(define f (lazy (x) (+ x 0))) (f (tick)) (define + (nu (a b) 0)) '
+                          '(f (tick)) count', '1')
+
+    def test_repeated_doubling_is_linear(self):
+        source = '(define f (lazy (n x) (if (= n 0) x (f (- n 1) (+ x x))))) (f 60 1)'
+        self.assertResult(source, str(2 ** 60))
+
+    def test_errors(self):
+        for source in ('((lazy (x) x) 1 2)', '((lazy (x) (car x)) 1)', '(lazy (1) 1)'):
+            for evaluator in EVALUATORS:
+                with self.assertRaises(SchemeError):
+                    run_all(source, evaluator)
+
+    def test_cached_code_keeps_calls_by_need(self):
+        env = create_global_frame(vm_eval)
+        code = load_values(dump_values(compile_expression(read_line('(lazy (x) (+ x x))'), scope_of(env))), env)
+        self.assertIs(type(execute(code, env)), LazyProcedure)
+
+
+class TestStrictness(unittest.TestCase):
+
+    def strictness(self, formals, body):
+        return strict_parameters(read_line(formals), read_line(body), create_global_frame())
+
+    def test_primitive_operands_and_conditions(self):
+        self.assertEqual(self.strictness('(n x y)', '(if (= n 0) x (+ x y))'), (True, False, False))
+        self.assertEqual(self.strictness('(n x y)', '(if n x (+ x y))'), (True, False, False))
+        self.assertEqual(self.strictness('(a b)', '(begin (display a) (if #t b 0))'), (True, False))
+        self.assertEqual(self.strictness('(a b)', '(cond (a b) (else 1))'), (True, False))
+        self.assertEqual(self.strictness('(a b)', '(and a b)'), (True, False))
+        self.assertEqual(self.strictness('(a b)', '(let ((c a)) (* c b))'), (True, True))
+        self.assertEqual(self.strictness('(a b)', '(+ (* a 2) b)'), (True, False))
+
+    def test_order_of_fetches(self):
+        self.assertEqual(self.strictness('(a b)', '(+ b a)'), (False, True))
+        self.assertEqual(self.strictness('(a b c)', '(+ a c b)'), (True, False, True))
+        self.assertEqual(self.strictness('(a b)', '(begin a (display 1) b)'), (True, False))
+        self.assertEqual(self.strictness('(a b)', '(begin (quote x) 1 a b)'), (True, True))
+
+    def test_unknown_calls_and_hidden_names(self):
+        self.assertEqual(self.strictness('(f x)', '(f x)'), (True, False))
+        self.assertEqual(self.strictness('(x)', '(undefined-procedure x)'), (False,))
+        self.assertEqual(self.strictness('(x)', "(list 'x (lambda () x))"), (False,))
+        self.assertEqual(self.strictness('(x)', '(let ((x 1)) x)'), (False,))
+        self.assertEqual(self.strictness('(x)', '(let ((+ car)) (+ x))'), (False,))
+        self.assertEqual(self.strictness('(x)', '(begin (set! x 1) x)'), (False,))
+        self.assertEqual(self.strictness('(x)', '(begin (define x 1) x)'), (False,))
+
+
+if __name__ == '__main__':
+    unittest.main()
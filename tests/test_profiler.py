@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+# Author: Forrest Chang (forrestchang7@gmail.com)
+
+import contextlib
+import io
+import os
+import pstats
+import tempfile
+import unittest
+
+from schemy import eval as evaluation
+from schemy.compiler import compile_eval
+from schemy.eval import instrumented_eval, instruments, scheme_eval
+from schemy.exception import SchemeError
+from schemy.machine import machine_eval
+from schemy.procedure import PrimitiveProcedure
+from schemy.profiler import Profiler, Sampler, frame_name
+from schemy.repl import create_global_frame, read_expressions
+from schemy.types import intern
+from schemy.vm import vm_eval
+
+from .test_compiler import run_all
+
+FIB = '(define (fib n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))\n'
+
+
+def profiled(source):
+    """The value of the last expression of source and the Profiler that watched them all."""
+    profiler = Profiler()
+    with instruments(profiler.enter, profiler.leave):
+        value = run_all(source, instrumented_eval)
+    return value, profiler
+
+
+def calls(profiler):
+    """The number of calls of each procedure, by name."""
+    return {key[2]: record[0] for key, record in profiler.stats.items()}
+
+
+class TestProfiler(unittest.TestCase):
+
+    def test_counts_calls(self):
+        value, profiler = profiled(FIB + '(fib 10)')
+        self.assertEqual(value, 55)
+        counts = calls(profiler)
+        self.assertEqual(counts['fib'], 177)
+        self.assertEqual(counts['<'], 177)
+        self.assertEqual(counts['+'], 88)
+        self.assertEqual(profiler.stack, [])
+
+    def test_times_add_up(self):
+        ticks = iter(range(1000))
+        profiler = Profiler(timer=lambda: next(ticks))
+        with instruments(profiler.enter, profiler.leave):
+            run_all(FIB + '(fib 3)', instrumented_eval)
+        (fib, _, own, cumulative), *primitives = profiler.sorted_stats()
+        self.assertEqual(fib[2], 'fib')
+        self.assertEqual(own + sum(row[2] for row in primitives), cumulative)
+
+    def test_tail_calls_replace_their_caller(self):
+        source = '(define (loop i) (if (= i 0) 0 (loop (- i 1))))\n(loop 5000)'
+        value, profiler = profiled(source)
+        self.assertEqual(calls(profiler)['loop'], 5001)
+        self.assertEqual(max(record[0] for record in profiler.callers.values()), 5001)
+
+    def test_errors_leave_the_stack_empty(self):
+        profiler = Profiler()
+        with instruments(profiler.enter, profiler.leave):
+            with self.assertRaises(SchemeError):
+                run_all("(define (f x) (car x))\n(f 1)", instrumented_eval)
+        self.assertEqual(profiler.stack, [])
+        self.assertEqual(calls(profiler), {'f': 1, 'car': 1})
+
+    def test_evaluator_is_restored(self):
+        with instruments(len, len):
+            self.assertIs(evaluation.scheme_eval, instrumented_eval)
+        self.assertIs(evaluation.scheme_eval, scheme_eval)
+
+    def test_profile_form(self):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            value = run_all(FIB + '(profile (fib 8))', scheme_eval)
+        self.assertEqual(value, 21)
+        lines = out.getvalue().splitlines()
+        self.assertIn('cumul/call', lines[0])
+        self.assertEqual(lines[1].split()[4], 'fib')
+        self.assertEqual(lines[1].split()[0], '67')
+
+    def test_profile_form_under_every_evaluator(self):
+        for evaluator in (compile_eval, machine_eval, vm_eval):
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                value = run_all(FIB + '(define (g) (profile (fib 8)))\n(g)', evaluator)
+            self.assertEqual(value, 21, evaluator.__name__)
+            lines = out.getvalue().splitlines()
+            self.assertEqual(lines[0], 'profiled with scheme_eval in place of ' + evaluator.__name__)
+            self.assertIn('cumul/call', lines[1], evaluator.__name__)
+            self.assertEqual(lines[2].split()[0], '67', evaluator.__name__)
+            self.assertEqual(lines[2].split()[4], 'fib', evaluator.__name__)
+            with self.assertRaises(SchemeError):
+                run_all('(profile)', evaluator)
+
+    def test_procedures_are_named_by_define(self):
+        source = '(define (f) 1)\n(define g (lambda () 2))\n(define h f)\n(list f g h)'
+        for evaluator in (scheme_eval, compile_eval, machine_eval, vm_eval):
+            names = [frame_name(procedure) for procedure in run_all(source, evaluator)]
+            self.assertEqual(names, ['f', 'g', 'f'], evaluator.__name__)
+        for evaluator in (scheme_eval, compile_eval, machine_eval):
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                run_all('(define (f x) x)\n(disassemble f)', evaluator)
+            self.assertTrue(out.getvalue().startswith('f (x):'), evaluator.__name__)
+
+    def test_pstats_output(self):
+        _, profiler = profiled(FIB + '(fib 6)')
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'out.prof')
+            profiler.dump_stats(path)
+            stats = pstats.Stats(path)
+        fib = [key for key in stats.stats if key[2] == 'fib'][0]
+        self.assertEqual(stats.stats[fib][1], 25)
+        self.assertIn(fib, stats.stats[fib][4])
+
+
+class TestSampler(unittest.TestCase):
+
+    def test_shadow_stack(self):
+        sampler, seen = Sampler(), []
+        env = create_global_frame()
+        env.define(intern('snap'), PrimitiveProcedure(
+            lambda: seen.append(tuple(map(frame_name, sampler.stack))), name='snap'))
+        source = '(define (f) (g))\n(define (g) (begin (snap) 1))\n((lambda () (+ (f) 1)))'
+        with instruments(sampler.enter, sampler.leave):
+            for expr in read_expressions(source.splitlines()):
+                instrumented_eval(expr, env)
+        # f calls g in tail position, so g takes its place
+        self.assertEqual(seen, [('lambda', 'g', 'snap')])
+        self.assertEqual(sampler.stack, [])
+
+    def test_collapsed_stacks(self):
+        sampler = Sampler(interval=0.001)
+        with instruments(sampler.enter, sampler.leave), sampler:
+            run_all(FIB + '(fib 18)', instrumented_eval)
+        self.assertFalse(sampler.thread.is_alive())
+        self.assertTrue(sampler.counts)
+        out = io.StringIO()
+        sampler.write_collapsed(out)
+        for line in out.getvalue().splitlines():
+            stack, count = line.rsplit(' ', 1)
+            self.assertGreater(int(count), 0)
+            self.assertEqual(stack.split(';')[0], 'fib')
+
+
+if __name__ == '__main__':
+    unittest.main()
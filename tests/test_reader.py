@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+# Author: Forrest Chang (forrestchang7@gmail.com)
+
+import contextlib
+import io
+import unittest
+
+from schemy.repl import read_line
+from schemy.tokenizer import scan_string, tokenize_line, tokenize_line_by_char
+from schemy.types import Pair, SchemeStr, intern, nil, scnum, scstr
+
+
+class TestStrings(unittest.TestCase):
+
+    def test_plain_strings(self):
+        self.assertEqual(tokenize_line('(f "a b" "" "c")'), ['(', 'f', 'a b', '', 'c', ')'])
+        self.assertEqual(scan_string('x "hello" y', 2), (scstr('hello'), 9))
+
+    def test_strings_are_scheme_values(self):
+        tokens = tokenize_line('"(" "nil" ")"')
+        self.assertTrue(all(type(token) is SchemeStr for token in tokens))
+        self.assertEqual(read_line('"("'), scstr('('))
+        self.assertIs(type(read_line('"nil"')), SchemeStr)
+
+    def test_escapes(self):
+        source = r'"say \"hi\"\n\ttab \\ bar\| \x41;\x3bb;"'
+        self.assertEqual(tokenize_line(source), ['say "hi"\n\ttab \\ bar| Aλ'])
+
+    def test_bad_strings(self):
+        for source in ('"unterminated', r'"escaped end\"', r'"\q"', r'"\x41"', r'"\xzz;"'):
+            with self.assertRaises(ValueError):
+                tokenize_line(source)
+
+    def test_print_repr_round_trips(self):
+        for value in ('plain', 'a "quoted" word', 'back\\slash', 'new\nline\ttab', ''):
+            literal = scstr(value).print_repr()
+            self.assertEqual(read_line(literal), value)
+        self.assertEqual(scstr('a "b"').print_repr(), r'"a \"b\""')
+
+
+class TestTokenizer(unittest.TestCase):
+
+    LINES = [
+        '(define (f x) (+ x 1)) ; comment',
+        "'(a . b) `(c ,d ,@e) #t #f #x True FALSE nil NIL",
+        '- + ... -> ->list -1 +2 .5 5. 1e3 -2.5E-2 1_000 1__0 +inf -infinity infinity 0x10 1abc',
+        '(display "a" "b\\"c" x)   ',
+        '',
+        '   ;; only a comment',
+        'x;y',
+        'ab[c',
+        '[x] {y} \\z',
+        '\u0661\u0662 -\u0663',
+        '#',
+    ]
+
+    def tokens(self, tokenize, line):
+        """The tokens of line, or the error raised, and any warnings printed."""
+        errors = io.StringIO()
+        with contextlib.redirect_stderr(errors):
+            try:
+                result = [(type(token), token) for token in tokenize(line)]
+            except ValueError as e:
+                result = str(e)
+        return result, errors.getvalue()
+
+    def test_same_as_by_char(self):
+        for line in self.LINES:
+            for _ in range(2): # Once more with the words remembered
+                self.assertEqual(self.tokens(tokenize_line, line), self.tokens(tokenize_line_by_char, line), line)
+
+    def test_numbers_and_symbols(self):
+        self.assertEqual(tokenize_line('- -1 -1.5 -> 1e3 .5 . +'), ['-', -1, -1.5, '->', 1000.0, 0.5, '.', '+'])
+        self.assertEqual(tokenize_line('#t true False nil'), [True, True, False, 'nil'])
+
+
+class TestReader(unittest.TestCase):
+
+    def test_long_lists(self):
+        n = 100000
+        expr = read_line("'(" + ' '.join(map(str, range(n))) + ' . end)')
+        self.assertIs(expr.first, intern('quote'))
+        items, count = expr.second.first, 0
+        while type(items) is Pair:
+            self.assertEqual(items.first, count)
+            items, count = items.second, count + 1
+        self.assertEqual((count, items), (n, intern('end')))
+
+    def test_deep_nesting(self):
+        depth = 50000
+        expr = read_line('(' * depth + '1' + ')' * depth)
+        for _ in range(depth):
+            self.assertIs(expr.second, nil)
+            expr = expr.first
+        self.assertEqual(expr, scnum(1))
+
+    def test_quotes_and_dots(self):
+        self.assertEqual(str(read_line("''(a . ('b))")), "(quote (quote (a (quote b))))")
+        self.assertEqual(str(read_line("(1 (2 . 3) . 4)")), "(1 (2 . 3) . 4)")
+
+    def test_syntax_errors(self):
+        for source in ('(1', '(1 .', "'", "('", '(1 . 2 3)', ')', '(1 . )', "'.", '(1 . . 2)'):
+            with self.assertRaises(SyntaxError):
+                read_line(source)
+
+
+if __name__ == '__main__':
+    unittest.main()
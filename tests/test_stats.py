@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+# Author: Forrest Chang (forrestchang7@gmail.com)
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+from schemy.compiler import compile_eval
+from schemy.eval import scheme_eval
+from schemy.machine import machine_eval
+from schemy.stats import StatsWriter, prometheus_text, reset_stats, runtime_stats, stack_depth
+from schemy.types import scheme_list, scnum
+from schemy.vm import vm_eval
+
+from .test_compiler import run_all
+
+EVALUATORS = (scheme_eval, compile_eval, machine_eval, vm_eval)
+
+FIB = '(define (fib n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))\n'
+
+
+def change(source, evaluator):
+    """The counters that running source with evaluator moved, and by how much."""
+    before = runtime_stats()
+    run_all(source, evaluator)
+    after = runtime_stats()
+    moved = {name: after[name] - before[name] for name in ('eval_steps', 'frames', 'pairs', 'thunks_forced')}
+    moved.update({kind: count - before['applications'][kind]
+                  for kind, count in after['applications'].items()})
+    return moved
+
+
+class TestStats(unittest.TestCase):
+
+    def test_calls_and_frames(self):
+        for evaluator in EVALUATORS:
+            moved = change(FIB + '(fib 10)', evaluator)
+            self.assertEqual(moved['lambda'], 177, evaluator.__name__)
+            self.assertEqual(moved['frames'], 177, evaluator.__name__)
+            self.assertGreaterEqual(moved['primitive'], 177 + 88, evaluator.__name__)
+        self.assertGreater(change(FIB + '(fib 3)', scheme_eval)['eval_steps'], 0)
+
+    def test_pairs(self):
+        before = runtime_stats()['pairs']
+        scheme_list(*map(scnum, range(100)))
+        self.assertEqual(runtime_stats()['pairs'] - before, 100)
+
+    def test_thunks_forced(self):
+        for evaluator in EVALUATORS:
+            moved = change('((nu (x) (+ x x)) (+ 1 2))', evaluator)
+            self.assertEqual(moved['thunks_forced'], 2, evaluator.__name__)
+            self.assertEqual(moved['nu'], 1, evaluator.__name__)
+            moved = change('((lazy (x y) (if x (+ y y) 0)) #t (+ 1 2))', evaluator)
+            self.assertEqual(moved['thunks_forced'], 1, evaluator.__name__)
+            self.assertEqual(moved['lazy'], 1, evaluator.__name__)
+
+    def test_symbols_and_stack_depth(self):
+        stats = runtime_stats()
+        self.assertGreater(stats['symbols'], 50)
+        self.assertGreaterEqual(stats['peak_stack_depth'], stack_depth(sys._getframe()))
+
+    def test_reset(self):
+        run_all(FIB + '(fib 5)', scheme_eval)
+        reset_stats()
+        stats = runtime_stats()
+        self.assertEqual(stats['frames'], 0)
+        self.assertEqual(set(stats['applications'].values()), {0})
+
+    def test_runtime_stats_primitive(self):
+        for evaluator in EVALUATORS:
+            stats = run_all("(runtime-stats)", evaluator)
+            names = [str(entry.first) for entry in stats]
+            self.assertEqual(names, ['eval-steps', 'frames', 'pairs', 'thunks-forced',
+                                     'applications', 'symbols', 'peak-stack-depth'])
+            kinds = stats[4].second
+            self.assertEqual([str(entry.first) for entry in kinds], ['primitive', 'lambda', 'nu', 'lazy'])
+            self.assertGreater(kinds.first.second, 0)
+
+    def test_prometheus_text(self):
+        text = prometheus_text(runtime_stats())
+        self.assertIn('# TYPE schemy_frames_total counter', text)
+        self.assertIn('# TYPE schemy_symbols gauge', text)
+        self.assertIn('schemy_applications_total{kind="lambda"} ', text)
+        for line in text.splitlines():
+            if not line.startswith('#'):
+                int(line.rsplit(' ', 1)[1])
+
+    def test_writer(self):
+        with tempfile.TemporaryDirectory() as directory:
+            lines = os.path.join(directory, 'stats.jsonl')
+            with StatsWriter(lines, interval=0.01):
+                run_all(FIB + '(fib 12)', scheme_eval)
+            with open(lines) as infile:
+                records = [json.loads(line) for line in infile]
+            self.assertGreaterEqual(len(records), 1)
+            self.assertEqual(records[-1]['frames'], runtime_stats()['frames'])
+            prom = os.path.join(directory, 'stats.prom')
+            with StatsWriter(prom, interval=60):
+                pass
+            with open(prom) as infile:
+                self.assertIn('schemy_pairs_total', infile.read())
+            self.assertEqual(sorted(os.listdir(directory)), ['stats.jsonl', 'stats.prom'])
+
+
+if __name__ == '__main__':
+    unittest.main()
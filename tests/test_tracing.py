@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+# Author: Forrest Chang (forrestchang7@gmail.com)
+
+import os
+import tempfile
+import unittest
+
+from schemy import eval as evaluation
+from schemy.eval import eval_hooks, instrumented_eval, instruments, scheme_eval, traced_eval
+from schemy.exception import SchemeError
+from schemy.profiler import frame_name
+from schemy.tracing import EvalHooks, TraceWriter, read_trace, summary
+from schemy.types import make_pair, nil, scheme_list, scnum, scstr
+
+from .test_compiler import run_all
+
+
+class Recorder(EvalHooks):
+
+    def __init__(self):
+        self.events = []
+
+    def on_call(self, procedure, args, tail):
+        self.events.append(('call', frame_name(procedure), str(args), tail))
+
+    def on_return(self, procedure, value):
+        self.events.append(('return', frame_name(procedure), str(value)))
+
+    def on_error(self, procedure, error):
+        self.events.append(('error', frame_name(procedure)))
+
+    def on_tail(self, procedure):
+        self.events.append(('tail', frame_name(procedure)))
+
+    def on_define(self, name, value):
+        self.events.append(('define', str(name)))
+
+
+def traced(source, hooks):
+    with eval_hooks(hooks):
+        return run_all(source, traced_eval)
+
+
+def trace_file(name, source, **options):
+    """The records of a trace of source written to a file called name."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, name)
+        with TraceWriter(path, **options) as tracer:
+            try:
+                traced(source, tracer)
+            except SchemeError:
+                pass
+        return list(read_trace(path))
+
+
+class TestHooks(unittest.TestCase):
+
+    def test_events(self):
+        recorder = Recorder()
+        traced('(define (sq x) (* x x))\n(sq 3)', recorder)
+        self.assertEqual(recorder.events, [
+            ('define', 'sq'),
+            ('call', 'sq', '(3)', False),
+            ('call', '*', '(3 3)', False),
+            ('return', '*', '9'),
+            ('return', 'sq', '9'),
+        ])
+
+    def test_tail_calls_replace_their_caller(self):
+        recorder = Recorder()
+        traced('(define (loop i) (if (= i 0) 0 (loop (- i 1))))\n(loop 2)', recorder)
+        calls = [event for event in recorder.events if event[:2] == ('call', 'loop')]
+        self.assertEqual([event[3] for event in calls], [False, True, True])
+        returns = [event for event in recorder.events if event[:2] == ('return', 'loop')]
+        self.assertEqual(len(returns), 1)
+        ends = [event for event in recorder.events if event[1] == 'loop' and event[0] in ('return', 'tail')]
+        self.assertEqual(ends, [('tail', 'loop'), ('tail', 'loop'), ('return', 'loop', '0')])
+
+    def test_errors_unwind_every_call(self):
+        recorder = Recorder()
+        with self.assertRaises(SchemeError):
+            traced('(define (f x) (+ 1 (g x)))\n(define (g x) (car x))\n(f 1)', recorder)
+        self.assertEqual(recorder.events[-3:], [('error', 'car'), ('error', 'g'), ('error', 'f')])
+
+    def test_evaluator_is_restored(self):
+        with instruments(len, len):
+            with eval_hooks(EvalHooks()):
+                self.assertIs(evaluation.scheme_eval, traced_eval)
+            self.assertIs(evaluation.scheme_eval, instrumented_eval)
+        self.assertIs(evaluation.scheme_eval, scheme_eval)
+
+
+class TestSummary(unittest.TestCase):
+
+    def test_short_values(self):
+        self.assertEqual(summary(scheme_list(scnum(1), scstr('a'))), '(1 "a")')
+        self.assertEqual(summary(run_all('(lambda (x) x)', scheme_eval)), '#[lambda]')
+
+    def test_long_values_are_cut_short(self):
+        items = scheme_list(*map(scnum, range(10 ** 5)))
+        self.assertEqual(summary(items, 20), '(0 1 2 3 4 5 6 7 ...')
+        self.assertEqual(summary(scstr('x' * 10 ** 6), 10), '"xxxxxx...')
+        cycle = make_pair(scnum(1), nil)
+        cycle.second = cycle
+        self.assertEqual(len(summary(cycle)), 60)
+
+
+class TestTraceWriter(unittest.TestCase):
+
+    SOURCE = '(define (fib n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))\n(fib 5)'
+
+    def test_binary_and_json_lines_agree(self):
+        records = [trace_file(name, self.SOURCE) for name in ('trace.jsonl', 'trace.bin')]
+        for trace in records:
+            for record in trace:
+                del record['time']
+        self.assertEqual(records[0], records[1])
+        self.assertEqual(records[0][1], {'event': 'call', 'depth': 1, 'name': 'fib', 'args': ['5']})
+        self.assertEqual(records[0][-1], {'event': 'return', 'depth': 1, 'name': 'fib', 'value': '5'})
+
+    def test_depth_limit(self):
+        records = trace_file('trace.jsonl', self.SOURCE, max_depth=2)
+        self.assertEqual(max(record['depth'] for record in records), 2)
+        calls = [record for record in records if record['event'] == 'call']
+        self.assertEqual(len(calls), len([r for r in records if r['event'] == 'return']))
+
+    def test_sampling(self):
+        every = trace_file('trace.jsonl', self.SOURCE)
+        sampled = trace_file('trace.jsonl', self.SOURCE, sample=4)
+        calls = [record for record in every if record['event'] == 'call']
+        self.assertEqual([record['name'] for record in sampled if record['event'] == 'call'],
+                         [record['name'] for record in calls[3::4]])
+
+    def test_tail_calls_pair_up(self):
+        source = '(define (loop i) (if (= i 0) 0 (loop (- i 1))))\n(loop 3)'
+        for options in ({}, {'sample': 2}, {'max_depth': 1}):
+            for name in ('trace.jsonl', 'trace.bin'):
+                calls = []
+                for record in trace_file(name, source, **options):
+                    if record['event'] == 'call':
+                        calls.append((record['name'], record['depth']))
+                    elif record['event'] != 'define':
+                        self.assertEqual(calls.pop(), (record['name'], record['depth']))
+                self.assertEqual(calls, [])
+        records = trace_file('trace.bin', source)
+        self.assertEqual([record['event'] for record in records if record['name'] == 'loop'],
+                         ['define', 'call', 'tail', 'call', 'tail', 'call', 'tail', 'call', 'return'])
+
+    def test_errors(self):
+        records = trace_file('trace.bin', '(car 1)')
+        self.assertEqual(records[-1]['event'], 'error')
+        self.assertIn('SchemeError', records[-1]['error'])
+
+
+if __name__ == '__main__':
+    unittest.main()
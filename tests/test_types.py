@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+# Author: Forrest Chang (forrestchang7@gmail.com)
+
+import contextlib
+import io
+import unittest
+
+from schemy.compiler import compile_eval
+from schemy.eval import scheme_eval
+from schemy.exception import SchemeError
+from schemy.machine import machine_eval
+from schemy.repl import read_line
+from schemy.types import (SMALL_INT_RANGE, Pair, SchemeFloat, SchemeInt, SchemeSymbol, SchemeVector,
+                          cache_small_ints, intern, make_pair, nil, scheme_add, scheme_cons, scheme_div, scheme_false, scheme_list, scheme_lt, scheme_mul,
+                          scheme_sub, scheme_true, scnum, scstr, to_string, write_value)
+from schemy.vm import vm_eval
+
+from .test_compiler import run_all
+
+EVALUATORS = (scheme_eval, compile_eval, machine_eval, vm_eval)
+
+
+class TestNumbers(unittest.TestCase):
+
+    def assertNumber(self, value, cls, expected):
+        self.assertIs(type(value), cls)
+        self.assertEqual(value, expected)
+
+    def test_exact_and_inexact(self):
+        one, two, half = scnum(1), scnum(2), scnum(0.5)
+        self.assertNumber(scnum(2.0), SchemeFloat, 2)
+        self.assertNumber(scheme_add(one, two), SchemeInt, 3)
+        self.assertNumber(scheme_add(half, half), SchemeFloat, 1)
+        self.assertNumber(scheme_add(one, half, half), SchemeFloat, 2)
+        self.assertNumber(scheme_sub(two, scnum(2.0)), SchemeFloat, 0)
+        self.assertNumber(scheme_sub(half), SchemeFloat, -0.5)
+        self.assertNumber(scheme_mul(), SchemeInt, 1)
+        self.assertNumber(scheme_mul(two, scnum(1.5)), SchemeFloat, 3)
+        self.assertNumber(scheme_div(scnum(10), two), SchemeInt, 5)
+        self.assertNumber(scheme_div(scnum(10), scnum(4)), SchemeFloat, 2.5)
+        self.assertNumber(scheme_div(scnum(10.0), two), SchemeFloat, 5)
+        self.assertNumber(scheme_div(two), SchemeFloat, 0.5)
+        self.assertIs(scheme_lt(one, two), scheme_true)
+        self.assertIs(scheme_lt(two, half), scheme_false)
+
+    def test_large_values(self):
+        big = scnum(10 ** 400)
+        self.assertNumber(scheme_add(big, scnum(1)), SchemeInt, 10 ** 400 + 1)
+        self.assertNumber(scheme_div(big, scnum(10 ** 399)), SchemeInt, 10)
+        self.assertNumber(scheme_mul(scnum(1e308), scnum(10)), SchemeFloat, float('inf'))
+        for func in (scheme_add, scheme_div):
+            with self.assertRaises(SchemeError):
+                func(big, scnum(0.5))
+
+    def test_errors(self):
+        for source in ("(+ 1 'a)", "(- 'a 1)", "(- 'a)", '(/ 1 0)', '(/ 1.0 0)', '(* 2 "s")'):
+            for evaluator in EVALUATORS:
+                with self.assertRaises(SchemeError):
+                    run_all(source, evaluator)
+
+    def test_small_ints_are_shared(self):
+        self.assertIs(scnum(5), scnum(5))
+        self.assertIs(scheme_add(scnum(2), scnum(3)), scnum(5))
+        self.assertIs(scheme_sub(scnum(2), scnum(3)), scnum(-1))
+        self.assertIs(scheme_mul(scnum(2), scnum(3), scnum(4)), scnum(24))
+        self.assertIs(scheme_div(scnum(6), scnum(3)), scnum(2))
+        expr = read_line('(+ 1 1)')
+        self.assertIs(expr.second.first, expr.second.second.first)
+        self.assertIsNot(scnum(10 ** 6), scnum(10 ** 6))
+        for evaluator in EVALUATORS:
+            self.assertIs(run_all('(define (f n) (if (= n 1) (- n 1) (f (- n 1)))) (f 2000)', evaluator), scnum(0))
+
+    def test_small_int_range_can_be_changed(self):
+        self.addCleanup(cache_small_ints, *SMALL_INT_RANGE)
+        cache_small_ints(0, 9)
+        self.assertIs(scnum(9), scnum(9))
+        self.assertIsNot(scnum(10), scnum(10))
+        cache_small_ints(0, -1)
+        self.assertIsNot(scheme_add(scnum(1), scnum(1)), scheme_add(scnum(1), scnum(1)))
+        self.assertEqual(scheme_add(scnum(1), scnum(1)), 2)
+
+    def test_literal_constants_are_shared(self):
+        self.assertIs(read_line('2.5'), read_line('2.5'))
+        self.assertIs(read_line('123456789'), read_line('(f 123456789)').second.first)
+
+    def test_literals(self):
+        for evaluator in EVALUATORS:
+            self.assertEqual(str(run_all('(list 2.0 (+ 1 1) (* 1.5 2) (/ 6 3))', evaluator)), '(2.0 2 3.0 2)')
+
+
+class TestPair(unittest.TestCase):
+
+    def test_pairs_have_no_instance_dict(self):
+        self.assertFalse(hasattr(Pair(1, nil), '__dict__'))
+        self.assertFalse(hasattr(make_pair(scnum(1), nil), '__dict__'))
+        with self.assertRaises(AttributeError):
+            Pair(1, nil).other = 2
+
+    def test_pair_coerces_python_values(self):
+        pair = Pair(1, 'x')
+        self.assertIs(type(pair.first), SchemeInt)
+        self.assertIs(pair.second, intern('x'))
+        with self.assertRaises(TypeError):
+            Pair(object(), nil)
+
+    def test_make_pair_keeps_values(self):
+        one, x = scnum(1), intern('x')
+        pair = make_pair(one, x)
+        self.assertIs(type(pair), Pair)
+        self.assertIs(pair.first, one)
+        self.assertIs(pair.second, x)
+        self.assertEqual(make_pair(one, make_pair(x, nil)), Pair(1, Pair('x', nil)))
+
+    def test_list_operations(self):
+        items = scheme_list(scnum(1), scnum(2), scnum(3))
+        self.assertEqual(str(items), '(1 2 3)')
+        self.assertEqual(str(scheme_cons(scnum(0), items)), '(0 1 2 3)')
+        self.assertEqual(str(items.append(scheme_list(scnum(4)))), '(1 2 3 4)')
+        self.assertEqual(str(items.map(lambda x: scnum(x * 2))), '(2 4 6)')
+        self.assertIs(scheme_list(), nil)
+        self.assertIsInstance(scheme_list(intern('a')).first, SchemeSymbol)
+
+    def test_long_lists(self):
+        n = 100000
+        items = scheme_list(*map(scnum, range(n)))
+        self.assertEqual(len(items), n)
+        self.assertIs(items.listp(), scheme_true)
+        doubled = items.map(lambda x: scnum(x * 2))
+        self.assertEqual(doubled[n - 1], 2 * (n - 1))
+        self.assertEqual(items.append(scheme_list(scnum(-1))), scheme_list(*map(scnum, list(range(n)) + [-1])))
+        self.assertEqual(items, scheme_list(*map(scnum, range(n))))
+        self.assertNotEqual(items, doubled)
+        self.assertEqual(len(str(items)), len(str(list(range(n))).replace(',', '')))
+
+    def test_improper_and_circular_lists(self):
+        improper = Pair(1, Pair(2, 3))
+        self.assertIs(improper.listp(), scheme_false)
+        self.assertEqual(str(improper), '(1 2 . 3)')
+        for size in range(1, 6):
+            for start in range(size):
+                items = scheme_list(*map(scnum, range(size)))
+                last = target = items
+                for _ in range(start):
+                    target = target.second
+                while last.second is not nil:
+                    last = last.second
+                last.second = target
+                self.assertIs(items.listp(), scheme_false)
+                with self.assertRaises(SchemeError):
+                    len(items)
+                with self.assertRaises(SchemeError):
+                    items.append(nil)
+        with self.assertRaises(SchemeError):
+            improper.map(lambda x: x)
+
+
+class TestVector(unittest.TestCase):
+
+    def assertResult(self, source, expected):
+        for evaluator in EVALUATORS:
+            self.assertEqual(str(run_all(source, evaluator)), expected, evaluator.__name__)
+
+    def test_reader_syntax(self):
+        vector = read_line('#(1 "a" (b c) #() #(2))')
+        self.assertIs(type(vector), SchemeVector)
+        self.assertEqual(vector, SchemeVector([scnum(1), scstr('a'), Pair('b', Pair('c', nil)),
+                                               SchemeVector([]), SchemeVector([scnum(2)])]))
+        self.assertEqual(vector.print_repr(), '#(1 "a" (b c) #() #(2))')
+        for source in ('#(1 . 2)', '#(1', '(1 . #(2) 3)'):
+            with self.assertRaises(SyntaxError):
+                read_line(source)
+
+    def test_primitives(self):
+        self.assertResult('(define v (make-vector 3 0)) (vector-set! v 1 5) v', '#(0 5 0)')
+        self.assertResult('(vector-ref #(1 2 3) 2)', '3')
+        self.assertResult('(vector-length (make-vector 4))', '4')
+        self.assertResult("(vector->list #(1 (2) 3))", '(1 (2) 3)')
+        self.assertResult("(list->vector '(a b))", '#(a b)')
+        self.assertResult('(define v (vector 1 2)) (vector-fill! v 7) v', '#(7 7)')
+        self.assertResult('(vector? #()) ', '#t')
+        self.assertResult("(vector? '())", '#f')
+        self.assertResult("(equal? #(1 (2)) (vector 1 (list 2)))", '#t')
+
+    def test_vector_map(self):
+        self.assertResult('(vector-map (lambda (x) (* x x)) #(1 2 3))', '#(1 4 9)')
+        self.assertResult('(vector-map + #(1 2 3) #(10 20))', '#(11 22)')
+
+    def test_matrix(self):
+        source = """
+        (define (make-matrix n m) (let ((rows (make-vector n 0)))
+          (define (fill i) (if (< i n) (begin (vector-set! rows i (make-vector m 0)) (fill (+ i 1)))))
+          (fill 0) rows))
+        (define a (make-matrix 2 3))
+        (vector-set! (vector-ref a 1) 2 9)
+        a
+        """
+        self.assertResult(source, '#(#(0 0 0) #(0 0 9))')
+
+    def test_errors(self):
+        for source in ('(vector-ref #(1 2) 2)', '(vector-ref #(1 2) -1)', "(vector-ref '(1) 0)",
+                       '(vector-set! #() 0 1)', '(make-vector -1)', "(list->vector '(1 . 2))",
+                       '(vector-map car #(1) 2)'):
+            for evaluator in EVALUATORS:
+                with self.assertRaises(SchemeError):
+                    run_all(source, evaluator)
+
+
+class TestStrings(unittest.TestCase):
+
+    def test_primitives(self):
+        for evaluator in EVALUATORS:
+            self.assertEqual(run_all('(string-append "a" (number->string 12) "" (number->string 0.5))',
+                                     evaluator), scstr('a120.5'))
+            self.assertEqual(run_all('(string-append)', evaluator), scstr(''))
+            self.assertEqual(run_all('(string-length (string-append "ab" "c"))', evaluator), 3)
+
+    def test_errors(self):
+        for source in ('(string-append "a" 1)', "(string-length 'a)", '(number->string "1")'):
+            for evaluator in EVALUATORS:
+                with self.assertRaises(SchemeError):
+                    run_all(source, evaluator)
+
+
+class TestPrinter(unittest.TestCase):
+
+    def test_quoting(self):
+        value = Pair(scstr('a "b"'), Pair(SchemeVector([scstr('c'), nil]), scnum(2)))
+        self.assertEqual(to_string(value), '(a "b" #(c ()) . 2)')
+        self.assertEqual(to_string(value, True), '("a \\"b\\"" #("c" ()) . 2)')
+        self.assertEqual(to_string(SchemeVector([])), '#()')
+        self.assertEqual(to_string(Pair(1, SchemeVector([scnum(2)]))), '(1 . #(2))')
+
+    def test_large_output_is_written_in_chunks(self):
+        chunks = []
+        items = scheme_list(*map(scnum, range(100000)))
+        write_value(items, chunks.append)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(''.join(chunks), '(' + ' '.join(map(str, range(100000))) + ')')
+
+    def test_deep_nesting(self):
+        depth = 100000
+        value = nil
+        for _ in range(depth):
+            value = make_pair(value, nil)
+        self.assertEqual(str(value), '(' * depth + '()' + ')' * depth)
+
+    def test_cycles(self):
+        items = scheme_list(scnum(1), scnum(2))
+        items.second.second = items
+        self.assertEqual(to_string(items, cycles=True), '#0=(1 2 . #0#)')
+        vector = SchemeVector([scnum(1)])
+        vector.items.append(vector)
+        self.assertEqual(to_string(vector, cycles=True), '#0=#(1 #0#)')
+        head = scheme_list(scnum(1))
+        head.first = head
+        self.assertEqual(to_string(head, cycles=True), '#0=(#0#)')
+        shared = scheme_list(scnum(1))
+        self.assertEqual(to_string(scheme_list(shared, shared), cycles=True), '(#0=(1) #0#)')
+        self.assertEqual(to_string(scheme_list(shared, scnum(2)), cycles=True), '((1) 2)')
+
+    def test_print_shared(self):
+        source = "(define v (vector 1 2)) (vector-set! v 1 (list v)) (print-shared v)"
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            run_all(source, scheme_eval)
+        self.assertEqual(out.getvalue(), '#0=#(1 (#0#))\n')
+
+
+class TestSequenceForms(unittest.TestCase):
+
+    def test_long_sequences(self):
+        n = 20000
+        for form, expected in (('begin', n), ('and', n), ('or', 1)):
+            source = '({} {})'.format(form, ' '.join(map(str, range(1, n + 1))))
+            self.assertEqual(run_all(source, scheme_eval), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
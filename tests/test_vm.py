@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+# Author: Forrest Chang (forrestchang7@gmail.com)
+
+import contextlib
+import io
+import sys
+import unittest
+
+from schemy.bytecode import CALL, LOAD_LOCAL, LOAD_OPERATOR, TAIL_CALL, Code
+from schemy.eval import scheme_eval
+from schemy.exception import SchemeError
+from schemy.vm import vm_eval
+from tests.test_compiler import run_all
+
+
+class TestVM(unittest.TestCase):
+
+    def assertSameResult(self, source):
+        expected = run_all(source, scheme_eval)
+        self.assertEqual(run_all(source, vm_eval), expected)
+        return expected
+
+    def test_special_forms(self):
+        self.assertEqual(self.assertSameResult('(if (> 10 5) 10 5)'), 10)
+        self.assertEqual(str(self.assertSameResult('(if #f 1)')), 'okay')
+        self.assertEqual(self.assertSameResult('(and 1 2 3)'), 3)
+        self.assertEqual(str(self.assertSameResult('(and 1 #f 3)')), '#f')
+        self.assertEqual(str(self.assertSameResult('(and)')), '#t')
+        self.assertEqual(self.assertSameResult('(or #f 5 6)'), 5)
+        self.assertEqual(str(self.assertSameResult('(or)')), '#f')
+        self.assertEqual(self.assertSameResult('(begin 1 2 3)'), 3)
+        self.assertEqual(self.assertSameResult('(let ((a 1) (b 2)) (+ a b))'), 3)
+        self.assertEqual(self.assertSameResult('(let ((a 1)) (define b 2) (+ (let ((c 3)) c) a b))'), 6)
+        self.assertEqual(str(self.assertSameResult("(cond ((= 1 2) 'no) (else 'yes))")), 'yes')
+        self.assertEqual(self.assertSameResult('(cond (#f 1) (2))'), 2)
+        self.assertEqual(str(self.assertSameResult('(cond (#f 1))')), 'okay')
+        self.assertEqual(self.assertSameResult('(define x 1)\n(set! x (+ x 1))\nx'), 2)
+
+    def test_procedures(self):
+        source = '(define (fact n) (if (<= n 1) 1 (* n (fact (- n 1)))))\n(fact 20)'
+        self.assertEqual(self.assertSameResult(source), 2432902008176640000)
+        source = '(define (make-adder n) (lambda (x) (+ x n)))\n((make-adder 3) 4)'
+        self.assertEqual(self.assertSameResult(source), 7)
+        source = """
+        (define (make-counter)
+          (define n 0)
+          (lambda () (set! n (+ n 1)) n))
+        (define c (make-counter))
+        (c)
+        (c)
+        """
+        self.assertEqual(self.assertSameResult(source), 2)
+
+    def test_nu_procedures(self):
+        self.assertEqual(self.assertSameResult('(define g (nu (x) (+ x x)))\n(g (+ 1 2))'), 6)
+        source = '(define n (nu (x) (lambda () x)))\n((n (+ 2 3)))'
+        self.assertEqual(self.assertSameResult(source), 5)
+        source = '(define (f) (nu (x) (* x 2)))\n((f) (+ 1 1))'
+        self.assertEqual(self.assertSameResult(source), 4)
+
+    def test_eval_and_apply(self):
+        self.assertEqual(self.assertSameResult("(eval '(+ 1 2))"), 3)
+        self.assertEqual(self.assertSameResult("(apply + '(1 2))"), 3)
+        self.assertEqual(self.assertSameResult("(define (f x) (eval 'x))\n(f 7)"), 7)
+        source = "(define (k x) (eval '(define zz 5)) (eval '(+ zz x)))\n(k 1)"
+        self.assertEqual(self.assertSameResult(source), 6)
+        source = "(define (f) (eval '(define w 4)) (set! w (+ w 1)) (list w (+ w 1)))\n(f)"
+        self.assertEqual(str(self.assertSameResult(source)), '(5 6)')
+        source = "(define (g) (eval '(define (sq x) (* x x))) (sq 3))\n(g)"
+        self.assertEqual(self.assertSameResult(source), 9)
+        with self.assertRaises(SchemeError):
+            run_all("(define (f) w)\n(f)", vm_eval)
+
+    def test_redefined_global_call(self):
+        source = """
+        (define (f x) (car x))
+        (f '(1 2))
+        (define car cdr)
+        (f '(1 2))
+        """
+        self.assertEqual(str(self.assertSameResult(source)), '(2)')
+
+    def test_deep_recursion(self):
+        source = """
+        (define (range a b) (if (= a b) (quote ()) (cons a (range (+ a 1) b))))
+        (define (sum l) (if (null? l) 0 (+ (car l) (sum (cdr l)))))
+        (sum (range 0 20000))
+        """
+        self.assertGreater(20000, sys.getrecursionlimit())
+        self.assertEqual(run_all(source, vm_eval), 199990000)
+
+    def test_tail_calls(self):
+        source = '(define (loop n) (if (= n 0) (quote done) (loop (- n 1))))\n(loop 100000)'
+        self.assertEqual(str(run_all(source, vm_eval)), 'done')
+        source = """
+        (define (c n) (cond ((= n 0) 'done) (else (let ((m (- n 1))) (and #t (or #f (begin (c m))))))))
+        (c 10000)
+        """
+        self.assertEqual(str(self.assertSameResult(source)), 'done')
+
+    def test_procedures_are_compiled_to_bytecode(self):
+        code = run_all('(define (f x) (g x))\nf', vm_eval).code
+        self.assertIsInstance(code, Code)
+        self.assertEqual(code.instructions[:6], [LOAD_OPERATOR, code.instructions[1], LOAD_LOCAL, 0, TAIL_CALL, 1])
+        code = run_all('(define (f x) (g (h x)))\nf', vm_eval).code
+        self.assertIn(CALL, code.instructions[::2])
+
+    def test_disassemble(self):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            result = run_all('(define (f x) (lambda () (+ x 1)))\n(disassemble f)', vm_eval)
+        self.assertEqual(str(result), 'okay')
+        listing = out.getvalue()
+        self.assertIn('f (x):', listing)
+        self.assertIn('MAKE_CLOSURE', listing)
+        self.assertIn('LOAD_OUTER', listing)
+        self.assertIn('(x up 1)', listing)
+        with contextlib.redirect_stdout(io.StringIO()):
+            run_all('(define (f x) x)\n(disassemble f)', scheme_eval)
+
+    def test_too_many_constants(self):
+        source = '(list {})'.format(' '.join(map(str, range(1 << 16))))
+        self.assertEqual(len(run_all(source[:-1] + ' 1)', scheme_eval)), (1 << 16) + 1)
+        with self.assertRaises(SchemeError):
+            run_all(source, vm_eval)
+
+    def test_errors(self):
+        with self.assertRaises(SchemeError):
+            run_all('(undefined-name)', vm_eval)
+        with self.assertRaises(SchemeError):
+            run_all('((lambda (x) x) 1 2)', vm_eval)
+        with self.assertRaises(SchemeError):
+            run_all('(1 2)', vm_eval)
+        with self.assertRaises(SchemeError):
+            run_all('(set! undefined-name 1)', vm_eval)
+        with self.assertRaises(SchemeError):
+            run_all('(disassemble car)', vm_eval)
+
+
+if __name__ == '__main__':
+    unittest.main()